@@ -0,0 +1,118 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from prettytable import PrettyTable
+
+from ..utils import load_metadata
+
+# размеры таблиц по умолчанию
+DEFAULT_SIZES = (1000, 100000, 1000000)
+# кол-во точечных операций на размер
+DEFAULT_OPS = 200
+# схема, если таблицы нет в db_meta.json
+DEFAULT_COLUMNS = ['name:str', 'age:int', 'is_active:bool']
+# версия формата отчета: меняется при несовместимых изменениях полей
+REPORT_VERSION = 2
+
+# каталог, из которого импортируется пакет src (для дочерних процессов)
+_ROOT = Path(__file__).resolve().parents[3]
+
+
+def _schema(table_name, meta_path='db_meta.json'):
+    """
+    столбцы таблицы из db_meta.json без ID; схема по умолчанию, если таблицы нет
+    """
+    table_meta = load_metadata(meta_path).get(table_name)
+    if table_meta is None:
+        return list(DEFAULT_COLUMNS)
+    columns = [col for col in table_meta['columns'] if col.split(':')[0] != 'ID']
+    return columns or list(DEFAULT_COLUMNS)
+
+def _git_commit():
+    """
+    коммит, на котором запущен бенчмарк (None вне git)
+    """
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=_ROOT, capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+def _run_size(table_name, columns, rows, ops):
+    """
+    замеры для одного размера в отдельном процессе и пустом каталоге:
+    пиковая память и холодный старт не зависят от предыдущих размеров
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(_ROOT), os.environ.get('PYTHONPATH')])))
+    with tempfile.TemporaryDirectory(prefix='primitive_db_bench_') as workdir:
+        result = subprocess.run(
+            [sys.executable, '-m', f'{__package__}.suite', '--table', table_name,
+             '--columns', ','.join(columns), '--rows', str(rows), '--ops', str(ops)],
+            cwd=workdir, env=env, capture_output=True, text=True,
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f'бенчмарк на {rows} записей завершился с ошибкой:\n{result.stderr.strip()}')
+    return json.loads(result.stdout)
+
+def run_benchmarks(sizes=DEFAULT_SIZES, ops=DEFAULT_OPS, table_name='users'):
+    """
+    бенчмарк insert, поиска по ID, select с WHERE и без, update, delete и холодного старта
+    на синтетических таблицах по схеме table_name; возвращает отчет (словарь для json)
+    """
+    columns = _schema(table_name)
+    report = {
+        'version': REPORT_VERSION,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'table': table_name,
+        'columns': columns,
+        'ops': ops,
+        'results': [],
+    }
+    for rows in sizes:
+        print(f'Бенчмарк: {rows} записей...', file=sys.stderr)
+        report['results'].append({'rows': rows, **_run_size(table_name, columns, rows, ops)})
+    return report
+
+def print_summary(report):
+    """
+    сводная таблица отчета
+    """
+    output = PrettyTable()
+    output.field_names = ['записей', 'операция', 'оп/с', 'p50, мс', 'p99, мс']
+    for result in report['results']:
+        for name, stats in result['operations'].items():
+            output.add_row([result['rows'], name, stats['ops_per_sec'], stats['p50_ms'], stats['p99_ms']])
+    print(output)
+
+    memory = PrettyTable()
+    memory.field_names = ['записей', 'пик памяти бенчмарка, КБ', 'пик памяти холодного старта, КБ']
+    for result in report['results']:
+        memory.add_row([result['rows'], result['peak_rss_kb'], result['cold_start_rss_kb']])
+    print(memory)
+
+def bench(sizes=DEFAULT_SIZES, ops=DEFAULT_OPS, table_name='users', output=None):
+    """
+    команда project bench: отчет в json-файл (и сводка на экран) или в stdout
+    """
+    try:
+        report = run_benchmarks(sizes, ops, table_name)
+    except RuntimeError as e:
+        print(f'Ошибка: {e}', file=sys.stderr)
+        return False
+    if output is None:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return True
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_summary(report)
+    print(f'Отчет сохранен: {output}')
+    return True
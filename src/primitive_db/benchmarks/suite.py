@@ -0,0 +1,193 @@
+# сценарии бенчмарка для одного размера таблицы
+# запускается отдельным процессом в пустом рабочем каталоге (см. runner.py),
+# результат - json со сводкой по операциям и пиковой памятью в stdout
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+
+from .. import core
+from ..decorators import settings
+
+try:
+    import resource
+except ImportError:  # Windows: пиковый объем памяти не измеряется
+    resource = None
+
+# зерно генератора: одинаковые данные и запросы при каждом запуске
+SEED = 42
+# кол-во различных значений в синтетических столбцах int и str
+DISTINCT_VALUES = 100
+# повторы полного перебора таблицы (select с WHERE и без);
+# на больших таблицах повторов меньше: всего перебирается не больше SCAN_ROWS_BUDGET записей
+SCAN_REPEAT = 5
+SCAN_ROWS_BUDGET = 1000000
+# повторы холодного старта
+COLD_START_RUNS = 5
+
+
+def generate_rows(columns, count, rng):
+    """
+    синтетические записи по схеме (без ID): int и str - DISTINCT_VALUES значений, bool - 50/50
+    """
+    makers = []
+    for column in columns:
+        name, dtype = column.split(':')
+        if dtype == 'int':
+            makers.append(lambda: rng.randrange(DISTINCT_VALUES))
+        elif dtype == 'bool':
+            makers.append(lambda: rng.random() < 0.5)
+        else:
+            makers.append(lambda name=name: f'{name}{rng.randrange(DISTINCT_VALUES)}')
+    for _ in range(count):
+        yield [make() for make in makers]
+
+def filter_condition(columns):
+    """
+    условие WHERE по первому столбцу: ~1% записей для int и str, половина для bool
+    """
+    name, dtype = columns[0].split(':')
+    if dtype == 'int':
+        return f'{name} > {DISTINCT_VALUES - 2}'
+    if dtype == 'bool':
+        return f'{name} = true'
+    return f'{name} = "{name}1"'
+
+def _literal(value):
+    """
+    значение в записи консольной команды
+    """
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, str):
+        return f'"{value}"'
+    return str(value)
+
+def _percentile(samples, q):
+    """
+    процентиль по отсортированной выборке (ближайший ранг)
+    """
+    if not samples:
+        return None
+    rank = max(0, min(len(samples) - 1, round(q / 100 * len(samples)) - 1))
+    return samples[rank]
+
+def peak_rss_kb(who='self'):
+    """
+    пиковый объем памяти процесса (или дочерних процессов) в КБ
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # macOS возвращает байты, Linux - килобайты
+    return usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+
+def summarize(latencies, ops=None):
+    """
+    сводка операции: пропускная способность и задержки (мс)
+    latencies - время каждого вызова в секундах; ops - кол-во обработанных записей, если их больше
+    пиковая память - общая для процесса, по операциям не разделяется (см. run)
+    """
+    total = sum(latencies)
+    ops = len(latencies) if ops is None else ops
+    latencies = sorted(latencies)
+    return {
+        'ops': ops,
+        'calls': len(latencies),
+        'total_s': round(total, 6),
+        'ops_per_sec': round(ops / total, 1) if total else None,
+        'mean_ms': round(total / len(latencies) * 1000, 3),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+    }
+
+def _timed(func, args_list):
+    """
+    время каждого вызова func(*args); вывод команд отбрасывается
+    """
+    latencies = []
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for args in args_list:
+            start = time.perf_counter()
+            func(*args)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+def _cold_start(table_name):
+    """
+    холодный старт: новый процесс импортирует движок и загружает таблицу с диска
+    """
+    code = f'from {core.__name__} import db; db.count({table_name!r})'
+    latencies = []
+    for _ in range(COLD_START_RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+def run(table_name, columns, rows, ops):
+    """
+    замеры на таблице из rows записей в текущем каталоге
+    ops - кол-во точечных операций (insert, поиск по ID, update, delete)
+    возвращает сводки операций и пиковую память: процесса бенчмарка за все операции
+    и процесса холодного старта (ru_maxrss - максимум за время жизни процесса, на операции не делится)
+    """
+    settings['log_time'] = False
+    settings['confirm'] = 'yes'
+    rng = random.Random(SEED)
+    db = core.db
+    db.create_table(table_name, columns)
+    results = {}
+
+    # вставка по одной записи через команду insert (значения - как в консоли)
+    single = min(ops, rows)
+    values = [[_literal(value) for value in row] for row in generate_rows(columns, single, rng)]
+    results['insert'] = summarize(_timed(core.insert, [(table_name, row) for row in values]))
+
+    # заполнение до нужного размера пакетами
+    start = time.perf_counter()
+    db.insert_many(table_name, generate_rows(columns, rows - single, rng))
+    db.compact(table_name)
+    results['bulk_insert'] = summarize([time.perf_counter() - start], ops=rows - single)
+
+    results['cold_start'] = _cold_start(table_name)
+
+    ids = rng.sample(range(1, rows + 1), min(ops, rows))
+    results['select_by_id'] = summarize(_timed(core.select, [(table_name, f'ID = {record_id}') for record_id in ids]))
+
+    # полный перебор; кэш запросов сбрасывается, чтобы измерялось выполнение, а не кэш
+    def scan(where_clause):
+        db.query_cache.clear()
+        core.select(table_name, where_clause)
+
+    repeat = max(1, min(SCAN_REPEAT, SCAN_ROWS_BUDGET // rows))
+    results['select_all'] = summarize(_timed(scan, [(None,)] * repeat), ops=rows * repeat)
+    condition = filter_condition(columns)
+    results['select_where'] = summarize(_timed(scan, [(condition,)] * repeat), ops=rows * repeat)
+
+    first_column = columns[0].split(':')[0]
+    new_values = [_literal(row[0]) for row in generate_rows(columns, len(ids), rng)]
+    results['update'] = summarize(_timed(core.update, [
+        (table_name, f'{first_column} = {value}', f'ID = {record_id}') for record_id, value in zip(ids, new_values)
+    ]))
+    results['delete'] = summarize(_timed(core.delete, [(table_name, f'ID = {record_id}') for record_id in ids]))
+    return {'operations': results, 'peak_rss_kb': peak_rss_kb(), 'cold_start_rss_kb': peak_rss_kb('children')}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='сценарии бенчмарка для одного размера таблицы')
+    parser.add_argument('--table', default='bench')
+    parser.add_argument('--columns', required=True, help='столбцы через запятую: name:str,age:int')
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--ops', type=int, required=True)
+    args = parser.parse_args(argv)
+    results = run(args.table, args.columns.split(','), args.rows, args.ops)
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,638 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from itertools import repeat
+
+from .errors import UnsupportedError
+from .metrics import count
+from .parallel import map_ordered, split_range
+from .utils import _table_path, entry_ids, needs_compaction, read_table, read_table_log, reset_table_log
+from .where import compile_condition, condition_columns
+
+# заголовок файла построчного бинарного формата
+BINARY_MAGIC = b'PDBBIN1\n'
+
+# поля фиксированной ширины (little-endian): str - смещение строки в словаре строк
+_FIELD_CODES = {'int': 'q', 'bool': '?', 'str': 'I'}
+# значения для строк, в которых нет значения столбца
+_DEFAULTS = {'int': 0, 'bool': False, 'str': ''}
+# длина строки в словаре строк
+_LENGTH = struct.Struct('<I')
+# наибольшее смещение и длина строки в словаре строк (поля uint32)
+_MAX_OFFSET = 2 ** 32 - 1
+# размер буфера записи снимка (байты)
+_WRITE_BUFFER = 1024 * 1024
+
+
+class StaleSnapshotError(ValueError):
+    """
+    снимок заменен (уплотнен другим процессом) после открытия таблицы
+    """
+
+
+class _Rows:
+    """
+    представление строк бинарной таблицы: длина без перебора,
+    словари записей создаются только при переборе
+    """
+
+    def __init__(self, table):
+        self._table = table
+
+    def __len__(self):
+        return self._table.live_count
+
+    def __iter__(self):
+        names = self._table.names
+        return (dict(zip(names, values)) for values in self._table.row_tuples())
+
+
+class _Ids:
+    """
+    столбец ID снимка как последовательность для двоичного поиска (без чтения файла целиком)
+    """
+
+    def __init__(self, table):
+        self._table = table
+
+    def __len__(self):
+        return self._table.snapshot_rows
+
+    def __getitem__(self, pos):
+        table = self._table
+        return table._id_field.unpack_from(table._mm, table._rows_start + pos * table._row_size)[0]
+
+
+class BinaryTable:
+    """
+    таблица в построчном бинарном формате: строки фиксированной ширины в снимке .bin,
+    файл отображается в память (mmap) и строки декодируются по мере чтения
+    строки снимка упорядочены по ID, поиск по ID - двоичный поиск по файлу;
+    изменения после снимка хранятся в памяти поверх него (измененные, удаленные, новые строки)
+    """
+
+    def __init__(self, name, schema, next_id=1):
+        self.name = name
+        self.schema = schema  # [(столбец, тип)]
+        self.names = [col_name for col_name, _ in schema]
+        self.next_id = next_id
+        self.indexes = {}
+        self.log_size = 0  # записей журнала после снимка
+        self.snapshot_rows = 0
+        self.path = None
+        self._stamp = None  # (inode, время изменения, размер) открытого снимка
+        self._mm = None
+        self._fields = {}  # столбец -> (позиция в строке файла, смещение, тип)
+        self._defaults = {}  # столбец, добавленный после записи снимка -> значение вместо значений снимка
+        self._row_size = 0
+        self._rows_start = len(BINARY_MAGIC)
+        self._reset_changes()
+
+    def _reset_changes(self):
+        self._deleted = set()  # позиции удаленных строк снимка
+        self._changed = {}  # позиция строки снимка -> измененная запись
+        self._appended = {}  # ID -> запись, добавленная после снимка (по возрастанию ID)
+        self._strings = {}  # смещение -> строка (декодированные значения словаря строк)
+
+    @classmethod
+    def from_rows(cls, name, schema, rows, next_id=1):
+        table = cls(name, schema, next_id)
+        for row in sorted(rows, key=lambda row: row['ID']):
+            table._put(row)
+        return table
+
+    def attach(self, filepath, defaults=None):
+        """
+        открытие снимка: читается только заголовок в конце файла, строки - по мере обращения
+        изменения в памяти сбрасываются; defaults - столбцы, значения которых в снимке не читаются
+        """
+        with open(filepath, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(f.fileno())
+        if mm[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+            mm.close()
+            raise ValueError(f'Файл {filepath} не является бинарным снимком')
+        header_len = _LENGTH.unpack_from(mm, len(mm) - _LENGTH.size)[0]
+        header_start = len(mm) - _LENGTH.size - header_len
+        header = json.loads(mm[header_start:header_start + header_len])
+
+        self._close_snapshot()
+        self._mm = mm
+        self.path = filepath
+        self._stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self.snapshot_rows = header['rows']
+        self._row_size = header['row_size']
+        self._heap_start = header['heap_offset']
+        self.next_id = max(self.next_id, header['next_id'])
+        self._fields = {meta['name']: (pos, meta['offset'], meta['type']) for pos, meta in enumerate(header['columns'])}
+        self._row_struct = struct.Struct('<' + ''.join(_FIELD_CODES[meta['type']] for meta in header['columns']))
+        self._id_field = self._field_struct('ID')
+        self._defaults = dict(defaults or {})
+        self._build_layout()
+        self._reset_changes()
+
+    def _close_snapshot(self):
+        """
+        закрытие отображения открытого снимка (вместе с ним закрывается и его файл)
+        если на отображение еще ссылается незавершенный перебор, его закроет сборщик мусора
+        """
+        if self._mm is None:
+            return
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+        self._mm = None
+
+    def _build_layout(self):
+        """
+        соответствие полей снимка столбцам таблицы: столбцы, добавленные после записи снимка,
+        заполняются значениями по умолчанию, удаленные столбцы снимка пропускаются
+        """
+        for col_name in self._defaults:
+            self._fields.pop(col_name, None)
+        self._str_positions = [pos for pos, _, col_type in self._fields.values() if col_type == 'str']
+        if list(self._fields) == self.names:
+            self._layout = None
+        else:
+            self._layout = [(self._fields[col_name][0], None) if col_name in self._fields
+                            else (None, self._defaults.get(col_name, _DEFAULTS[col_type]))
+                            for col_name, col_type in self.schema]
+
+    @classmethod
+    def open_snapshot(cls, name, schema, filepath, stamp, defaults=None):
+        """
+        открытие того же снимка, что у таблицы в другом процессе (для параллельного перебора)
+        """
+        table = cls(name, schema)
+        table.attach(filepath, defaults)
+        if table._stamp != tuple(stamp):
+            raise StaleSnapshotError(f'Снимок {filepath} изменен')
+        return table
+
+    def _field_struct(self, column):
+        """
+        формат одного поля строки: остальные поля пропускаются
+        """
+        _, offset, col_type = self._fields[column]
+        size = struct.calcsize('<' + _FIELD_CODES[col_type])
+        return struct.Struct(f'<{offset}x{_FIELD_CODES[col_type]}{self._row_size - offset - size}x')
+
+    def _snapshot_view(self, start=0, stop=None):
+        stop = self.snapshot_rows if stop is None else stop
+        return memoryview(self._mm)[self._rows_start + start * self._row_size:self._rows_start + stop * self._row_size]
+
+    def _string(self, offset):
+        """
+        строка словаря строк по смещению (декодируется один раз)
+        """
+        value = self._strings.get(offset)
+        if value is None:
+            start = self._heap_start + offset
+            length = _LENGTH.unpack_from(self._mm, start)[0]
+            value = self._strings[offset] = str(self._mm[start + _LENGTH.size:start + _LENGTH.size + length], 'utf-8')
+        return value
+
+    def _decode(self, values):
+        """
+        значения строки файла -> кортеж в порядке столбцов таблицы
+        """
+        if self._str_positions:
+            values = list(values)
+            for pos in self._str_positions:
+                values[pos] = self._string(values[pos])
+        if self._layout is not None:
+            return tuple(default if pos is None else values[pos] for pos, default in self._layout)
+        return tuple(values)
+
+    def _record_tuple(self, record):
+        return tuple(record.get(col_name) for col_name in self.names)
+
+    @property
+    def live_count(self):
+        return self.snapshot_rows - len(self._deleted) + len(self._appended)
+
+    @property
+    def rows(self):
+        return _Rows(self)
+
+    def sync_indexes(self, index_defs):
+        """
+        вторичные индексы для бинарных таблиц не строятся
+        """
+
+    def row_at(self, pos):
+        changed = self._changed.get(pos)
+        if changed is not None:
+            return changed
+        values = self._row_struct.unpack_from(self._mm, self._rows_start + pos * self._row_size)
+        return dict(zip(self.names, self._decode(values)))
+
+    def row_tuples(self):
+        """
+        строки кортежами в порядке столбцов таблицы, без сборки словарей
+        """
+        deleted, changed = self._deleted, self._changed
+        rows = map(self._decode, self._row_struct.iter_unpack(self._snapshot_view())) if self._mm is not None else ()
+        if deleted or changed:
+            for pos, values in enumerate(rows):
+                if pos in changed:
+                    yield self._record_tuple(changed[pos])
+                elif pos not in deleted:
+                    yield values
+        else:
+            yield from rows
+        for record in self._appended.values():
+            yield self._record_tuple(record)
+
+    def _position(self, record_id):
+        if self._mm is None:
+            return None
+        pos = bisect_left(_Ids(self), record_id)
+        if pos < self.snapshot_rows and _Ids(self)[pos] == record_id and pos not in self._deleted:
+            return pos
+        return None
+
+    def min_id(self):
+        ids = _Ids(self)
+        for pos in range(self.snapshot_rows):
+            if pos not in self._deleted:
+                return ids[pos]
+        return next(iter(self._appended), None)
+
+    def max_id(self):
+        if self._appended:
+            return next(reversed(self._appended))
+        ids = _Ids(self)
+        for pos in range(self.snapshot_rows - 1, -1, -1):
+            if pos not in self._deleted:
+                return ids[pos]
+        return None
+
+    def lookup(self, column, value):
+        """
+        поиск по ID; для остальных столбцов индексов нет
+        """
+        if column != 'ID':
+            return None
+        record = self._appended.get(value)
+        if record is not None:
+            return [record]
+        pos = self._position(value)
+        return [self.row_at(pos)] if pos is not None else []
+
+    def _snapshot_column(self, column, start=0, stop=None):
+        """
+        значения столбца в строках снимка [start, stop) по позициям (включая удаленные), без декодирования строк
+        """
+        if column not in self._fields:
+            col_type = dict(self.schema)[column]
+            stop = self.snapshot_rows if stop is None else stop
+            return repeat(self._defaults.get(column, _DEFAULTS[col_type]), stop - start), col_type
+        values = (value for value, in self._field_struct(column).iter_unpack(self._snapshot_view(start, stop)))
+        return values, self._fields[column][2]
+
+    def _value_test(self, column, predicate):
+        """
+        проверка значения поля снимка; для строк условие проверяется один раз на значение словаря строк
+        """
+        if column not in self._fields or self._fields[column][2] != 'str':
+            return predicate
+        matches = {}
+
+        def test(offset):
+            result = matches.get(offset)
+            if result is None:
+                result = matches[offset] = predicate(self._string(offset))
+            return result
+        return test
+
+    def column_values(self, column):
+        """
+        значения одного столбца живых строк без сборки записей
+        """
+        values, col_type = self._snapshot_column(column)
+        if col_type == 'str' and column in self._fields:
+            values = map(self._string, values)
+        deleted, changed = self._deleted, self._changed
+        if deleted or changed:
+            for pos, value in enumerate(values):
+                if pos in changed:
+                    yield changed[pos].get(column)
+                elif pos not in deleted:
+                    yield value
+        else:
+            yield from values
+        for record in self._appended.values():
+            yield record.get(column)
+
+    def project(self, columns):
+        """
+        записи только из нужных столбцов (для агрегатов и группировки)
+        """
+        columns = list(columns)
+        for values in zip(*(self.column_values(column) for column in columns)):
+            yield dict(zip(columns, values))
+
+    def scan_column(self, column, predicate):
+        """
+        перебор одного поля строк снимка; записи собираются только для подходящих строк
+        в метрики записывается кол-во просмотренных строк (снимка и добавленных после него)
+        """
+        values, _ = self._snapshot_column(column)
+        test = self._value_test(column, predicate)
+        deleted, changed = self._deleted, self._changed
+        pos = -1
+        try:
+            for pos, value in enumerate(values):
+                if pos in changed:
+                    record = changed[pos]
+                    if predicate(record.get(column)):
+                        yield record
+                elif test(value) and pos not in deleted:
+                    yield self.row_at(pos)
+            for pos, record in enumerate(list(self._appended.values()), pos + 1):
+                if predicate(record.get(column)):
+                    yield record
+        finally:
+            count('rows_scanned', pos + 1)
+
+    def snapshot_matches(self, expr, start=0, stop=None):
+        """
+        позиции строк снимка [start, stop), удовлетворяющих условию (изменения в памяти не учитываются)
+        условие на один столбец проверяется по полю строки, иначе строка декодируется в запись
+        """
+        columns = condition_columns(expr)
+        if len(columns) == 1:
+            column = columns.pop()
+            values, _ = self._snapshot_column(column, start, stop)
+            test = self._value_test(column, compile_condition(expr, value_only=True))
+            return (pos for pos, value in enumerate(values, start) if test(value))
+        predicate = compile_condition(expr)
+        names = self.names
+        rows = map(self._decode, self._row_struct.iter_unpack(self._snapshot_view(start, stop)))
+        return (pos for pos, values in enumerate(rows, start) if predicate(dict(zip(names, values))))
+
+    def snapshot_records(self, columns, start=0, stop=None):
+        """
+        записи снимка [start, stop) только из нужных столбцов: пары (позиция, запись)
+        """
+        columns = list(columns)
+        values = []
+        for column in columns:
+            column_values, col_type = self._snapshot_column(column, start, stop)
+            if col_type == 'str' and column in self._fields:
+                column_values = map(self._string, column_values)
+            values.append(column_values)
+        return ((pos, dict(zip(columns, row))) for pos, row in enumerate(zip(*values), start))
+
+    def overlay_positions(self):
+        """
+        позиции строк снимка, удаленных или измененных после него
+        """
+        return frozenset(self._deleted) | self._changed.keys()
+
+    def overlay_records(self):
+        """
+        записи, измененные или добавленные после снимка
+        """
+        return list(self._changed.values()) + list(self._appended.values())
+
+    def snapshot_tasks(self, *args):
+        """
+        задачи параллельного перебора: снимок и диапазон строк для каждого процесса
+        """
+        return [(self.name, self.schema, self.path, self._stamp, self._defaults, start, stop) + args
+                for start, stop in split_range(self.snapshot_rows)]
+
+    def parallel_scan(self, expr):
+        """
+        отбор по условию в нескольких процессах: каждый отображает снимок в память и проверяет
+        свой диапазон строк, позиции объединяются по порядку; строки, измененные после снимка,
+        проверяются в этом процессе
+        None - параллельный перебор невозможен (снимка нет или он заменен)
+        """
+        if self._mm is None:
+            return None
+        try:
+            parts = map_ordered(scan_chunk, self.snapshot_tasks(expr))
+        except StaleSnapshotError:
+            return None
+        if parts is None:
+            return None
+
+        predicate = compile_condition(expr)
+        deleted, changed = self._deleted, self._changed
+        positions = (pos for part in parts for pos in part if pos not in changed and pos not in deleted)
+        changed_matches = sorted(pos for pos, record in changed.items() if predicate(record))
+        records = (self.row_at(pos) for pos in merge(positions, changed_matches))
+        appended = (record for record in list(self._appended.values()) if predicate(record))
+        return (record for part in (records, appended) for record in part)
+
+    def _put(self, record):
+        """
+        новая запись; повтор ID при применении журнала - замена строки
+        """
+        record_id = record['ID']
+        pos = self._position(record_id) if record_id < self.next_id else None
+        if pos is not None:
+            self._changed[pos] = record
+        else:
+            self._appended[record_id] = record
+        self.next_id = max(self.next_id, record_id + 1)
+
+    def _update_ids(self, ids, values):
+        updated = []
+        for record_id in ids:
+            record = self._appended.get(record_id)
+            if record is None:
+                pos = self._position(record_id)
+                if pos is None:
+                    continue
+                record = self._changed[pos] = self.row_at(pos)
+            record.update(values)
+            updated.append(record_id)
+        return updated
+
+    def _delete_ids(self, ids):
+        deleted = []
+        for record_id in ids:
+            if self._appended.pop(record_id, None) is None:
+                pos = self._position(record_id)
+                if pos is None:
+                    continue
+                self._deleted.add(pos)
+                self._changed.pop(pos, None)
+            deleted.append(record_id)
+        return deleted
+
+    def insert(self, record):
+        self._put(record)
+        return [{'op': 'insert', 'row': record}]
+
+    def insert_many(self, records):
+        for record in records:
+            self._put(record)
+        return [{'op': 'insert_many', 'rows': records}]
+
+    def update(self, records, values):
+        ids = self._update_ids([record['ID'] for record in records], values)
+        for record in records:
+            record.update(values)
+        return [{'op': 'update', 'ids': ids, 'values': values}]
+
+    def delete(self, records):
+        return [{'op': 'delete', 'ids': self._delete_ids([record['ID'] for record in records])}]
+
+    def apply_log(self, entries):
+        """
+        применение записей журнала; возвращает их количество
+        """
+        count = 0
+        for entry in entries:
+            count += 1
+            op = entry.get('op')
+            if op == 'insert':
+                self._put(entry['row'])
+            elif op == 'insert_many':
+                for row in entry['rows']:
+                    self._put(row)
+            elif op == 'update':
+                self._update_ids(entry_ids(entry), entry['values'])
+            elif op == 'delete':
+                self._delete_ids(entry_ids(entry))
+            elif op == 'alter':
+                self._alter(entry)
+            elif op == 'meta':
+                self.next_id = max(self.next_id, entry['next_id'])
+        return count
+
+    def _alter(self, entry):
+        """
+        изменение схемы из журнала: снимок не перезаписывается, значения добавленного столбца
+        берутся из описания столбца (и не читаются из одноименного удаленного столбца снимка),
+        записи в памяти обновляются
+        """
+        records = self.overlay_records()
+        if 'drop' in entry:
+            for record in records:
+                record.pop(entry['drop'], None)
+            return
+        column, default = entry['add'], entry['default']
+        if column not in self.names:
+            return
+        for record in records:
+            record[column] = default
+        self._defaults[column] = default
+        if self._mm is not None:
+            self._build_layout()
+
+    def size_bytes(self):
+        """
+        память под изменения после снимка; сам снимок отображен в память и не учитывается
+        """
+        overlay = list(self._changed.values()) + list(self._appended.values())
+        row_size = sys.getsizeof(overlay[0]) + sum(sys.getsizeof(value) for value in overlay[0].values()) if overlay else 0
+        return (row_size * len(overlay) + sys.getsizeof(self._deleted) + sys.getsizeof(self._changed)
+                + sys.getsizeof(self._appended) + sum(sys.getsizeof(value) for value in self._strings.values()))
+
+
+def scan_chunk(task):
+    """
+    задача процесса пула: позиции подходящих строк в своем диапазоне снимка
+    """
+    name, schema, filepath, stamp, defaults, start, stop, expr = task
+    table = BinaryTable.open_snapshot(name, schema, filepath, stamp, defaults)
+    return array('q', table.snapshot_matches(expr, start, stop))
+
+
+def write_binary(filepath, schema, rows, next_id):
+    """
+    запись бинарного снимка: строки фиксированной ширины, словарь строк, заголовок json
+    rows - кортежи значений в порядке схемы; строки хранятся один раз с длиной перед ними,
+    в полях строк - смещение в словаре; заголовок и его длина - в конце файла
+    словарь строк больше 4 ГиБ не поддерживается (смещения - uint32): UnsupportedError
+    """
+    row_struct = struct.Struct('<' + ''.join(_FIELD_CODES[col_type] for _, col_type in schema))
+    defaults = [_DEFAULTS[col_type] for _, col_type in schema]
+    str_positions = [pos for pos, (_, col_type) in enumerate(schema) if col_type == 'str']
+    heap = bytearray()
+    offsets = {}
+
+    rows_count = 0
+    tmp_path = filepath + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(BINARY_MAGIC)
+            buffer = bytearray()
+            for values in rows:
+                values = [default if value is None else value for value, default in zip(values, defaults)]
+                for pos in str_positions:
+                    value = values[pos]
+                    offset = offsets.get(value)
+                    if offset is None:
+                        data = value.encode('utf-8')
+                        if len(heap) + _LENGTH.size + len(data) > _MAX_OFFSET:
+                            raise UnsupportedError('Строковые значения таблицы занимают больше 4 ГиБ, '
+                                                   'бинарный формат их не поддерживает.')
+                        offset = offsets[value] = len(heap)
+                        heap += _LENGTH.pack(len(data)) + data
+                    values[pos] = offset
+                buffer += row_struct.pack(*values)
+                rows_count += 1
+                if len(buffer) >= _WRITE_BUFFER:
+                    f.write(buffer)
+                    buffer.clear()
+            f.write(buffer)
+
+            columns = []
+            offset = 0
+            for col_name, col_type in schema:
+                columns.append({'name': col_name, 'type': col_type, 'offset': offset})
+                offset += struct.calcsize('<' + _FIELD_CODES[col_type])
+            header = json.dumps({'rows': rows_count, 'next_id': next_id, 'row_size': row_struct.size,
+                                 'heap_offset': f.tell(), 'columns': columns}).encode('utf-8')
+            f.write(heap)
+            f.write(header)
+            f.write(_LENGTH.pack(len(header)))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, filepath)
+
+
+def save_binary(table, data_dir='data'):
+    """
+    запись бинарного снимка таблицы; удаленные строки в снимок не попадают
+    после записи таблица переоткрывается по новому снимку
+    """
+    filepath = _table_path(table.name, data_dir, 'bin')
+    write_binary(filepath, table.schema, table.row_tuples(), table.next_id)
+    reset_table_log(table.name, data_dir, table.next_id)
+    table.attach(filepath)
+
+
+def load_binary(name, schema, data_dir='data', auto_compact=True):
+    """
+    открытие бинарной таблицы: снимок .bin (или json при первом открытии) + журнал
+    auto_compact - записать снимок, если журнал разросся
+    """
+    filepath = _table_path(name, data_dir, 'bin')
+    if os.path.exists(filepath):
+        table = BinaryTable(name, schema)
+        table.attach(filepath)
+        table.log_size = table.apply_log(read_table_log(name, data_dir))
+    else:
+        rows, next_id, log_size = read_table(name, data_dir)
+        table = BinaryTable.from_rows(name, schema, rows, next_id)
+        table.log_size = log_size
+
+    if auto_compact and needs_compaction(table.log_size, table.live_count):
+        save_binary(table, data_dir)
+        table.log_size = 0
+    return table
@@ -0,0 +1,127 @@
+import json
+import queue
+import socket
+
+# сколько команд отправляется до чтения ответов на них
+PIPELINE_WINDOW = 1000
+
+
+class ServerError(Exception):
+    """
+    команда завершилась ошибкой на сервере (ответ с "ok": false); текст ошибки - в сообщении
+    """
+
+
+class _Connection:
+    """
+    соединение с сервером: запросы - json-строки, ответы читаются по одной строке
+    """
+
+    def __init__(self, socket_path=None, host='127.0.0.1', port=None, timeout=None):
+        if socket_path:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+        else:
+            sock = socket.create_connection((host, port), timeout=timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self._reader = sock.makefile('rb')
+
+    def send(self, commands, yes=None):
+        payload = []
+        for command in commands:
+            request = {'command': command}
+            if yes is not None:
+                request['yes'] = yes
+            payload.append(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        self.sock.sendall(b''.join(payload))
+
+    def receive(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError('Сервер закрыл соединение')
+        return json.loads(line)
+
+    def close(self):
+        self._reader.close()
+        self.sock.close()
+
+
+class Client:
+    """
+    клиент сервера базы данных с пулом соединений
+    можно использовать из нескольких потоков: каждый вызов берет соединение из пула
+    пример:
+        with Client(socket_path='/tmp/primitive_db.sock') as db:
+            print(db.execute('select from users where age > 30'))
+            outputs = db.pipeline(['insert into users values ("a", 1, true)'] * 100)
+    """
+
+    def __init__(self, socket_path=None, host='127.0.0.1', port=None, pool_size=4, timeout=None):
+        if not socket_path and port is None:
+            raise ValueError('Нужно указать socket_path или port')
+        self._connect_args = (socket_path, host, port, timeout)
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return _Connection(*self._connect_args)
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _run(self, commands, yes):
+        conn = self._acquire()
+        responses = []
+        try:
+            for start in range(0, len(commands), PIPELINE_WINDOW):
+                window = commands[start:start + PIPELINE_WINDOW]
+                conn.send(window, yes)
+                responses.extend(conn.receive() for _ in window)
+        except BaseException:
+            # ответы могли остаться непрочитанными - соединение больше не используется
+            conn.close()
+            raise
+        self._release(conn)
+        for response in responses:
+            if not response['ok']:
+                raise ServerError(response['output'].strip())
+        return [response['output'] for response in responses]
+
+    def execute(self, command, yes=None):
+        """
+        выполнение команды; возвращает вывод сервера
+        yes - подтверждать опасные операции (по умолчанию - как задано при запуске сервера)
+        """
+        return self._run([command], yes)[0]
+
+    def pipeline(self, commands, yes=None):
+        """
+        отправка пачки команд одним соединением без ожидания ответов на каждую;
+        возвращает выводы в том же порядке
+        транзакция (begin ... commit) должна целиком помещаться в одну пачку:
+        разные вызовы могут получить разные соединения
+        """
+        commands = list(commands)
+        if not commands:
+            return []
+        return self._run(commands, yes)
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,399 @@
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+
+from .metrics import count
+from .utils import _table_path, entry_ids, needs_compaction, read_table, read_table_log, reset_table_log
+
+# заголовок файла колоночного формата
+COLUMNAR_MAGIC = b'PDBCOL1\n'
+
+# типы массивов по типу столбца
+_ARRAY_TYPES = {'int': 'q', 'bool': 'b'}
+# значения для строк, в которых нет значения столбца
+_DEFAULTS = {'int': 0, 'bool': False, 'str': ''}
+
+
+class StrColumn:
+    """
+    строковый столбец со словарным кодированием:
+    каждая строка хранится один раз, в столбце - номера строк
+    """
+
+    def __init__(self, codes=None, values=None):
+        self.codes = codes if codes is not None else array('i')
+        self.values = values if values is not None else []
+        self._positions = {value: code for code, value in enumerate(self.values)}
+        self._value_bytes = sum(sys.getsizeof(value) for value in self.values)
+
+    def _encode(self, value):
+        code = self._positions.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self._positions[value] = code
+            self._value_bytes += sys.getsizeof(value)
+        return code
+
+    def append(self, value):
+        self.codes.append(self._encode(value))
+
+    def insert(self, pos, value):
+        self.codes.insert(pos, self._encode(value))
+
+    def __getitem__(self, pos):
+        return self.values[self.codes[pos]]
+
+    def __setitem__(self, pos, value):
+        self.codes[pos] = self._encode(value)
+
+    def __iter__(self):
+        values = self.values
+        return (values[code] for code in self.codes)
+
+    def size_bytes(self):
+        return (self.codes.itemsize * len(self.codes) + sys.getsizeof(self.values)
+                + self._value_bytes + sys.getsizeof(self._positions))
+
+
+def _new_column(col_type):
+    if col_type == 'str':
+        return StrColumn()
+    return array(_ARRAY_TYPES[col_type])
+
+
+def _filled_column(col_type, value, rows):
+    """
+    столбец из rows одинаковых значений
+    """
+    if col_type == 'str':
+        return StrColumn(array('i', [0]) * rows, [value])
+    return array(_ARRAY_TYPES[col_type], [value]) * rows
+
+
+class _Rows:
+    """
+    представление строк колоночной таблицы: длина без перебора,
+    словари записей создаются только при переборе
+    """
+
+    def __init__(self, table):
+        self._table = table
+
+    def __len__(self):
+        return self._table.live_count
+
+    def __iter__(self):
+        table = self._table
+        alive = table.alive
+        return (table.row_at(pos) for pos in range(len(alive)) if alive[pos])
+
+
+class ColumnarTable:
+    """
+    колоночная таблица: int - array('q'), bool - array('b'), str - словарное кодирование
+    строки упорядочены по ID, поиск по ID - двоичный поиск по столбцу ID;
+    удаленные строки помечаются в alive и убираются при уплотнении
+    """
+
+    def __init__(self, name, schema, next_id=1):
+        self.name = name
+        self.schema = schema  # [(столбец, тип)]
+        self.columns = {col_name: _new_column(col_type) for col_name, col_type in schema}
+        self.ids = self.columns['ID']
+        self.alive = array('b')
+        self.live_count = 0
+        self.next_id = next_id
+        self.indexes = {}
+        self.log_size = 0  # записей журнала после снимка
+        self._bool_columns = [col_name for col_name, col_type in schema if col_type == 'bool']
+
+    @classmethod
+    def from_rows(cls, name, schema, rows, next_id=1):
+        table = cls(name, schema, next_id)
+        for row in sorted(rows, key=lambda row: row['ID']):
+            table._append(row)
+        return table
+
+    def sync_indexes(self, index_defs):
+        """
+        вторичные индексы для колоночных таблиц не строятся
+        """
+
+    @property
+    def rows(self):
+        return _Rows(self)
+
+    def row_at(self, pos):
+        row = {col_name: self.columns[col_name][pos] for col_name, _ in self.schema}
+        for col_name in self._bool_columns:
+            row[col_name] = bool(row[col_name])
+        return row
+
+    def _position(self, record_id):
+        pos = bisect_left(self.ids, record_id)
+        if pos < len(self.ids) and self.ids[pos] == record_id and self.alive[pos]:
+            return pos
+        return None
+
+    def min_id(self):
+        for pos in range(len(self.ids)):
+            if self.alive[pos]:
+                return self.ids[pos]
+        return None
+
+    def max_id(self):
+        for pos in range(len(self.ids) - 1, -1, -1):
+            if self.alive[pos]:
+                return self.ids[pos]
+        return None
+
+    def lookup(self, column, value):
+        """
+        поиск по ID; для остальных столбцов индексов нет
+        """
+        if column != 'ID':
+            return None
+        pos = self._position(value)
+        return [self.row_at(pos)] if pos is not None else []
+
+    def column_values(self, column):
+        """
+        значения одного столбца живых строк без сборки записей
+        """
+        alive = self.alive
+        values = (value for value, is_alive in zip(self.columns[column], alive) if is_alive)
+        return map(bool, values) if column in self._bool_columns else values
+
+    def project(self, columns):
+        """
+        записи только из нужных столбцов (для агрегатов и группировки)
+        """
+        columns = list(columns)
+        for values in zip(*(self.column_values(column) for column in columns)):
+            yield dict(zip(columns, values))
+
+    def scan_column(self, column, predicate):
+        """
+        перебор одного столбца; записи собираются только для подходящих строк
+        в метрики записывается кол-во просмотренных позиций
+        """
+        alive = self.alive
+        values = self.columns[column]
+        if column in self._bool_columns:
+            values = map(bool, values)
+        pos = -1
+        try:
+            for pos, value in enumerate(values):
+                if alive[pos] and predicate(value):
+                    yield self.row_at(pos)
+        finally:
+            count('rows_scanned', pos + 1)
+
+    def _append(self, record):
+        record_id = record['ID']
+        pos = len(self.ids)
+        if self.ids and record_id <= self.ids[-1]:
+            # повтор ID при применении журнала - замена строки
+            pos = bisect_left(self.ids, record_id)
+            if self.ids[pos] == record_id:
+                self._set(pos, record)
+                if not self.alive[pos]:
+                    self.alive[pos] = 1
+                    self.live_count += 1
+                return
+        for col_name, col_type in self.schema:
+            value = record.get(col_name)
+            self.columns[col_name].insert(pos, value if value is not None else _DEFAULTS[col_type])
+        self.alive.insert(pos, 1)
+        self.live_count += 1
+        self.next_id = max(self.next_id, record_id + 1)
+
+    def _set(self, pos, values):
+        for col_name, value in values.items():
+            if col_name in self.columns and col_name != 'ID':
+                self.columns[col_name][pos] = value
+
+    def insert(self, record):
+        self._append(record)
+        return [{'op': 'insert', 'row': record}]
+
+    def insert_many(self, records):
+        for record in records:
+            self._append(record)
+        return [{'op': 'insert_many', 'rows': records}]
+
+    def update(self, records, values):
+        ids = []
+        for record in records:
+            pos = self._position(record['ID'])
+            if pos is None:
+                continue
+            self._set(pos, values)
+            record.update(values)
+            ids.append(record['ID'])
+        return [{'op': 'update', 'ids': ids, 'values': values}]
+
+    def delete(self, records):
+        ids = []
+        for record in records:
+            pos = self._position(record['ID'])
+            if pos is None:
+                continue
+            self.alive[pos] = 0
+            self.live_count -= 1
+            ids.append(record['ID'])
+        return [{'op': 'delete', 'ids': ids}]
+
+    def apply_log(self, entries):
+        """
+        применение записей журнала; возвращает их количество
+        """
+        count = 0
+        for entry in entries:
+            count += 1
+            op = entry.get('op')
+            if op == 'insert':
+                self._append(entry['row'])
+            elif op == 'insert_many':
+                for row in entry['rows']:
+                    self._append(row)
+            elif op == 'update':
+                for record_id in entry_ids(entry):
+                    pos = self._position(record_id)
+                    if pos is not None:
+                        self._set(pos, entry['values'])
+            elif op == 'delete':
+                for record_id in entry_ids(entry):
+                    pos = self._position(record_id)
+                    if pos is not None:
+                        self.alive[pos] = 0
+                        self.live_count -= 1
+            elif op == 'alter':
+                self._alter(entry)
+            elif op == 'meta':
+                self.next_id = max(self.next_id, entry['next_id'])
+        return count
+
+    def _alter(self, entry):
+        """
+        изменение схемы из журнала: строки, записанные до добавления столбца, получают значение
+        по умолчанию (в том числе поверх значений одноименного удаленного столбца);
+        удаленные столбцы не входят в схему таблицы и не читаются
+        """
+        column = entry.get('add')
+        if column in self.columns:
+            col_type = dict(self.schema)[column]
+            self.columns[column] = _filled_column(col_type, entry['default'], len(self.ids))
+
+    def size_bytes(self):
+        size = self.alive.itemsize * len(self.alive)
+        for column in self.columns.values():
+            size += column.size_bytes() if isinstance(column, StrColumn) else column.itemsize * len(column)
+        return size
+
+
+
+def save_columnar(table, data_dir='data'):
+    """
+    запись колоночного снимка: заголовок json + столбцы подряд
+    удаленные строки в снимок не попадают
+    """
+    alive = table.alive
+    has_deleted = table.live_count != len(alive)
+    sections = []
+    header_columns = []
+    offset = 0
+    for col_name, col_type in table.schema:
+        column = table.columns[col_name]
+        values = column.codes if isinstance(column, StrColumn) else column
+        if has_deleted:
+            values = array(values.typecode, (value for value, is_alive in zip(values, alive) if is_alive))
+        data = values.tobytes()
+        meta = {'name': col_name, 'type': col_type, 'typecode': values.typecode, 'offset': offset, 'length': len(data)}
+        sections.append(data)
+        offset += len(data)
+        if isinstance(column, StrColumn):
+            dictionary = json.dumps(column.values, ensure_ascii=False).encode('utf-8')
+            meta['dict_offset'], meta['dict_length'] = offset, len(dictionary)
+            sections.append(dictionary)
+            offset += len(dictionary)
+        header_columns.append(meta)
+
+    header = json.dumps({'rows': table.live_count, 'next_id': table.next_id,
+                         'byteorder': sys.byteorder, 'columns': header_columns}).encode('utf-8')
+    filepath = _table_path(table.name, data_dir, 'col')
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(COLUMNAR_MAGIC)
+        f.write(len(header).to_bytes(4, 'little'))
+        f.write(header)
+        for data in sections:
+            f.write(data)
+    os.replace(tmp_path, filepath)
+    reset_table_log(table.name, data_dir, table.next_id)
+
+
+def _read_columnar(name, schema, filepath):
+    """
+    чтение колоночного снимка через mmap: столбцы копируются в массивы целиком,
+    без разбора отдельных строк
+    """
+    table = ColumnarTable(name, schema)
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC:
+            raise ValueError(f'Файл {filepath} не является колоночным снимком')
+        pos = len(COLUMNAR_MAGIC)
+        header_len = int.from_bytes(mm[pos:pos + 4], 'little')
+        header = json.loads(mm[pos + 4:pos + 4 + header_len])
+        base = pos + 4 + header_len
+        swap = header['byteorder'] != sys.byteorder
+
+        for meta in header['columns']:
+            if meta['name'] not in table.columns:
+                continue
+            values = array(meta['typecode'])
+            values.frombytes(mm[base + meta['offset']:base + meta['offset'] + meta['length']])
+            if swap:
+                values.byteswap()
+            if meta['type'] == 'str':
+                start = base + meta['dict_offset']
+                dictionary = json.loads(mm[start:start + meta['dict_length']].decode('utf-8'))
+                table.columns[meta['name']] = StrColumn(values, dictionary)
+            else:
+                table.columns[meta['name']] = values
+
+    rows = header['rows']
+    # столбцы, добавленные после записи снимка, заполняются значениями по умолчанию
+    for col_name, col_type in schema:
+        column = table.columns[col_name]
+        if len(column.codes if isinstance(column, StrColumn) else column) != rows:
+            table.columns[col_name] = _filled_column(col_type, _DEFAULTS[col_type], rows)
+    table.ids = table.columns['ID']
+    table.alive = array('b', b'\x01' * rows)
+    table.live_count = rows
+    table.next_id = header['next_id']
+    return table
+
+
+def load_columnar(name, schema, data_dir='data', auto_compact=True):
+    """
+    загрузка колоночной таблицы: снимок .col (или json при первом открытии) + журнал
+    auto_compact - записать снимок, если журнал разросся
+    """
+    filepath = _table_path(name, data_dir, 'col')
+    if os.path.exists(filepath):
+        table = _read_columnar(name, schema, filepath)
+        table.log_size = table.apply_log(read_table_log(name, data_dir))
+    else:
+        rows, next_id, log_size = read_table(name, data_dir)
+        table = ColumnarTable.from_rows(name, schema, rows, next_id)
+        table.log_size = log_size
+
+    if auto_compact and needs_compaction(table.log_size, table.live_count):
+        save_columnar(table, data_dir)
+        table.log_size = 0
+    return table
@@ -1,93 +1,88 @@
+import json
+from itertools import islice
+
 from prettytable import PrettyTable
 
-from .decorators import confirm_action, create_cacher, handle_db_errors, log_time
-from .utils import load_table_data, save_table_data
+from . import metrics
+from .database import DEFAULT_BATCH_SIZE, Database, aggregate_label
+from .decorators import command_failed, confirm_action, handle_db_errors
+from .metrics import phase
+from .parser import parse_set
+
+OUTPUT_FORMATS = {'table', 'tsv', 'jsonl'}
+STATS_FORMATS = {'json', 'prometheus'}
+
+# кол-во строк на страницу вывода select
+PAGE_SIZE = 100
 
-SUPPORTED_TYPES = {'int', 'str', 'bool'}
+# названия путей доступа в выводе explain
+ACCESS_NAMES = {
+    'full_scan': 'полный перебор',
+    'parallel_scan': 'параллельный перебор',
+    'id_lookup': 'поиск по ID',
+    'index_lookup': 'поиск по индексу',
+    'index_range': 'диапазон по индексу',
+    'index_union': 'объединение индексов',
+}
 
-query_cacher = create_cacher()
+# команды консоли - оболочка над программным интерфейсом:
+# проверка ввода и вывод результатов, данные берутся из db
+db = Database()
+
+# формат вывода подготовленных запросов: имя -> table, tsv или jsonl
+prepared_formats = {}
 
 @handle_db_errors
-def create_table(metadata, table_name, columns):
+def create_table(table_name, columns):
     """
     создание таблицы
     """
-    if table_name in metadata:
-        print(f'Ошибка: Таблица "{table_name}" уже существует.')
-        return None
-
-    parsed_columns = []
-    for col in columns:
-        if ':' not in col:
-            print(f'Некорректное значение: {col}. Формат: имя:тип')
-            return None
-        name, dtype = col.split(':', 1)
-        if not name or dtype not in SUPPORTED_TYPES:
-            print(f'Некорректное значение: {col}. Тип должен быть int, str или bool.')
-            return None
-        parsed_columns.append(f'{name}:{dtype}')
-
-    final_columns = ['ID:int'] + parsed_columns
-
-    metadata[table_name] = final_columns
+    final_columns = db.create_table(table_name, columns)
     print(f'Таблица "{table_name}" успешно создана со столбцами: {", ".join(final_columns)}')
-    return metadata
+    return final_columns
 
 @handle_db_errors
 @confirm_action("удаление таблицы")
-def drop_table(metadata, table_name, confirm=True):
+def drop_table(table_name, confirm=True):
     """
     удаление таблицы
     """
-    if table_name not in metadata:
-        print(f'Ошибка: Таблица "{table_name}" не существует.')
-        return None
-
-    del metadata[table_name]
+    db.drop_table(table_name)
     print(f'Таблица "{table_name}" успешно удалена.')
-    return metadata
+    return True
+
+@handle_db_errors
+def add_column(table_name, column, default=None):
+    """
+    добавление столбца без перезаписи строк
+    """
+    columns = db.add_column(table_name, column, default)
+    print(f'Столбец добавлен в таблицу "{table_name}". Столбцы: {", ".join(columns)}')
+    return columns
+
+@handle_db_errors
+@confirm_action("удаление столбца")
+def drop_column(table_name, column, confirm=True):
+    """
+    удаление столбца без перезаписи строк
+    """
+    columns = db.drop_column(table_name, column)
+    print(f'Столбец "{column}" удален из таблицы "{table_name}". Столбцы: {", ".join(columns)}')
+    return columns
 
 @handle_db_errors
-def list_tables(metadata):
+def list_tables():
     """
     список всех таблиц
     """
-    if not metadata:
+    names = db.list_tables()
+    if not names:
         print('Нет созданных таблиц.')
         return
 
-    for table in sorted(metadata.keys()):
+    for table in names:
         print(f'- {table}')
 
-def _parse_value(value_str, expected_type):
-    """
-    парсинг значения согласно ожидаемому типу
-    """
-    value_str = value_str.strip()
-    
-    if expected_type == 'int':
-        try:
-            return int(value_str)
-        except ValueError:
-            raise ValueError(f'Некорректное целое число: {value_str}')
-    
-    elif expected_type == 'bool':
-        if value_str.lower() in ('true', '1', 'yes'):
-            return True
-        elif value_str.lower() in ('false', '0', 'no'):
-            return False
-        else:
-            raise ValueError(f'Некорректное булево значение: {value_str}')
-    
-    elif expected_type == 'str':
-        # очитска от кавычек если они есть
-        if (value_str.startswith('"') and value_str.endswith('"')) or \
-           (value_str.startswith("'") and value_str.endswith("'")):
-            return value_str[1:-1]
-        return value_str
-    
-    return value_str
-
 def _convert_to_string(value):
     """
     конвертация значения в строку для вывода
@@ -96,273 +91,419 @@ def _convert_to_string(value):
         return str(value)
     return str(value)
 
+def _print_page(field_names, page, output_format, with_header):
+    """
+    вывод страницы строк (значения в порядке field_names) в нужном формате
+    """
+    if output_format == 'tsv':
+        lines = ['\t'.join(field_names)] if with_header else []
+        lines.extend('\t'.join(_convert_to_string(value) for value in row) for row in page)
+        print('\n'.join(lines))
+    elif output_format == 'jsonl':
+        print('\n'.join(json.dumps(dict(zip(field_names, row)), ensure_ascii=False) for row in page))
+    else:
+        output = PrettyTable()
+        output.field_names = field_names
+        for row in page:
+            output.add_row([_convert_to_string(value) for value in row])
+        print(output)
+
+def _print_rows(field_names, rows, output_format):
+    """
+    вывод строк страницами по PAGE_SIZE; возвращает кол-во выведенных строк
+    отбор строк (ленивый) и вывод замеряются как фазы filter и render
+    """
+    rows = iter(rows)
+    printed = 0
+    while True:
+        with phase('filter'):
+            page = list(islice(rows, PAGE_SIZE))
+        if not page:
+            break
+        with phase('render'):
+            _print_page(field_names, page, output_format, printed == 0)
+        printed += len(page)
+    return printed
+
+def _check_format(output_format):
+    """
+    проверка формата вывода
+    """
+    if output_format not in OUTPUT_FORMATS:
+        command_failed(f'Некорректный формат вывода: {output_format}. Формат должен быть table, tsv или jsonl.')
+        return False
+    return True
+
 @handle_db_errors
-@log_time
-def insert(metadata, table_name, values):
+def insert(table_name, values):
     """
     вставка данных в таблицу
     """
-    if table_name not in metadata:
-        print(f'Ошибка: Таблица "{table_name}" не существует.')
+    new_id = db.insert(table_name, values)
+    print(f'Запись с ID={new_id} успешно добавлена в таблицу "{table_name}".')
+    return new_id
+
+@handle_db_errors
+def insert_many(table_name, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    массовая вставка данных в таблицу
+    """
+    inserted = db.insert_many(table_name, rows, batch_size)
+    print(f'В таблицу "{table_name}" добавлено записей: {inserted}.')
+    return inserted
+
+@handle_db_errors
+def import_file(table_name, filepath, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    импорт записей из csv (с заголовком) или jsonl файла
+    """
+    inserted = db.import_file(table_name, filepath, batch_size)
+    print(f'В таблицу "{table_name}" добавлено записей: {inserted}.')
+    return inserted
+
+def _format_ids(ids):
+    """
+    список ID для вывода: подряд идущие ID сворачиваются в диапазоны (1-3, 7)
+    """
+    ranges = []
+    for record_id in sorted(ids):
+        if ranges and record_id == ranges[-1][1] + 1:
+            ranges[-1][1] = record_id
+        else:
+            ranges.append([record_id, record_id])
+    return ', '.join(str(low) if low == high else f'{low}-{high}' for low, high in ranges)
+
+@handle_db_errors
+def select(table_name, where_clause=None, limit=None, offset=0, output_format='table', order_by=None, descending=False):
+    """
+    выборка данных из таблицы
+    записи выводятся потоково, страницами по PAGE_SIZE строк
+    """
+    if not _check_format(output_format):
         return None
 
-    # загрузка текущих данных
-    table_data = load_table_data(table_name)
-    
-    # схема таблицы без ID
-    columns_schema = metadata[table_name]
-    data_columns = columns_schema[1:]  
-    
-    # кол-во значений
-    if len(values) != len(data_columns):
-        print(f'Ошибка: Ожидается {len(data_columns)} значений, получено {len(values)}')
+    rows = db.select(table_name, where_clause, limit, offset, as_tuples=True, order_by=order_by, descending=descending)
+    printed = _print_rows(db.columns(table_name), rows, output_format)
+    if printed == 0:
+        _report_empty(table_name)
+    return printed
+
+def _report_empty(table_name):
+    """
+    сообщение о пустом результате выборки
+    """
+    if db.count(table_name) == 0:
+        print(f'Таблица "{table_name}" пуста.')
+    else:
+        print('Записи не найдены.')
+
+@handle_db_errors
+def join(left_table, right_table, left_column, right_column, where_clause=None, limit=None, offset=0, output_format='table',
+         order_by=None, descending=False):
+    """
+    соединение двух таблиц по равенству столбцов
+    строки выводятся потоково, столбцы - с именем таблицы
+    """
+    if not _check_format(output_format):
         return None
-    
-    # парсинг значений
-    parsed_values = []
-    for i, value in enumerate(values):
-        col_name, col_type = data_columns[i].split(':')
-        try:
-            parsed_value = _parse_value(value, col_type)
-            parsed_values.append(parsed_value)
-        except ValueError as e:
-            print(f'Ошибка в значении "{value}" для столбца "{col_name}": {e}')
-            return None
-    
-    # создание ID
-    new_id = 1
-    if table_data:
-        ids = [record['ID'] for record in table_data]
-        new_id = max(ids) + 1
-    
-    # создание записи
-    record = {'ID': new_id}
-    for i, col in enumerate(data_columns):
-        col_name = col.split(':')[0]
-        record[col_name] = parsed_values[i]
-    
-    # добавление запись
-    table_data.append(record)
-    save_table_data(table_name, table_data)
-    
-    # очистка кэша таблицы после изменения данных
-    query_cacher.clear()
-    
-    print(f'Запись с ID={new_id} успешно добавлена в таблицу "{table_name}".')
-    return table_data
 
-def _parse_condition(condition_str):
+    rows = db.join(left_table, right_table, left_column, right_column, where_clause, limit, offset,
+                   as_tuples=True, order_by=order_by, descending=descending)
+    printed = _print_rows(db.join_columns(left_table, right_table), rows, output_format)
+    if printed == 0:
+        print('Записи не найдены.')
+    return printed
+
+@handle_db_errors
+def aggregate(table_name, aggregates, where_clause=None, group_by=None, limit=None, offset=0, output_format='table',
+              order_by=None, descending=False):
     """
-    парсинг условия
+    агрегатный запрос: count, sum, min, max, avg с группировкой
     """
-    if '=' in condition_str:
-        parts = condition_str.split('=', 1)
-        column = parts[0].strip()
-        value = parts[1].strip()
-        return column, value
-    return None, None
+    if not _check_format(output_format):
+        return None
+
+    result = db.aggregate(table_name, aggregates, where_clause, group_by, limit, offset, order_by, descending)
+    if not result:
+        print('Записи не найдены.')
+        return None
+    field_names = ([group_by] if group_by else []) + [aggregate_label(func, column) for func, column in aggregates if func is not None]
+    _print_rows(field_names, ([row[name] for name in field_names] for row in result), output_format)
+    return result
 
 @handle_db_errors
-@log_time
-def select(metadata, table_name, where_clause=None):
+def prepare(name, table_name, where_clause=None, limit=None, offset=0, output_format='table', aggregates=None, group_by=None,
+            order_by=None, descending=False):
     """
-    выборка данных из таблицы
+    подготовка запроса select с параметрами ? в условии
     """
-    if table_name not in metadata:
-        print(f'Ошибка: Таблица "{table_name}" не существует.')
-        return
+    if not _check_format(output_format):
+        return None
 
-    def _execute_select():
-        table_data = load_table_data(table_name)
-        
-        if not table_data:
-            print(f'Таблица "{table_name}" пуста.')
-            return
-        
-        # фильтрация
-        filtered_data = table_data
-        if where_clause:
-            column, value = _parse_condition(where_clause)
-            if not column:
-                print('Некорректное условие WHERE.')
-                return
-            
-            # тип столбца для парсинга значения
-            col_type = 'str'  
-            for col_schema in metadata[table_name]:
-                col_name, col_type_str = col_schema.split(':')
-                if col_name == column:
-                    col_type = col_type_str
-                    break
-            
-            try:
-                parsed_value = _parse_value(value, col_type)
-            except ValueError as e:
-                print(f'Ошибка в условии WHERE: {e}')
-                return
-            
-            filtered_data = [record for record in table_data 
-                            if str(record.get(column, '')) == str(parsed_value)]
-        
-        if not filtered_data:
+    statement = db.prepare(name, table_name, where_clause, limit, offset, aggregates, group_by, order_by, descending)
+    prepared_formats[name] = output_format
+    params = ', '.join(f'{param["column"]}:{param["type"]}' for param in statement['params'])
+    print(f'Запрос "{name}" подготовлен, параметров: {len(statement["params"])}' + (f' ({params}).' if params else '.'))
+    return statement
+
+@handle_db_errors
+def execute(name, values):
+    """
+    выполнение подготовленного запроса со значениями параметров
+    """
+    if db.statement(name)['aggregate']:
+        result = db.execute(name, values)
+        statement = db.statement(name)
+        if not result:
             print('Записи не найдены.')
-            return
-        
-        # таблица для вывода
-        table = PrettyTable()
-        table.field_names = [col.split(':')[0] for col in metadata[table_name]]
-        
-        for record in filtered_data:
-            row = []
-            for col in metadata[table_name]:
-                col_name = col.split(':')[0]
-                row.append(_convert_to_string(record.get(col_name, '')))
-            table.add_row(row)
-        
-        print(table)
-        return filtered_data
-
-    
-    cache_key = f"select_{table_name}_{where_clause}"
-    
-    
-    return query_cacher(cache_key, _execute_select)
+            return None
+        field_names = statement['columns']
+        _print_rows(field_names, ([row[column] for column in field_names] for row in result), prepared_formats.get(name, 'table'))
+        return result
+
+    rows = db.execute(name, values, as_tuples=True)
+    # схема могла измениться: столбцы берутся после повторной подготовки в execute
+    statement = db.statement(name)
+    printed = _print_rows(statement['columns'], rows, prepared_formats.get(name, 'table'))
+    if printed == 0:
+        _report_empty(statement['table'])
+    return printed
 
 @handle_db_errors
-def update(metadata, table_name, set_clause, where_clause):
+def deallocate(name):
     """
-    обновление данных в таблице
+    удаление подготовленного запроса
     """
-    if table_name not in metadata:
-        print(f'Ошибка: Таблица "{table_name}" не существует.')
-        return None
+    db.deallocate(name)
+    prepared_formats.pop(name, None)
+    print(f'Запрос "{name}" удален.')
+    return True
+
+@handle_db_errors
+def explain(table_name, where_clause=None, limit=None, offset=0):
+    """
+    план выборки: выбранный путь доступа, оценка и фактическое кол-во строк, рассмотренные варианты
+    """
+    plan = db.explain(table_name, where_clause, limit, offset)
+    access = ACCESS_NAMES[plan['access']] + (f' ({plan["column"]})' if plan['column'] else '')
+    if plan['early_stop']:
+        access += ', остановка после limit'
+    print(f'План: {access}')
+    print(f'Записей в таблице: {plan["rows"]}, оценка строк: {plan["estimated_rows"]}, фактически: {plan["actual_rows"]}')
+    if not plan['analyzed']:
+        print(f'Статистики нет, оценки по умолчанию (analyze {table_name}).')
 
-    table_data = load_table_data(table_name)
-    
-    if not table_data:
+    output = PrettyTable()
+    output.field_names = ['', 'путь доступа', 'столбец', 'кандидатов', 'стоимость']
+    for path in plan['alternatives']:
+        chosen = (path['access'], path['column']) == (plan['access'], plan['column'])
+        output.add_row(['*' if chosen else '', ACCESS_NAMES[path['access']], path['column'] or '-', path['candidates'], path['cost']])
+    print(output)
+    return plan
+
+@handle_db_errors
+def update(table_name, set_clause, where_clause):
+    """
+    обновление данных в таблице
+    """
+    if not set_clause or not where_clause:
+        return command_failed('Некорректный формат SET или WHERE условия.')
+    if db.count(table_name) == 0:
         print(f'Таблица "{table_name}" пуста.')
         return None
-    
-    # парсинг условий
-    set_column, set_value = _parse_condition(set_clause)
-    where_column, where_value = _parse_condition(where_clause)
-    
-    if not set_column or not where_column:
-        print('Некорректный формат SET или WHERE условия.')
-        return None
-    
-    # определение типа для SET значения
-    set_col_type = 'str'
-    for col_schema in metadata[table_name]:
-        col_name, col_type_str = col_schema.split(':')
-        if col_name == set_column:
-            set_col_type = col_type_str
-            break
-    
-    # определение типа для WHERE значения
-    where_col_type = 'str'
-    for col_schema in metadata[table_name]:
-        col_name, col_type_str = col_schema.split(':')
-        if col_name == where_column:
-            where_col_type = col_type_str
-            break
-    
+
     try:
-        parsed_set_value = _parse_value(set_value, set_col_type)
-        parsed_where_value = _parse_value(where_value, where_col_type)
+        values = parse_set(set_clause)
     except ValueError as e:
-        print(f'Ошибка в значении: {e}')
-        return None
-    
-    # поиск и обновление записи
-    updated_count = 0
-    updated_ids = []
-    
-    for record in table_data:
-        if str(record.get(where_column, '')) == str(parsed_where_value):
-            record[set_column] = parsed_set_value
-            updated_count += 1
-            updated_ids.append(record['ID'])
-    
-    if updated_count == 0:
+        return command_failed(f'Ошибка в значении: {e}')
+
+    updated_ids = db.update(table_name, values, where_clause)
+    if not updated_ids:
         print('Записи для обновления не найдены.')
         return None
-    
-    save_table_data(table_name, table_data)
-    
-    query_cacher.clear()
-    
-    print(f'Запись с ID={updated_ids[0]} в таблице "{table_name}" успешно обновлена.')
-    return table_data
+
+    if len(updated_ids) == 1:
+        print(f'Запись с ID={updated_ids[0]} в таблице "{table_name}" успешно обновлена.')
+    else:
+        print(f'Записи с ID={_format_ids(updated_ids)} в таблице "{table_name}" успешно обновлены '
+              f'({len(updated_ids)} шт.).')
+    return updated_ids
 
 @handle_db_errors
 @confirm_action("удаление записей")
-def delete(metadata, table_name, where_clause, confirm=True):
+def delete(table_name, where_clause, confirm=True):
     """
     удаление данных из таблицы
     """
-    if table_name not in metadata:
-        print(f'Ошибка: Таблица "{table_name}" не существует.')
-        return None
-
-    table_data = load_table_data(table_name)
-    
-    if not table_data:
+    if db.count(table_name) == 0:
         print(f'Таблица "{table_name}" пуста.')
         return None
-    
-    where_column, where_value = _parse_condition(where_clause)
-    if not where_column:
-        print('Некорректное условие WHERE.')
-        return None
-    
-    # определение типа для WHERE значения
-    where_col_type = 'str'
-    for col_schema in metadata[table_name]:
-        col_name, col_type_str = col_schema.split(':')
-        if col_name == where_column:
-            where_col_type = col_type_str
-            break
-    
-    try:
-        parsed_where_value = _parse_value(where_value, where_col_type)
-    except ValueError as e:
-        print(f'Ошибка в условии WHERE: {e}')
-        return None
-    
-    # поиск записи для удаления
-    records_to_keep = []
-    deleted_ids = []
-    
-    for record in table_data:
-        if str(record.get(where_column, '')) == str(parsed_where_value):
-            deleted_ids.append(record['ID'])
-        else:
-            records_to_keep.append(record)
-    
+
+    deleted_ids = db.delete(table_name, where_clause)
     if not deleted_ids:
         print('Записи для удаления не найдены.')
         return None
-    
-    save_table_data(table_name, records_to_keep)
-    
-    
-    query_cacher.clear()
-    
-    print(f'Запись с ID={deleted_ids[0]} успешно удалена из таблицы "{table_name}".')
-    return records_to_keep
+
+    if len(deleted_ids) == 1:
+        print(f'Запись с ID={deleted_ids[0]} успешно удалена из таблицы "{table_name}".')
+    else:
+        print(f'Записи с ID={_format_ids(deleted_ids)} успешно удалены из таблицы "{table_name}" '
+              f'({len(deleted_ids)} шт.).')
+    return deleted_ids
 
 @handle_db_errors
-def info(metadata, table_name):
+def info(table_name):
     """
     информация о таблице
     """
-    if table_name not in metadata:
-        print(f'Ошибка: Таблица "{table_name}" не существует.')
-        return
+    table_info = db.info(table_name)
 
-    table_data = load_table_data(table_name)
-    
     print(f'Таблица: {table_name}')
-    print(f'Столбцы: {", ".join(metadata[table_name])}')
-    print(f'Количество записей: {len(table_data)}')
\ No newline at end of file
+    version = f' (версия схемы {table_info["schema_version"]})' if table_info['schema_version'] > 1 else ''
+    print(f'Столбцы: {", ".join(table_info["columns"])}{version}')
+    print(f'Количество записей: {table_info["rows"]}')
+    print(f'Формат хранения: {table_info["format"]}, в памяти ~{table_info["size_bytes"]} байт')
+    for index in table_info['indexes']:
+        print(f'Индекс: {index["column"]} ({index["kind"]}), ключей: {index["keys"]}, ~{index["size_bytes"]} байт')
+    return table_info
+
+@handle_db_errors
+def analyze(table_name):
+    """
+    сбор статистики таблицы для планировщика
+    """
+    stats = db.analyze(table_name)
+    print(f'Статистика таблицы "{table_name}" обновлена, записей: {stats["rows"]}.')
+    output = PrettyTable()
+    output.field_names = ['столбец', 'различных', 'min', 'max', 'пустых']
+    for column, col_stats in stats['columns'].items():
+        bounds = ['-' if value is None else _convert_to_string(value) for value in (col_stats['min'], col_stats['max'])]
+        output.add_row([column, col_stats['distinct'], *bounds, col_stats['empty']])
+    print(output)
+    return stats
+
+@handle_db_errors
+def compact(table_name):
+    """
+    уплотнение журнала изменений таблицы
+    """
+    rows = db.compact(table_name)
+    print(f'Журнал таблицы "{table_name}" уплотнен, записей: {rows}.')
+    return rows
+
+@handle_db_errors
+def create_index(table_name, column, kind='hash'):
+    """
+    создание индекса по столбцу
+    """
+    db.create_index(table_name, column, kind)
+    print(f'Индекс {kind} по столбцу "{column}" таблицы "{table_name}" успешно создан.')
+    return True
+
+@handle_db_errors
+def drop_index(table_name, column):
+    """
+    удаление индекса по столбцу
+    """
+    db.drop_index(table_name, column)
+    print(f'Индекс по столбцу "{column}" таблицы "{table_name}" успешно удален.')
+    return True
+
+@handle_db_errors
+def convert_table(table_name, storage_format):
+    """
+    смена формата хранения таблицы
+    """
+    db.convert_table(table_name, storage_format)
+    print(f'Таблица "{table_name}" переведена в формат {storage_format}.')
+    return True
+
+@handle_db_errors
+def cache_stats():
+    """
+    статистика кэша запросов и кэша таблиц
+    """
+    all_stats = db.cache_stats()
+    stats = all_stats['query']
+    print(f'Кэш запросов: записей {stats["entries"]}/{stats["max_entries"]}, '
+          f'~{stats["bytes"]}/{stats["max_bytes"]} байт')
+    print(f'Попадания: {stats["hits"]}, промахи: {stats["misses"]}, доля попаданий: {stats["hit_rate"]:.1%}')
+    print(f'Вытеснено: {stats["evictions"]}, истекло: {stats["expired"]}')
+    if stats['ttl'] is not None:
+        print(f'Время жизни записей: {stats["ttl"]} с')
+    table_stats = all_stats['tables']
+    print(f'Кэш таблиц: {", ".join(table_stats["tables"]) or "пусто"}, '
+          f'~{table_stats["used_bytes"]}/{table_stats["max_bytes"]} байт')
+    return all_stats
+
+def _format_ms(value):
+    return '-' if value is None else f'{value:.3f}'
+
+@handle_db_errors
+def show_stats():
+    """
+    метрики команд с начала работы: время, фазы, строки, байты, попадания в кэши
+    """
+    summary = metrics.operations_summary()
+    if not summary:
+        print('Метрик пока нет.')
+        return None
+
+    output = PrettyTable()
+    output.field_names = ['команда', 'кол-во', 'p50, мс', 'p99, мс', 'среднее, мс', 'фазы (среднее, мс)', 'счетчики']
+    output.align['фазы (среднее, мс)'] = 'l'
+    output.align['счетчики'] = 'l'
+    for op, op_stats in sorted(summary.items()):
+        phases = ', '.join(f'{name} {seconds:.3f}' for name, seconds in sorted(op_stats['phases_ms'].items()))
+        counters = ', '.join(f'{name} {value}' for name, value in sorted(op_stats['counters'].items()))
+        output.add_row([op, op_stats['count'], _format_ms(op_stats['p50_ms']), _format_ms(op_stats['p99_ms']),
+                        _format_ms(op_stats['mean_ms']), phases, counters])
+    print(output)
+    return summary
+
+@handle_db_errors
+def reset_stats():
+    """
+    сброс метрик
+    """
+    metrics.reset()
+    print('Метрики сброшены.')
+    return True
+
+@handle_db_errors
+def export_stats(filepath, export_format='json'):
+    """
+    выгрузка метрик в файл (json или текстовый формат Prometheus)
+    """
+    if export_format not in STATS_FORMATS:
+        return command_failed(f'Некорректный формат: {export_format}. Формат должен быть json или prometheus.')
+    metrics.export(filepath, export_format)
+    print(f'Метрики сохранены в {filepath} ({export_format}).')
+    return True
+
+@handle_db_errors
+def begin():
+    """
+    начало транзакции
+    """
+    db.begin()
+    print('Транзакция начата.')
+    return True
+
+@handle_db_errors
+def commit():
+    """
+    фиксация транзакции: все изменения записываются на диск разом
+    """
+    changed = db.commit()
+    print(f'Транзакция зафиксирована, изменено таблиц: {changed}.')
+    return changed
+
+@handle_db_errors
+def rollback():
+    """
+    отмена транзакции: изменения отбрасываются
+    """
+    db.rollback()
+    print('Транзакция отменена.')
+    return True
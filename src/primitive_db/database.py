@@ -0,0 +1,1253 @@
+import copy
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+
+from . import parallel, planner
+from .binary import BinaryTable, StaleSnapshotError
+from .decorators import create_cacher
+from .errors import (
+    ColumnExistsError,
+    ColumnNotFoundError,
+    IndexExistsError,
+    IndexNotFoundError,
+    StatementNotFoundError,
+    TableExistsError,
+    TableNotFoundError,
+    TransactionError,
+    UnsupportedError,
+    ValidationError,
+)
+from .index import INDEX_TYPES
+from .metrics import count, phase
+from .parser import AGGREGATE_FUNCTIONS, parse_value
+from .sort import sort_key, sorted_rows, top_rows
+from .storage import STORAGE_FORMATS, TableManager, tables
+from .utils import read_import_file
+from .where import (
+    bind_condition,
+    checked_rows,
+    compile_condition,
+    condition_columns,
+    conjoin,
+    conjuncts,
+    fill_parameters,
+    parse_condition,
+    rename_columns,
+)
+
+SUPPORTED_TYPES = {'int', 'str', 'bool'}
+# значение добавленного столбца в существующих строках, если default не указан
+TYPE_DEFAULTS = {'int': 0, 'str': '', 'bool': False}
+
+# результаты select большего размера не кэшируются
+CACHE_MAX_ROWS = 10000
+# размер пакета по умолчанию для массовой вставки
+DEFAULT_BATCH_SIZE = 10000
+# кол-во разобранных условий WHERE в кэше
+CONDITION_CACHE_ENTRIES = 1024
+
+_MISSING = object()
+
+
+@lru_cache(maxsize=256)
+def resolve_columns(columns):
+    """
+    разбор описания столбцов ('имя:тип', кортеж) один раз на версию схемы
+    возвращает (имена по порядку, столбец -> тип, кортежи (позиция, имя, тип));
+    результат общий для всех вызовов и не изменяется
+    """
+    fields = tuple((position, *column.split(':')) for position, column in enumerate(columns))
+    names = tuple(name for _, name, _ in fields)
+    types = {name: column_type for _, name, column_type in fields}
+    return names, types, fields
+
+def parse_column(column):
+    """
+    описание столбца 'имя:тип' или пара (имя, тип) -> (имя, тип)
+    """
+    if isinstance(column, str):
+        if ':' not in column:
+            raise ValidationError(f'Некорректное значение: {column}. Формат: имя:тип')
+        name, dtype = column.split(':', 1)
+    else:
+        name, dtype = column
+    if not name or dtype not in SUPPORTED_TYPES:
+        raise ValidationError(f'Некорректное значение: {name}:{dtype}. Тип должен быть int, str или bool.')
+    return name, dtype
+
+def coerce_value(value, expected_type):
+    """
+    приведение значения к типу столбца
+    строки разбираются через parse_value, значения нужного типа (например, из jsonl) принимаются как есть
+    """
+    if isinstance(value, str):
+        return parse_value(value, expected_type)
+    if expected_type == 'bool' and isinstance(value, bool):
+        return value
+    if expected_type == 'int' and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return parse_value(str(value), expected_type)
+
+def aggregate_label(func, column):
+    """
+    имя столбца результата агрегата: sum(age)
+    """
+    return column if func is None else f'{func}({column})'
+
+def _fast_aggregate(table, func, column):
+    """
+    агрегат без перебора строк: из счетчиков таблицы и упорядоченных индексов
+    _MISSING - быстрого ответа нет
+    """
+    if func == 'count' and column == '*':
+        return len(table.rows)
+    if func in ('min', 'max'):
+        if column == 'ID':
+            return table.min_id() if func == 'min' else table.max_id()
+        index = table.indexes.get(column)
+        if index is not None and index.kind == 'sorted':
+            return index.first() if func == 'min' else index.last()
+    return _MISSING
+
+def _reduce_values(func, values):
+    """
+    агрегат по потоку значений одного столбца (встроенные функции, один проход)
+    """
+    if func == 'count':
+        return sum(1 for value in values if value is not None)
+    values = (value for value in values if value is not None)
+    if func == 'min':
+        return min(values, default=None)
+    if func == 'max':
+        return max(values, default=None)
+    if func == 'sum':
+        return sum(values)
+    total = count = 0
+    for value in values:
+        total += value
+        count += 1
+    return total / count if count else None
+
+def _make_accumulator(func, column):
+    """
+    накопитель агрегата: (шаг, итог, слияние)
+    состояние - список [кол-во, значение]; слияние добавляет к состоянию состояние другой части таблицы
+    """
+    def step(state, record):
+        value = 1 if column == '*' else record.get(column)
+        if value is None:
+            return
+        state[0] += 1
+        current = state[1]
+        if current is None:
+            state[1] = value
+        elif func in ('sum', 'avg'):
+            state[1] = current + value
+        elif (func == 'min' and value < current) or (func == 'max' and value > current):
+            state[1] = value
+
+    def result(state):
+        if func == 'count':
+            return state[0]
+        if func == 'avg':
+            return state[1] / state[0] if state[0] else None
+        if func == 'sum' and state[1] is None:
+            return 0
+        return state[1]
+
+    def merge_states(state, other):
+        value = other[1]
+        if value is None:
+            return
+        state[0] += other[0]
+        current = state[1]
+        if current is None:
+            state[1] = value
+        elif func in ('sum', 'avg'):
+            state[1] = current + value
+        elif (func == 'min' and value < current) or (func == 'max' and value > current):
+            state[1] = value
+
+    return step, result, merge_states
+
+def _accumulate(records, accumulators, group_by, groups):
+    """
+    накопление агрегатов по группам: ключ группы -> состояния накопителей
+    """
+    for record in records:
+        key = record.get(group_by) if group_by else None
+        states = groups.get(key)
+        if states is None:
+            states = groups[key] = [[0, None] for _ in accumulators]
+        for (step, _, _), state in zip(accumulators, states):
+            step(state, record)
+    return groups
+
+def _aggregate_chunk(task):
+    """
+    задача процесса пула: состояния агрегатов по группам в своем диапазоне снимка бинарной таблицы
+    skip - позиции строк, удаленных или измененных после снимка (их учитывает основной процесс)
+    """
+    name, schema, filepath, stamp, defaults, start, stop, expr, specs, group_by, skip = task
+    table = BinaryTable.open_snapshot(name, schema, filepath, stamp, defaults)
+    if expr is None:
+        columns = {column for _, column in specs if column != '*'} | {group_by or 'ID'}
+        records = (record for pos, record in table.snapshot_records(columns, start, stop) if pos not in skip)
+    else:
+        records = (table.row_at(pos) for pos in table.snapshot_matches(expr, start, stop) if pos not in skip)
+    return _accumulate(records, [_make_accumulator(func, column) for func, column in specs], group_by, {})
+
+
+class Database:
+    """
+    программный интерфейс базы данных
+    методы возвращают данные (строки, ID, словари со сведениями) и выбрасывают
+    исключения из errors.py; ничего не печатают и не форматируют
+    пример:
+        db = Database()
+        db.create_table('users', ['name:str', 'age:int'])
+        user_id = db.insert('users', ['John', 25])
+        for row in db.select('users', 'age > 20'):
+            ...
+    """
+
+    def __init__(self, data_dir='data', meta_path='db_meta.json', cache_ttl=None, table_cache_bytes=None):
+        # одна база в процессе - один менеджер таблиц (общие кэш и блокировки)
+        if (data_dir, meta_path) == (tables.data_dir, tables.meta_path):
+            self.tables = tables
+        else:
+            self.tables = TableManager(data_dir, meta_path)
+        # table_cache_bytes - бюджет памяти кэша таблиц (None - TABLE_CACHE_BYTES или уже заданный)
+        if table_cache_bytes is not None:
+            self.tables.set_max_bytes(table_cache_bytes)
+        # cache_ttl - время жизни результатов select в секундах (None - до изменения таблицы)
+        self.query_cache = create_cacher(ttl=cache_ttl)
+        # условия WHERE, разобранные и приведенные к типам столбцов: (таблица, схема, текст) -> дерево
+        self.condition_cache = create_cacher(max_entries=CONDITION_CACHE_ENTRIES, metric='condition_cache')
+        # подготовленные запросы: имя -> описание (prepare)
+        self.prepared = {}
+
+    # --- схема ---
+
+    def _table_meta(self, table_name, metadata=None):
+        if metadata is None:
+            metadata = self.tables.metadata()
+        if table_name not in metadata:
+            raise TableNotFoundError(table_name)
+        return metadata[table_name]
+
+    def _resolved(self, table_name):
+        """
+        разобранная схема таблицы (resolve_columns)
+        """
+        return resolve_columns(tuple(self._table_meta(table_name)['columns']))
+
+    def schema(self, table_name):
+        """
+        схема таблицы: столбец -> тип (с ID)
+        """
+        return dict(self._resolved(table_name)[1])
+
+    def columns(self, table_name):
+        """
+        имена столбцов таблицы по порядку (с ID)
+        """
+        return list(self._resolved(table_name)[0])
+
+    def _check_column(self, table_name, column):
+        if column not in self._resolved(table_name)[1]:
+            raise ColumnNotFoundError(table_name, column)
+
+    @contextmanager
+    def _changing_metadata(self):
+        """
+        изменение метаданных под блокировкой db_meta.json на актуальной версии
+        изменяется копия: она заменяет метаданные в памяти только после записи, поэтому при ошибке
+        проверки или записи метаданные в памяти остаются равными db_meta.json
+        """
+        with self.tables.metadata_locked() as metadata:
+            metadata = copy.deepcopy(metadata)
+            yield metadata
+            self.tables.save_metadata(metadata)
+
+    def list_tables(self):
+        return sorted(self.tables.metadata())
+
+    def create_table(self, table_name, columns):
+        """
+        создание таблицы; columns - 'имя:тип' или пары (имя, тип), ID добавляется автоматически
+        возвращает описание столбцов
+        """
+        final_columns = ['ID:int'] + ['{}:{}'.format(*parse_column(col)) for col in columns]
+
+        with self._changing_metadata() as metadata:
+            if table_name in metadata:
+                raise TableExistsError(table_name)
+            metadata[table_name] = {'columns': final_columns}
+        return final_columns
+
+    def drop_table(self, table_name):
+        with self._changing_metadata() as metadata:
+            if table_name not in metadata:
+                raise TableNotFoundError(table_name)
+            del metadata[table_name]
+            self.tables.drop_table(table_name)
+        self.query_cache.clear(table_name)
+        self.condition_cache.clear(table_name)
+
+    def _altered(self, table_name, metadata, entry):
+        """
+        запись изменения схемы: новая версия схемы в метаданных и запись alter в журнале таблицы
+        фиксируются вместе (TableManager.alter); вызывается под блокировкой метаданных
+        строки не перезаписываются - старые строки дополняются при чтении и сохраняются при уплотнении
+        """
+        table_meta = metadata[table_name]
+        table_meta['schema_version'] = table_meta.get('schema_version', 1) + 1
+        self.tables.alter(table_name, {'op': 'alter', 'version': table_meta['schema_version'], **entry}, metadata)
+        self.query_cache.clear(table_name)
+        self.condition_cache.clear(table_name)
+
+    def add_column(self, table_name, column, default=None):
+        """
+        добавление столбца без перезаписи строк; column - 'имя:тип' или пара (имя, тип)
+        существующие строки получают default (по умолчанию - 0, '' или False по типу)
+        если столбец с тем же именем удален после последнего уплотнения, таблица сначала уплотняется:
+        в журнале остались его значения, возможно другого типа
+        возвращает описание столбцов
+        """
+        name, dtype = parse_column(column)
+        if default is None:
+            default = TYPE_DEFAULTS[dtype]
+        else:
+            try:
+                default = coerce_value(default, dtype)
+            except ValueError as e:
+                raise ValidationError(f'столбец "{name}", значение по умолчанию "{default}": {e}') from e
+
+        if self.tables.in_transaction:
+            raise TransactionError('Изменение схемы недоступно внутри транзакции.')
+        with self.tables.metadata_locked() as metadata:
+            metadata = copy.deepcopy(metadata)
+            table_meta = self._table_meta(table_name, metadata)
+            if name in self._resolved(table_name)[1]:
+                raise ColumnExistsError(table_name, name)
+            if name in table_meta.get('dropped', ()):
+                self.tables.compact(table_name)
+                del table_meta['dropped']
+            table_meta['columns'] = table_meta['columns'] + [f'{name}:{dtype}']
+            self._altered(table_name, metadata, {'add': name, 'default': default})
+        return list(table_meta['columns'])
+
+    def drop_column(self, table_name, column):
+        """
+        удаление столбца без перезаписи строк: значения остаются в файлах до уплотнения, но не читаются
+        возвращает описание столбцов
+        """
+        if self.tables.in_transaction:
+            raise TransactionError('Изменение схемы недоступно внутри транзакции.')
+        with self.tables.metadata_locked() as metadata:
+            metadata = copy.deepcopy(metadata)
+            table_meta = self._table_meta(table_name, metadata)
+            self._check_column(table_name, column)
+            if column == 'ID':
+                raise ValidationError('Столбец ID удалить нельзя.')
+            if column in table_meta.get('indexes', {}):
+                raise UnsupportedError(f'По столбцу "{column}" есть индекс, удалите его перед удалением столбца.')
+            table_meta['columns'] = [col for col in table_meta['columns'] if col.split(':', 1)[0] != column]
+            table_meta['dropped'] = sorted(set(table_meta.get('dropped', ())) | {column})
+            table_meta.get('stats', {}).get('columns', {}).pop(column, None)
+            self._altered(table_name, metadata, {'drop': column})
+        return list(table_meta['columns'])
+
+    # --- изменение данных ---
+
+    def insert(self, table_name, values):
+        """
+        вставка записи; values - значения столбцов по порядку (без ID) или словарь
+        возвращает ID новой записи
+        """
+        data_columns = self._resolved(table_name)[2][1:]
+        if isinstance(values, dict):
+            values = [values.get(col_name) for _, col_name, _ in data_columns]
+        if len(values) != len(data_columns):
+            raise ValidationError(f'Ожидается {len(data_columns)} значений, получено {len(values)}')
+
+        record = {'ID': None}
+        for (_, col_name, col_type), value in zip(data_columns, values):
+            if value is None:
+                raise ValidationError(f'Отсутствует значение столбца "{col_name}"')
+            try:
+                record[col_name] = coerce_value(value, col_type)
+            except ValueError as e:
+                raise ValidationError(f'столбец "{col_name}", значение "{value}": {e}') from e
+
+        with self.tables.locked(table_name):
+            table = self.tables.load(table_name)
+            # ID из счетчика таблицы, ID удаленных записей не переиспользуются
+            record['ID'] = table.next_id
+            self.tables.write(table, table.insert(record))
+        self.query_cache.clear(table_name)
+        return record['ID']
+
+    def _flush_batch(self, table_name, batch):
+        """
+        вставка пакета записей одной дозаписью в журнал
+        ID выделяются под блокировкой таблицы и не пересекаются с записями других процессов
+        """
+        with self.tables.locked(table_name):
+            table = self.tables.load(table_name)
+            for offset, record in enumerate(batch):
+                record['ID'] = table.next_id + offset
+            self.tables.write(table, table.insert_many(batch))
+
+    def insert_many(self, table_name, rows, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        массовая вставка; rows - последовательности значений или словари столбец -> значение,
+        читаются потоково, изменения сохраняются один раз на пакет
+        возвращает кол-во добавленных записей
+        """
+        data_columns = self._resolved(table_name)[2][1:]
+        if batch_size < 1:
+            raise ValidationError(f'Некорректный размер пакета: {batch_size}')
+        col_names = [col_name for _, col_name, _ in data_columns]
+
+        inserted = 0
+        line_no = 0
+        batch = []
+        try:
+            for line_no, row in enumerate(rows, start=1):
+                if isinstance(row, dict):
+                    row = [row.get(col_name) for col_name in col_names]
+                if len(row) != len(data_columns):
+                    raise ValueError(f'Ожидается {len(data_columns)} значений, получено {len(row)}')
+
+                # ID выделяются из счетчика таблицы при записи пакета
+                record = {'ID': None}
+                for (_, col_name, col_type), value in zip(data_columns, row):
+                    if value is None:
+                        raise ValueError(f'Отсутствует значение столбца "{col_name}"')
+                    record[col_name] = coerce_value(value, col_type)
+                batch.append(record)
+
+                if len(batch) >= batch_size:
+                    self._flush_batch(table_name, batch)
+                    inserted += len(batch)
+                    batch = []
+        except ValueError as e:
+            if inserted:
+                self.query_cache.clear(table_name)
+            raise ValidationError(f'строка {line_no}: {e}. Добавлено записей: {inserted}') from e
+
+        if batch:
+            self._flush_batch(table_name, batch)
+            inserted += len(batch)
+        if inserted:
+            self.query_cache.clear(table_name)
+        return inserted
+
+    def import_file(self, table_name, filepath, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        импорт записей из csv (с заголовком) или jsonl файла
+        """
+        self._table_meta(table_name)
+        return self.insert_many(table_name, read_import_file(filepath), batch_size)
+
+    def _bind(self, table_name, where, params=None):
+        """
+        разбор условия WHERE и приведение значений к типам столбцов
+        """
+        try:
+            return bind_condition(parse_condition(where), self._resolved(table_name)[1], params)
+        except ValueError as e:
+            raise ValidationError(f'Некорректное условие WHERE: {e}') from e
+
+    def _condition(self, table_name, where):
+        """
+        типизированное условие WHERE (None, если условия нет)
+        разобранные условия кэшируются по тексту; схема в ключе: после ее изменения условие разбирается заново
+        """
+        if not where:
+            return None
+        key = (table_name, self._resolved(table_name)[2], where.strip())
+        expr = self.condition_cache.get(key)
+        if expr is None:
+            expr = self._bind(table_name, where)
+            self.condition_cache.put(key, expr)
+        return expr
+
+    def _plan(self, table, table_name, expr, limit=None, offset=0):
+        """
+        план доступа к строкам по типизированному условию и статистике таблицы (planner.py)
+        """
+        stats = self._table_meta(table_name).get('stats')
+        return planner.plan_query(table, expr, stats, limit, offset)
+
+    def _matching(self, table, table_name, expr, limit=None, offset=0):
+        """
+        записи, удовлетворяющие условию (все записи, если условия нет)
+        путь доступа выбирает планировщик; limit и offset учитываются в оценке
+        """
+        if expr is None:
+            return iter(table.rows)
+        return planner.execute(table, self._plan(table, table_name, expr, limit, offset))
+
+    def _filter(self, table, table_name, expr):
+        """
+        список записей, удовлетворяющих условию
+        """
+        with phase('filter'):
+            records = list(self._matching(table, table_name, expr))
+        if expr is None:
+            count('rows_scanned', len(records))
+        return records
+
+    def update(self, table_name, values, where=None):
+        """
+        обновление записей; values - словарь столбец -> значение
+        все записи изменяются за один проход, журнал дописывается один раз
+        возвращает ID измененных записей
+        """
+        schema = self._resolved(table_name)[1]
+        if not values:
+            raise ValidationError('Не указаны столбцы для обновления')
+        typed = {}
+        for column, value in values.items():
+            if column not in schema:
+                raise ColumnNotFoundError(table_name, column)
+            if column == 'ID':
+                raise ValidationError('Столбец ID не может быть изменен')
+            try:
+                typed[column] = coerce_value(value, schema[column])
+            except ValueError as e:
+                raise ValidationError(f'столбец "{column}", значение "{value}": {e}') from e
+        expr = self._condition(table_name, where)
+
+        with self.tables.locked(table_name):
+            table = self.tables.load(table_name)
+            records = self._filter(table, table_name, expr)
+            if records:
+                self.tables.write(table, table.update(records, typed))
+        if records:
+            self.query_cache.clear(table_name)
+        return [record['ID'] for record in records]
+
+    def delete(self, table_name, where=None):
+        """
+        удаление записей по условию; возвращает ID удаленных записей
+        """
+        expr = self._condition(table_name, where)
+        with self.tables.locked(table_name):
+            table = self.tables.load(table_name)
+            records = self._filter(table, table_name, expr)
+            if records:
+                self.tables.write(table, table.delete(records))
+        if records:
+            self.query_cache.clear(table_name)
+        return [record['ID'] for record in records]
+
+    # --- запросы ---
+
+    def count(self, table_name):
+        self._table_meta(table_name)
+        return len(self.tables.load(table_name).rows)
+
+    @staticmethod
+    def _check_page(limit, offset):
+        if (limit is not None and limit < 0) or offset < 0:
+            raise ValidationError('limit и offset должны быть неотрицательными')
+
+    def select(self, table_name, where=None, limit=None, offset=0, as_tuples=False, order_by=None, descending=False):
+        """
+        выборка записей: итератор словарей (или кортежей в порядке columns())
+        записи отбираются потоково; при заданном limit перебор прекращается,
+        как только набрано нужное кол-во; небольшие результаты кэшируются
+        order_by - сортировка по столбцу (descending - по убыванию), см. _ordered_rows
+        итератор читает таблицу в памяти: до изменения таблицы его нужно исчерпать
+        """
+        self._check_page(limit, offset)
+        order = self._order(table_name, order_by, descending)
+        return self._select(table_name, self._condition(table_name, where), limit, offset, as_tuples, order)
+
+    def _order(self, table_name, order_by, descending):
+        """
+        порядок выборки: (столбец, по убыванию); None - порядок файла (по ID)
+        """
+        if order_by is None:
+            return None
+        self._check_column(table_name, order_by)
+        if order_by == 'ID' and not descending:
+            return None
+        return (order_by, descending)
+
+    def _select(self, table_name, expr, limit, offset, as_tuples, order=None):
+        """
+        выборка по типизированному условию (select, execute)
+        """
+        field_names = self._resolved(table_name)[0]
+        # версия файлов таблицы в ключе: запись другим процессом делает старые результаты недействительными
+        cache_key = (table_name, self.tables.version(table_name), 'select', repr(expr), order, limit, offset)
+        cached = self.query_cache.get(cache_key)
+        if cached is not None:
+            count('rows_returned', len(cached))
+            rows = iter(cached)
+        else:
+            table = self.tables.load(table_name)
+            stop = None if limit is None else offset + limit
+            skipped = None if expr is not None else offset
+            if order is not None:
+                rows = self._ordered_rows(table, table_name, expr, limit, offset, order)
+                skipped = None
+            elif expr is None and hasattr(table, 'row_tuples'):
+                # бинарная таблица: строки декодируются сразу в кортежи, без словарей
+                rows = islice(table.row_tuples(), offset, stop)
+            else:
+                records = islice(self._matching(table, table_name, expr, limit, offset), offset, stop)
+                rows = (tuple(record.get(name) for name in field_names) for record in records)
+            rows = self._cached_rows(cache_key, rows, skipped=skipped)
+        if as_tuples:
+            return rows
+        return (dict(zip(field_names, row)) for row in rows)
+
+    def _ordered_rows(self, table, table_name, expr, limit, offset, order):
+        """
+        строки выборки (кортежи) в порядке сортировки, с учетом offset и limit (лениво)
+        по упорядоченному индексу на столбце записи читаются в порядке индекса, без сортировки
+        (если для условия планировщик не выбрал другой индекс); иначе с limit - первые строки
+        отбираются кучей, без limit - сортировка в памяти или внешняя (sort.py)
+        """
+        column, descending = order
+        field_names = self._resolved(table_name)[0]
+        stop = None if limit is None else offset + limit
+        index = table.indexes.get(column)
+        if index is not None and index.kind == 'sorted':
+            plan = self._plan(table, table_name, expr, limit, offset) if expr is not None else None
+            if plan is None or plan['chosen']['access'] == planner.FULL_SCAN:
+                records = index.ordered(descending)
+                if expr is None:
+                    count('rows_scanned', len(table.rows) if stop is None else min(len(table.rows), stop))
+                else:
+                    records = checked_rows(records, compile_condition(expr))
+                yield from islice((tuple(record.get(name) for name in field_names) for record in records), offset, stop)
+                return
+
+        if expr is None and hasattr(table, 'row_tuples'):
+            rows = table.row_tuples()
+        else:
+            rows = (tuple(record.get(name) for name in field_names) for record in self._matching(table, table_name, expr))
+        if expr is None:
+            count('rows_scanned', len(table.rows))
+        key = sort_key(field_names.index(column))
+        if limit is not None:
+            yield from top_rows(rows, key, stop, descending)[offset:]
+        else:
+            yield from islice(sorted_rows(rows, key, descending), offset, None)
+
+    def _cached_rows(self, cache_key, rows, skipped=None):
+        """
+        поток строк; если результат небольшой, после перебора он сохраняется в кэш
+        skipped - пропущенные записи перебора без условия (для метрики rows_scanned)
+        """
+        result = []
+        returned = 0
+        for row in rows:
+            returned += 1
+            if result is not None:
+                result.append(row)
+                if len(result) > CACHE_MAX_ROWS:
+                    result = None
+            yield row
+        count('rows_returned', returned)
+        if skipped is not None:
+            count('rows_scanned', skipped + returned)
+        self.query_cache.put(cache_key, result)
+
+    def aggregate(self, table_name, aggregates, where=None, group_by=None, limit=None, offset=0, order_by=None, descending=False):
+        """
+        агрегатный запрос: aggregates - пары (функция, столбец), функция из
+        count, sum, min, max, avg или None для столбца группировки
+        считается за один проход; count(*), min/max по ID и по упорядоченному
+        индексу без условия берутся из метаданных таблицы
+        возвращает список словарей
+        """
+        specs = self._aggregate_specs(table_name, aggregates, group_by)
+        order = self._aggregate_order(specs, group_by, order_by, descending)
+        return self._aggregate_rows(table_name, specs, self._condition(table_name, where), group_by, limit, offset, order)
+
+    def _aggregate_specs(self, table_name, aggregates, group_by):
+        """
+        проверка списка агрегатов; возвращает пары (функция, столбец) без столбца группировки
+        """
+        schema = self._resolved(table_name)[1]
+        for func, column in list(aggregates) + ([(None, group_by)] if group_by else []):
+            if func is not None and func not in AGGREGATE_FUNCTIONS:
+                raise ValidationError(f'Неизвестная агрегатная функция: {func}')
+            if column == '*' and func != 'count':
+                raise ValidationError(f'{func}(*) не поддерживается')
+            if column != '*' and column not in schema:
+                raise ColumnNotFoundError(table_name, column)
+            if func in ('sum', 'avg') and schema[column] == 'str':
+                raise ValidationError(f'Функция {func} применима только к числовым столбцам.')
+            if func is None and column != group_by:
+                raise ValidationError(f'Столбец "{column}" должен быть в group by или внутри агрегатной функции.')
+        specs = [(func, column) for func, column in aggregates if func is not None]
+        if not specs:
+            raise ValidationError('Не указаны агрегатные функции')
+        return specs
+
+    @staticmethod
+    def _aggregate_order(specs, group_by, order_by, descending):
+        """
+        порядок результата агрегатного запроса: по столбцу group by или по агрегату (sum(age))
+        None - по значению группы
+        """
+        if order_by is None:
+            return None
+        labels = ([group_by] if group_by else []) + [aggregate_label(func, column) for func, column in specs]
+        if order_by not in labels:
+            raise ValidationError(f'Сортировка агрегатного запроса возможна по столбцам: {", ".join(labels)}')
+        return (order_by, descending)
+
+    def _aggregate_rows(self, table_name, specs, expr, group_by, limit, offset, order=None):
+        """
+        агрегатный запрос по типизированному условию (aggregate, execute), результаты кэшируются
+        """
+        cache_key = (table_name, self.tables.version(table_name), 'aggregate', tuple(specs),
+                     repr(expr), group_by, order, limit, offset)
+        cached = self.query_cache.get(cache_key)
+        if cached is None:
+            table = self.tables.load(table_name)
+            with phase('filter'):
+                cached = self._aggregate(table, table_name, specs, expr, group_by, limit, offset, order)
+            self.query_cache.put(cache_key, cached)
+        count('rows_returned', len(cached))
+        return [dict(row) for row in cached]
+
+    def _aggregate(self, table, table_name, specs, expr, group_by, limit, offset, order=None):
+        labels = [aggregate_label(func, column) for func, column in specs]
+
+        if expr is None and not group_by:
+            values = [_fast_aggregate(table, func, column) for func, column in specs]
+            if _MISSING not in values:
+                return [dict(zip(labels, values))]
+        if expr is None:
+            count('rows_scanned', len(table.rows))
+
+        accumulators = [_make_accumulator(func, column) for func, column in specs]
+        groups = None
+        # параллельный перебор - без условия или если его выбрал планировщик
+        plan = self._plan(table, table_name, expr) if expr is not None else None
+        if hasattr(table, 'parallel_scan') and parallel.enabled(len(table.rows)) and (
+                plan is None or plan['chosen']['access'] == planner.PARALLEL_SCAN):
+            groups = self._parallel_groups(table, specs, expr, group_by, accumulators)
+            if groups is not None and expr is not None:
+                count('rows_scanned', len(table.rows))
+
+        if groups is None:
+            if expr is not None:
+                records = planner.execute(table, plan)
+            elif hasattr(table, 'project'):
+                # колоночная таблица: читаются только нужные столбцы
+                records = table.project({column for _, column in specs if column != '*'} | ({group_by} if group_by else {'ID'}))
+            else:
+                records = iter(table.rows)
+
+            if group_by is None and len(specs) == 1:
+                # один агрегат - проход по значениям одного столбца
+                func, column = specs[0]
+                if column == '*':
+                    values = (1 for _ in records)
+                elif expr is None and hasattr(table, 'column_values'):
+                    values = table.column_values(column)
+                else:
+                    values = (record.get(column) for record in records)
+                return [{labels[0]: _reduce_values(func, values)}]
+
+            groups = _accumulate(records, accumulators, group_by, {})
+        if not group_by and not groups:
+            groups[None] = [[0, None] for _ in specs]
+
+        result = []
+        for key in sorted(groups, key=lambda key: (key is None, key)):
+            row = {group_by: key} if group_by else {}
+            for label, (_, finish, _), state in zip(labels, accumulators, groups[key]):
+                row[label] = finish(state)
+            result.append(row)
+        if order is not None:
+            column, descending = order
+            result.sort(key=lambda row: (row[column] is None, row[column]), reverse=descending)
+
+        stop = None if limit is None else offset + limit
+        return result[offset:stop]
+
+    # --- соединение таблиц ---
+
+    def join_columns(self, left_table, right_table):
+        """
+        столбцы результата соединения: 'таблица.столбец', сначала левой таблицы
+        """
+        return [f'{table_name}.{name}' for table_name in (left_table, right_table) for name in self._resolved(table_name)[0]]
+
+    def _join_resolver(self, left_table, right_table):
+        """
+        схема соединения ('таблица.столбец' -> тип) и функция разрешения имени столбца:
+        без имени таблицы можно указать столбец, который есть только в одной из таблиц
+        """
+        left_types, right_types = self._resolved(left_table)[1], self._resolved(right_table)[1]
+        schema = {}
+        names = {}
+        for table_name, types, other in ((left_table, left_types, right_types), (right_table, right_types, left_types)):
+            for column, column_type in types.items():
+                qualified = f'{table_name}.{column}'
+                schema[qualified] = column_type
+                names[qualified] = qualified
+                if column not in other:
+                    names[column] = qualified
+
+        def resolve(column):
+            if column in names:
+                return names[column]
+            if column in left_types:
+                raise ValueError(f'Столбец "{column}" есть в обеих таблицах, укажите таблицу: {left_table}.{column}')
+            raise ValueError(f'Столбец "{column}" не существует')
+        return schema, resolve
+
+    def _join_conditions(self, left_table, right_table, where):
+        """
+        условие WHERE соединения по частям: (условие левой таблицы, условие правой, остаток)
+        части AND, относящиеся к одной таблице, проверяются при ее переборе до соединения
+        (через планировщик, с индексами), остальные - на строках результата
+        """
+        if not where:
+            return None, None, None
+        schema, resolve = self._join_resolver(left_table, right_table)
+        try:
+            expr = bind_condition(rename_columns(parse_condition(where), resolve), schema)
+        except ValueError as e:
+            raise ValidationError(f'Некорректное условие WHERE: {e}') from e
+
+        pushed = {left_table: [], right_table: []}
+        residual = []
+        for part in conjuncts(expr):
+            tables = {column.split('.', 1)[0] for column in condition_columns(part)}
+            if len(tables) == 1:
+                pushed[tables.pop()].append(rename_columns(part, lambda column: column.split('.', 1)[1]))
+            else:
+                residual.append(part)
+        return conjoin(pushed[left_table]), conjoin(pushed[right_table]), conjoin(residual)
+
+    def join(self, left_table, right_table, left_column, right_column, where=None, limit=None, offset=0,
+             as_tuples=False, order_by=None, descending=False):
+        """
+        соединение таблиц по равенству столбцов (left_table.left_column = right_table.right_column)
+        итератор словарей с ключами 'таблица.столбец' (или кортежей в порядке join_columns())
+        в условии WHERE и order_by столбцы указываются с именем таблицы (или без него, если имя однозначно)
+        строки выдаются потоково, при limit соединение прекращается, как только набрано нужное кол-во;
+        результаты соединения не кэшируются
+        """
+        self._check_page(limit, offset)
+        if left_table == right_table:
+            raise ValidationError('Соединение таблицы с самой собой не поддерживается.')
+        self._check_column(left_table, left_column)
+        self._check_column(right_table, right_column)
+        left_type, right_type = self._resolved(left_table)[1][left_column], self._resolved(right_table)[1][right_column]
+        if left_type != right_type:
+            raise ValidationError(f'Типы столбцов соединения различаются: {left_table}.{left_column}:{left_type}, '
+                                  f'{right_table}.{right_column}:{right_type}')
+        left_expr, right_expr, residual = self._join_conditions(left_table, right_table, where)
+        field_names = self.join_columns(left_table, right_table)
+        if order_by is not None:
+            try:
+                order_by = self._join_resolver(left_table, right_table)[1](order_by)
+            except ValueError as e:
+                raise ValidationError(f'Некорректный столбец сортировки: {e}') from e
+
+        rows = self._join_rows((left_table, left_column, left_expr), (right_table, right_column, right_expr))
+        if residual is not None:
+            test = compile_condition(residual)
+            rows = (row for row in rows if test(dict(zip(field_names, row))))
+        stop = None if limit is None else offset + limit
+        if order_by is None:
+            rows = islice(rows, offset, stop)
+        elif limit is not None:
+            rows = iter(top_rows(rows, sort_key(field_names.index(order_by)), stop, descending)[offset:])
+        else:
+            rows = islice(sorted_rows(rows, sort_key(field_names.index(order_by)), descending), offset, None)
+        rows = self._counted(rows)
+        if as_tuples:
+            return rows
+        return (dict(zip(field_names, row)) for row in rows)
+
+    @staticmethod
+    def _counted(rows):
+        returned = 0
+        for row in rows:
+            returned += 1
+            yield row
+        count('rows_returned', returned)
+
+    def _side_rows(self, table, table_name, expr):
+        """
+        строки одной таблицы соединения (кортежи в порядке столбцов), отобранные ее частью условия
+        """
+        if expr is None:
+            count('rows_scanned', len(table.rows))
+            if hasattr(table, 'row_tuples'):
+                return table.row_tuples()
+        field_names = self._resolved(table_name)[0]
+        return (tuple(record.get(name) for name in field_names) for record in self._matching(table, table_name, expr))
+
+    def _join_rows(self, left, right):
+        """
+        строки соединения (кортежи: столбцы левой таблицы, затем правой), лениво
+        left, right - (таблица, столбец соединения, условие таблицы)
+        по индексу (или ID) на столбце соединения одной таблицы записи ищутся для каждой строки другой;
+        иначе хэш-таблица строится по меньшей (по оценке планировщика) таблице, большая перебирается потоково
+        """
+        sides = []
+        for table_name, column, expr in (left, right):
+            table = self.tables.load(table_name)
+            sides.append({
+                'name': table_name,
+                'column': column,
+                'expr': expr,
+                'table': table,
+                'position': self._resolved(table_name)[0].index(column),
+                'rows': len(table.rows) if expr is None else self._plan(table, table_name, expr)['estimated_rows'],
+                'indexed': column == 'ID' or column in table.indexes,
+            })
+
+        indexed = [side for side in sides if side['indexed']]
+        if indexed:
+            build = max(indexed, key=lambda side: side['rows'])
+        else:
+            build = min(sides, key=lambda side: side['rows'])
+        build_first = build is sides[0]
+        probe = sides[1] if build_first else sides[0]
+        probe_rows = self._side_rows(probe['table'], probe['name'], probe['expr'])
+
+        if build['indexed']:
+            build_names = self._resolved(build['name'])[0]
+            test = compile_condition(build['expr']) if build['expr'] is not None else None
+            candidates = 0
+            try:
+                for probe_row in probe_rows:
+                    key = probe_row[probe['position']]
+                    if key is None:
+                        continue
+                    matches = build['table'].lookup(build['column'], key)
+                    candidates += len(matches)
+                    for record in matches:
+                        if test is None or test(record):
+                            row = tuple(record.get(name) for name in build_names)
+                            yield row + probe_row if build_first else probe_row + row
+            finally:
+                count('rows_scanned', candidates)
+            return
+
+        buckets = {}
+        for row in self._side_rows(build['table'], build['name'], build['expr']):
+            key = row[build['position']]
+            if key is None:
+                continue
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [row]
+            else:
+                bucket.append(row)
+        for probe_row in probe_rows:
+            for row in buckets.get(probe_row[probe['position']], ()):
+                yield row + probe_row if build_first else probe_row + row
+
+    def explain(self, table_name, where=None, limit=None, offset=0):
+        """
+        план выборки: выбранный путь доступа и рассмотренные варианты со стоимостью,
+        оценка и фактическое кол-во строк (запрос выполняется, строки не возвращаются)
+        """
+        self._check_page(limit, offset)
+        expr = self._condition(table_name, where)
+        table = self.tables.load(table_name)
+        plan = self._plan(table, table_name, expr, limit, offset)
+        stop = None if limit is None else offset + limit
+        with phase('filter'):
+            actual = sum(1 for _ in islice(planner.execute(table, plan), offset, stop))
+        chosen = plan['chosen']
+        return {
+            'table': table_name,
+            'where': where,
+            'access': chosen['access'],
+            'column': chosen['column'],
+            'early_stop': plan['early_stop'],
+            'analyzed': plan['analyzed'],
+            'rows': plan['rows'],
+            'estimated_rows': round(plan['estimated_rows']),
+            'actual_rows': actual,
+            'alternatives': [
+                {'access': path['access'], 'column': path['column'],
+                 'candidates': round(path['candidates']), 'cost': round(path['cost'], 1)}
+                for path in plan['alternatives']
+            ],
+        }
+
+    def _parallel_groups(self, table, specs, expr, group_by, accumulators):
+        """
+        состояния агрегатов по группам, посчитанные несколькими процессами по снимку бинарной таблицы;
+        части объединяются по порядку, строки, измененные после снимка, учитываются в этом процессе
+        None - параллельный перебор невозможен (снимка нет или он заменен)
+        """
+        if table.path is None:
+            return None
+        try:
+            parts = parallel.map_ordered(_aggregate_chunk, table.snapshot_tasks(expr, specs, group_by, table.overlay_positions()))
+        except StaleSnapshotError:
+            return None
+        if parts is None:
+            return None
+
+        groups = {}
+        for part in parts:
+            for key, states in part.items():
+                current = groups.get(key)
+                if current is None:
+                    groups[key] = states
+                    continue
+                for (_, _, merge_states), state, other in zip(accumulators, current, states):
+                    merge_states(state, other)
+        records = table.overlay_records()
+        if expr is not None:
+            records = filter(compile_condition(expr), records)
+        return _accumulate(records, accumulators, group_by, groups)
+
+    # --- подготовленные запросы ---
+
+    def prepare(self, name, table_name, where=None, limit=None, offset=0, aggregates=None, group_by=None,
+                order_by=None, descending=False):
+        """
+        подготовленный запрос select: условие разбирается и приводится к типам столбцов один раз,
+        вместо значений в условии - параметры ?, их значения передаются в execute
+        запрос с тем же именем заменяется; возвращает описание запроса (statement)
+        """
+        names, _, fields = self._resolved(table_name)
+        self._check_page(limit, offset)
+        specs = self._aggregate_specs(table_name, aggregates, group_by) if aggregates else None
+        if specs is None:
+            order = self._order(table_name, order_by, descending)
+        else:
+            order = self._aggregate_order(specs, group_by, order_by, descending)
+        params = []
+        expr = self._bind(table_name, where, params) if where else None
+        if specs is None:
+            result_columns = names
+        else:
+            result_columns = ([group_by] if group_by else []) + [aggregate_label(func, column) for func, column in specs]
+        self.prepared[name] = {
+            'source': {'table_name': table_name, 'where': where, 'limit': limit, 'offset': offset,
+                       'aggregates': aggregates, 'group_by': group_by, 'order_by': order_by, 'descending': descending},
+            'fields': fields,
+            'expr': expr,
+            'order': order,
+            'params': params,
+            'specs': specs,
+            'columns': list(result_columns),
+        }
+        return self.statement(name)
+
+    def _prepared(self, name):
+        statement = self.prepared.get(name)
+        if statement is None:
+            raise StatementNotFoundError(name)
+        return statement
+
+    def statement(self, name):
+        """
+        описание подготовленного запроса: таблица, столбцы результата, параметры (столбец и тип)
+        """
+        statement = self._prepared(name)
+        return {
+            'name': name,
+            'table': statement['source']['table_name'],
+            'aggregate': statement['specs'] is not None,
+            'columns': list(statement['columns']),
+            'params': [{'column': param.column, 'type': param.column_type} for param in statement['params']],
+        }
+
+    def execute(self, name, params=(), as_tuples=False):
+        """
+        выполнение подготовленного запроса; params - значения параметров ? по порядку
+        (строки приводятся к типам столбцов, как в insert)
+        возвращает то же, что select (итератор строк) или aggregate (список словарей)
+        если схема таблицы изменилась, запрос подготавливается заново
+        """
+        statement = self._prepared(name)
+        source = statement['source']
+        table_name = source['table_name']
+        if statement['fields'] != self._resolved(table_name)[2]:
+            self.prepare(name, **source)
+            statement = self.prepared[name]
+
+        expected = statement['params']
+        if len(params) != len(expected):
+            raise ValidationError(f'Ожидается параметров: {len(expected)}, получено {len(params)}')
+        values = []
+        for param, value in zip(expected, params):
+            try:
+                values.append(coerce_value(value, param.column_type))
+            except ValueError as e:
+                raise ValidationError(f'параметр {param.number + 1} (столбец "{param.column}"), значение "{value}": {e}') from e
+
+        expr = statement['expr']
+        if values:
+            expr = fill_parameters(expr, values)
+        if statement['specs'] is not None:
+            return self._aggregate_rows(table_name, statement['specs'], expr, source['group_by'], source['limit'], source['offset'],
+                                        statement['order'])
+        return self._select(table_name, expr, source['limit'], source['offset'], as_tuples, statement['order'])
+
+    def deallocate(self, name):
+        """
+        удаление подготовленного запроса
+        """
+        self._prepared(name)
+        del self.prepared[name]
+
+    # --- обслуживание ---
+
+    def info(self, table_name):
+        """
+        сведения о таблице: столбцы, кол-во записей, формат, память, индексы
+        """
+        table_meta = self._table_meta(table_name)
+        table = self.tables.load(table_name)
+        return {
+            'name': table_name,
+            'columns': list(table_meta['columns']),
+            'schema_version': table_meta.get('schema_version', 1),
+            'rows': len(table.rows),
+            'format': table_meta.get('format', 'json'),
+            'size_bytes': table.size_bytes(),
+            'indexes': [
+                {'column': column, 'kind': index.kind, 'keys': len(index), 'size_bytes': index.size_bytes()}
+                for column, index in table.indexes.items()
+            ],
+        }
+
+    def analyze(self, table_name):
+        """
+        сбор статистики для планировщика: кол-во записей, по каждому столбцу - кол-во различных
+        значений, минимум, максимум и кол-во пустых значений; сохраняется в db_meta.json
+        возвращает статистику
+        """
+        columns = self.columns(table_name)
+        table = self.tables.load(table_name)
+        with phase('filter'):
+            column_stats = {}
+            for column in columns:
+                if hasattr(table, 'column_values'):
+                    values = table.column_values(column)
+                else:
+                    values = (row.get(column) for row in table.rows)
+                column_stats[column] = planner.column_statistics(values)
+        count('rows_scanned', len(table.rows) * len(columns))
+        stats = {'rows': len(table.rows), 'columns': column_stats}
+        with self._changing_metadata() as metadata:
+            if table_name not in metadata:
+                raise TableNotFoundError(table_name)
+            metadata[table_name]['stats'] = stats
+        return stats
+
+    def compact(self, table_name):
+        """
+        уплотнение журнала изменений; возвращает кол-во записей
+        """
+        self._table_meta(table_name)
+        if self.tables.in_transaction:
+            raise TransactionError('Уплотнение недоступно внутри транзакции.')
+        return len(self.tables.compact(table_name).rows)
+
+    def create_index(self, table_name, column, kind='hash'):
+        if kind not in INDEX_TYPES:
+            raise ValidationError(f'Некорректный тип индекса: {kind}. Тип должен быть hash или sorted.')
+        with self._changing_metadata() as metadata:
+            self._check_column(table_name, column)
+            storage_format = metadata[table_name].get('format', 'json')
+            if storage_format != 'json':
+                raise UnsupportedError(f'Таблица "{table_name}" хранится в формате {storage_format}, индексы не поддерживаются.')
+            indexes = metadata[table_name].setdefault('indexes', {})
+            if column in indexes:
+                raise IndexExistsError(table_name, column)
+            indexes[column] = kind
+        # индекс строится по сохраненным метаданным
+        self.tables.load(table_name)
+        self.query_cache.clear(table_name)
+
+    def drop_index(self, table_name, column):
+        with self._changing_metadata() as metadata:
+            self._check_column(table_name, column)
+            indexes = metadata[table_name].get('indexes', {})
+            if column not in indexes:
+                raise IndexNotFoundError(table_name, column)
+            del indexes[column]
+        self.tables.load(table_name)
+        # результаты и планы, построенные с удаленным индексом, больше не используются
+        self.query_cache.clear(table_name)
+
+    def convert_table(self, table_name, storage_format):
+        """
+        смена формата хранения таблицы
+        """
+        if storage_format not in STORAGE_FORMATS:
+            raise ValidationError(f'Некорректный формат хранения: {storage_format}. '
+                                  f'Доступные форматы: {", ".join(sorted(STORAGE_FORMATS))}.')
+        if self.tables.in_transaction:
+            raise TransactionError('Смена формата недоступна внутри транзакции.')
+        with self._changing_metadata() as metadata:
+            table_meta = self._table_meta(table_name, metadata)
+            if storage_format != 'json' and table_meta.get('indexes'):
+                raise UnsupportedError(f'У таблицы "{table_name}" есть индексы, удалите их перед переводом в формат {storage_format}.')
+            self.tables.convert(table_name, storage_format)
+            table_meta['format'] = storage_format
+        self.query_cache.clear(table_name)
+
+    def cache_stats(self):
+        """
+        статистика кэша запросов и кэша таблиц
+        """
+        return {'query': self.query_cache.stats(), 'tables': self.tables.stats()}
+
+    # --- транзакции ---
+
+    @property
+    def in_transaction(self):
+        return self.tables.in_transaction
+
+    def begin(self):
+        if self.tables.in_transaction:
+            raise TransactionError('Транзакция уже начата.')
+        self.tables.begin()
+
+    def commit(self):
+        """
+        фиксация транзакции; возвращает кол-во измененных таблиц
+        """
+        if not self.tables.in_transaction:
+            raise TransactionError('Нет активной транзакции.')
+        return self.tables.commit()
+
+    def rollback(self):
+        if not self.tables.in_transaction:
+            raise TransactionError('Нет активной транзакции.')
+        for table_name in self.tables.rollback():
+            self.query_cache.clear(table_name)
+
+    @contextmanager
+    def transaction(self):
+        """
+        транзакция: commit при выходе из блока, rollback при исключении
+        """
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
@@ -1,6 +1,27 @@
+import sys
 import time
+from collections import OrderedDict
 from functools import wraps
 
+from .errors import DatabaseError
+from .metrics import count
+
+# режим работы декораторов:
+# log_time - печатать время выполнения команд (замеры всегда идут в metrics),
+# confirm - подтверждение опасных операций: 'ask' (спросить), 'yes' (выполнить), 'no' (отменить)
+settings = {'log_time': True, 'confirm': 'ask'}
+
+# кол-во команд, завершившихся ошибкой (перехваченной handle_db_errors или неверный формат команды);
+# по нему пакетный режим задает код выхода
+failures = {'count': 0}
+
+
+def command_failed(message):
+    """
+    сообщение об ошибке команды; команда учитывается в failures
+    """
+    failures['count'] += 1
+    print(message)
 
 def handle_db_errors(func):
     """
@@ -10,18 +31,18 @@ def handle_db_errors(func):
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
+        except DatabaseError as e:
+            return command_failed(f'Ошибка: {e}')
         except KeyError as e:
-            print(f'Ошибка: Обращение к несуществующему объекту - {e}')
-            return None
+            return command_failed(f'Ошибка: Обращение к несуществующему объекту - {e}')
         except ValueError as e:
-            print(f'Ошибка валидации: {e}')
-            return None
+            return command_failed(f'Ошибка валидации: {e}')
         except FileNotFoundError as e:
-            print(f'Ошибка файла: {e}')
-            return None
+            return command_failed(f'Ошибка файла: {e}')
+        except TimeoutError as e:
+            return command_failed(f'Ошибка блокировки: {e}')
         except Exception as e:
-            print(f'Неожиданная ошибка в функции {func.__name__}: {e}')
-            return None
+            return command_failed(f'Неожиданная ошибка в функции {func.__name__}: {e}')
     return wrapper
 
 def confirm_action(action_name):
@@ -31,8 +52,10 @@ def confirm_action(action_name):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            if kwargs.get('confirm') is False:
+            if kwargs.get('confirm') is False or settings['confirm'] == 'yes':
                 return func(*args, **kwargs)
+            if settings['confirm'] == 'no':
+                return command_failed(f'Операция "{action_name}" отменена: требуется подтверждение (запустите с --yes).')
                 
             user_input = input(f'Вы уверены, что хотите выполнить "{action_name}"? [y/n]: ').strip().lower()
             if user_input == 'y':
@@ -43,45 +66,111 @@ def confirm_action(action_name):
         return wrapper
     return decorator
 
-def log_time(func):
+def _result_size(value):
     """
-    счетчик времени
+    приблизительный размер закэшированного результата в байтах
     """
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        start_time = time.monotonic()
-        result = func(*args, **kwargs)
-        end_time = time.monotonic()
-        execution_time = end_time - start_time
-        print(f'Функция {func.__name__} выполнилась за {execution_time:.3f} секунд')
-        return result
-    return wrapper
+    size = sys.getsizeof(value)
+    if isinstance(value, list):
+        for row in value:
+            size += sys.getsizeof(row)
+            if isinstance(row, dict):
+                size += sum(sys.getsizeof(item) for item in row.values())
+            elif isinstance(row, tuple):
+                size += sum(sys.getsizeof(item) for item in row)
+    return size
 
-def create_cacher():
+def create_cacher(max_entries=256, max_bytes=32 * 1024 * 1024, ttl=None, metric='query_cache'):
     """
     кэшер с замыканием
+    ключ - кортеж, первый элемент которого имя таблицы: по нему кэш сбрасывается выборочно
+    вытеснение давно не используемых записей (LRU) по кол-ву и объему, ttl - время жизни в секундах
+    (None - без ограничения, меняется через set_ttl)
+    metric - префикс счетчиков попаданий и промахов в метриках команд
     """
-    cache = {}
-    
+    cache = OrderedDict()  # ключ -> (результат, размер, время записи)
+    stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'bytes': 0}
+    options = {'ttl': ttl}
+
+    def _remove(key):
+        _, size, _ = cache.pop(key)
+        stats['bytes'] -= size
+
+    def get(key):
+        """
+        результат из кэша; None, если его нет или срок истек
+        """
+        entry = cache.get(key)
+        ttl = options['ttl']
+        if entry is not None and ttl is not None and time.monotonic() - entry[2] > ttl:
+            _remove(key)
+            stats['expired'] += 1
+            entry = None
+        if entry is None:
+            stats['misses'] += 1
+            count(f'{metric}_misses')
+            return None
+        cache.move_to_end(key)
+        stats['hits'] += 1
+        count(f'{metric}_hits')
+        return entry[0]
+
+    def put(key, value):
+        """
+        сохранение результата; пустой результат (None) не кэшируется
+        """
+        if value is None:
+            return
+        size = _result_size(value)
+        if size > max_bytes:
+            return
+        if key in cache:
+            _remove(key)
+        cache[key] = (value, size, time.monotonic())
+        stats['bytes'] += size
+        while len(cache) > max_entries or stats['bytes'] > max_bytes:
+            _remove(next(iter(cache)))
+            stats['evictions'] += 1
+
     def cache_result(key, value_func):
         """
         кэширование результата функции
         """
-        if key in cache:
-            return cache[key]
-        else:
+        result = get(key)
+        if result is None:
             result = value_func()
-            cache[key] = result
-            return result
-    
-    def clear_cache():
+            put(key, result)
+        return result
+
+    def clear_cache(table_name=None):
         """
-        очистка кэша
+        очистка кэша (всего или только запросов к одной таблице)
         """
-        cache.clear()
-        print("Кэш очищен")
-    
-    
+        if table_name is None:
+            cache.clear()
+            stats['bytes'] = 0
+            return
+        for key in [key for key in cache if key[0] == table_name]:
+            _remove(key)
+
+    def set_ttl(seconds):
+        """
+        время жизни записей в секундах (None - без ограничения), действует и на уже сохраненные записи
+        """
+        options['ttl'] = seconds
+
+    def cache_stats():
+        """
+        статистика кэша
+        """
+        lookups = stats['hits'] + stats['misses']
+        return dict(stats, entries=len(cache), max_entries=max_entries, max_bytes=max_bytes, ttl=options['ttl'],
+                    hit_rate=stats['hits'] / lookups if lookups else 0.0)
+
+    cache_result.get = get
+    cache_result.put = put
     cache_result.clear = clear_cache
-    
+    cache_result.set_ttl = set_ttl
+    cache_result.stats = cache_stats
+
     return cache_result
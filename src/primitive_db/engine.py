@@ -1,7 +1,42 @@
 import shlex
+import time
 
-from .core import create_table, delete, drop_table, info, insert, list_tables, select, update
-from .utils import load_metadata, save_metadata
+from .core import (
+    add_column,
+    aggregate,
+    analyze,
+    begin,
+    cache_stats,
+    commit,
+    compact,
+    convert_table,
+    create_index,
+    create_table,
+    deallocate,
+    delete,
+    drop_column,
+    drop_index,
+    drop_table,
+    execute,
+    explain,
+    export_stats,
+    import_file,
+    info,
+    insert,
+    join,
+    list_tables,
+    prepare,
+    reset_stats,
+    rollback,
+    select,
+    show_stats,
+    update,
+)
+from .database import DEFAULT_BATCH_SIZE
+from .decorators import command_failed, failures, settings
+from .metrics import name_operation, operation, phase
+from .parser import parse_select, parse_values
+from .storage import tables
 
 
 def print_help():
@@ -11,148 +46,369 @@ def print_help():
     print("<command> create_table <имя_таблицы> <столбец1:тип> <столбец2:тип> ... - создать таблицу")
     print("<command> list_tables - показать список всех таблиц")
     print("<command> drop_table <имя_таблицы> - удалить таблицу")
+    print("<command> alter_table <имя_таблицы> add_column <столбец:тип> [default <значение>] | drop_column <столбец> - изменить схему.")
     print("<command> insert into <имя_таблицы> values (<значение1>, <значение2>, ...) - создать запись.")
     print("<command> select from <имя_таблицы> where <столбец> = <значение> - прочитать записи по условию.")
     print("<command> select from <имя_таблицы> - прочитать все записи.")
-    print("<command> update <имя_таблицы> set <столбец1> = <новое_значение1> where <столбец_условия> = <значение_условия> - обновить запись.")
+    print("<command> select from <имя_таблицы> [where ...] [limit N] [offset M] [format table|tsv|jsonl] - постраничная выборка.")
+    print("<command> select from <имя_таблицы> [where ...] order by <столбец> [asc|desc] [limit N] - выборка с сортировкой.")
+    print("<command> select count(*)|sum(столбец)|min|max|avg from <имя_таблицы> [where ...] [group by <столбец>] - агрегаты.")
+    print("<command> select from <таблица1> join <таблица2> on <таблица1>.<столбец> = <таблица2>.<столбец> [where ...] - соединение.")
+    print("<command> import <имя_таблицы> <файл.csv|файл.jsonl> [--batch N] - импортировать записи из файла.")
+    print("<command> update <имя_таблицы> set <столбец1> = <значение1>, <столбец2> = <значение2> where <условие> - обновить записи.")
     print("<command> delete from <имя_таблицы> where <столбец> = <значение> - удалить запись.")
     print("<command> info <имя_таблицы> - вывести информацию о таблице.")
+    print("<command> compact <имя_таблицы> - уплотнить журнал изменений таблицы.")
+    print("<command> analyze <имя_таблицы> - собрать статистику таблицы для планировщика запросов.")
+    print("<command> explain select ... - показать план запроса: путь доступа, оценку и фактическое кол-во строк.")
+    print("<command> prepare <имя> as select ... where <столбец> = ? - подготовить запрос с параметрами ?.")
+    print("<command> execute <имя> [(<значение1>, <значение2>, ...)] - выполнить подготовленный запрос.")
+    print("<command> deallocate <имя> - удалить подготовленный запрос.")
+    print("<command> create_index <имя_таблицы> <столбец> [hash|sorted] - создать индекс по столбцу.")
+    print("<command> drop_index <имя_таблицы> <столбец> - удалить индекс.")
+    print("<command> convert_table <имя_таблицы> <json|columnar|binary> - сменить формат хранения таблицы.")
+    print("<command> cache_stats - статистика кэша запросов.")
+    print("<command> stats [reset | export <файл> [json|prometheus]] - метрики команд: время фаз, строки, байты, кэш.")
+    print("<command> begin | commit | rollback - начать, зафиксировать или отменить транзакцию.")
     print("<command> exit - выход из программы")
     print("<command> help - справочная информация\n")
 
+def _finish_transaction():
+    """
+    незафиксированная транзакция при завершении работы отменяется
+    """
+    if tables.in_transaction:
+        rollback()
+
+# команды консоли (неизвестные учитываются в метриках как unknown)
+COMMANDS = {
+    'create_table', 'drop_table', 'alter_table', 'list_tables', 'insert', 'import', 'select', 'update', 'delete', 'info', 'compact',
+    'analyze', 'explain', 'prepare', 'execute', 'deallocate', 'create_index', 'drop_index', 'convert_table', 'cache_stats', 'stats',
+    'begin', 'commit', 'rollback', 'help', 'exit',
+}
+# команды, для которых в консоли печатается время выполнения
+TIMED_COMMANDS = {'insert', 'select', 'execute', 'commit'}
+
+def execute_command(user_input):
+    """
+    выполнение одной команды с замером (metrics)
+    возвращает False, если работу нужно завершить
+    """
+    start = time.perf_counter()
+    with operation('unknown'):
+        with phase('parse'):
+            args = shlex.split(user_input)
+        command = args[0].lower()
+        if command in COMMANDS:
+            name_operation(command)
+        result = _dispatch(user_input, args, command)
+    if settings['log_time'] and command in TIMED_COMMANDS:
+        print(f'Команда {command} выполнилась за {time.perf_counter() - start:.3f} секунд')
+    return result
+
+def _dispatch(user_input, args, command):
+    """
+    разбор аргументов и вызов команды
+    """
+    if command == 'create_table':
+        if len(args) < 3:
+            command_failed('Недостаточно аргументов. Формат: create_table <имя> <столбец:тип> ...')
+            return True
+        table_name = args[1]
+        columns = args[2:]
+        create_table(table_name, columns)
+
+    elif command == 'drop_table':
+        if len(args) != 2:
+            command_failed('Неверный формат. Используйте: drop_table <имя_таблицы>')
+            return True
+        table_name = args[1]
+        drop_table(table_name)
+
+    elif command == 'alter_table':
+        action = args[2].lower() if len(args) > 2 else None
+        if action == 'add_column' and (len(args) == 4 or (len(args) == 6 and args[4].lower() == 'default')):
+            add_column(args[1], args[3], args[5] if len(args) == 6 else None)
+        elif action == 'drop_column' and len(args) == 4:
+            drop_column(args[1], args[3])
+        else:
+            command_failed('Неверный формат. Используйте: alter_table <имя_таблицы> add_column <столбец:тип> [default <значение>] '
+              '| drop_column <столбец>')
+            return True
+
+    elif command == 'list_tables':
+        list_tables()
+
+    elif command == 'insert':
+        if len(args) < 4 or args[1].lower() != 'into' or args[3].lower() != 'values':
+            command_failed('Неверный формат. Используйте: insert into <таблица> values (<значение1>, <значение2>, ...)')
+            return True
+        
+        table_name = args[2]
+        
+        values_str = ' '.join(args[4:])
+        if not values_str.startswith('(') or not values_str.endswith(')'):
+            command_failed('Значения должны быть в скобках.')
+            return True
+        
+        values_str = values_str[1:-1]  
+        values = [v.strip() for v in values_str.split(',')]
+        
+        insert(table_name, values)
+
+    elif command == 'import':
+        if len(args) not in (3, 5) or (len(args) == 5 and args[3] != '--batch'):
+            command_failed('Неверный формат. Используйте: import <таблица> <файл.csv|файл.jsonl> [--batch N]')
+            return True
+        batch_size = int(args[4]) if len(args) == 5 else DEFAULT_BATCH_SIZE
+        import_file(args[1], args[2], batch_size)
+
+    elif command == 'select':
+        # разбор по исходным токенам с кавычками: в значениях условия могут быть операторы и пробелы
+        try:
+            with phase('parse'):
+                query = parse_select(shlex.split(user_input, posix=False))
+        except ValueError as e:
+            command_failed(e)
+            return True
+        
+        if query['join']:
+            name_operation('join')
+            join(query['table'], query['join']['table'], query['join']['left_column'], query['join']['right_column'],
+                 query['where'], query['limit'], query['offset'], query['format'], query['order_by'], query['descending'])
+        elif query['aggregates']:
+            name_operation('aggregate')
+            aggregate(query['table'], query['aggregates'], query['where'], query['group_by'],
+                      query['limit'], query['offset'], query['format'], query['order_by'], query['descending'])
+        else:
+            select(query['table'], query['where'], query['limit'], query['offset'], query['format'],
+                   query['order_by'], query['descending'])
+
+    elif command == 'update':
+        if len(args) < 4:
+            command_failed('Неверный формат. Используйте: update <таблица> set <столбец>=<значение>, ... where <условие>')
+            return True
+        
+        # разбор по исходным токенам с кавычками: в значениях SET могут быть пробелы и запятые
+        with phase('parse'):
+            raw_args = shlex.split(user_input, posix=False)
+            lowered = [arg.lower() for arg in raw_args]
+            set_index = lowered.index('set') if 'set' in lowered else -1
+            where_index = lowered.index('where', set_index + 1) if 'where' in lowered[set_index + 1:] else -1
+        
+        if set_index == -1 or where_index == -1 or where_index <= set_index + 1:
+            command_failed('Неверный формат. Используйте: update <таблица> set <столбец>=<значение>, ... where <условие>')
+            return True
+        
+        table_name = args[1]
+        set_clause = ' '.join(raw_args[set_index + 1:where_index])
+        where_clause = ' '.join(raw_args[where_index + 1:])
+        
+        update(table_name, set_clause, where_clause)
+
+    elif command == 'delete':
+        if len(args) < 4:
+            command_failed('Неверный формат. Используйте: delete from <таблица> where <условие>')
+            return True
+        
+        # разбор по исходным токенам с кавычками: в значениях условия могут быть операторы и пробелы
+        with phase('parse'):
+            raw_args = shlex.split(user_input, posix=False)
+            lowered = [arg.lower() for arg in raw_args]
+            where_index = lowered.index('where', 2) if 'where' in lowered[2:] else -1
+        
+        if where_index == -1 or where_index >= len(raw_args) - 1:
+            command_failed('Неверный формат. Используйте: delete from <таблица> where <условие>')
+            return True
+        
+        table_name = args[2] if args[1].lower() == 'from' else args[1]
+        where_clause = ' '.join(raw_args[where_index + 1:])
+        
+        delete(table_name, where_clause)
+
+    elif command == 'info':
+        if len(args) != 2:
+            command_failed('Неверный формат. Используйте: info <имя_таблицы>')
+            return True
+        table_name = args[1]
+        info(table_name)
+
+    elif command == 'compact':
+        if len(args) != 2:
+            command_failed('Неверный формат. Используйте: compact <имя_таблицы>')
+            return True
+        compact(args[1])
+
+    elif command == 'analyze':
+        if len(args) != 2:
+            command_failed('Неверный формат. Используйте: analyze <имя_таблицы>')
+            return True
+        analyze(args[1])
+
+    elif command == 'explain':
+        if len(args) < 2 or args[1].lower() != 'select':
+            command_failed('Неверный формат. Используйте: explain select ...')
+            return True
+        try:
+            with phase('parse'):
+                query = parse_select(shlex.split(user_input, posix=False)[1:])
+        except ValueError as e:
+            command_failed(e)
+            return True
+        if query['join']:
+            command_failed('План соединения таблиц не выводится: explain поддерживает запросы к одной таблице.')
+            return True
+        # limit и offset агрегатного запроса относятся к группам, а не к строкам
+        if query['aggregates']:
+            explain(query['table'], query['where'])
+        else:
+            explain(query['table'], query['where'], query['limit'], query['offset'])
+
+    elif command == 'prepare':
+        if len(args) < 4 or args[2].lower() != 'as' or args[3].lower() != 'select':
+            command_failed('Неверный формат. Используйте: prepare <имя> as select ...')
+            return True
+        # разбор по исходным токенам с кавычками: "?" в кавычках - значение, а не параметр
+        try:
+            with phase('parse'):
+                query = parse_select(shlex.split(user_input, posix=False)[3:])
+        except ValueError as e:
+            command_failed(e)
+            return True
+        if query['join']:
+            command_failed('Соединение таблиц в подготовленных запросах не поддерживается.')
+            return True
+        prepare(args[1], query['table'], query['where'], query['limit'], query['offset'], query['format'],
+                query['aggregates'], query['group_by'], query['order_by'], query['descending'])
+
+    elif command == 'execute':
+        if len(args) < 2:
+            command_failed('Неверный формат. Используйте: execute <имя> [(<значение1>, <значение2>, ...)]')
+            return True
+        # значения разбираются по исходному вводу: в строках могут быть пробелы и запятые
+        values = []
+        if len(args) > 2:
+            try:
+                with phase('parse'):
+                    values = parse_values(' '.join(shlex.split(user_input, posix=False)[2:]))
+            except ValueError as e:
+                command_failed(e)
+                return True
+        execute(args[1], values)
+
+    elif command == 'deallocate':
+        if len(args) != 2:
+            command_failed('Неверный формат. Используйте: deallocate <имя>')
+            return True
+        deallocate(args[1])
+
+    elif command == 'create_index':
+        if len(args) not in (3, 4):
+            command_failed('Неверный формат. Используйте: create_index <имя_таблицы> <столбец> [hash|sorted]')
+            return True
+        kind = args[3].lower() if len(args) == 4 else 'hash'
+        create_index(args[1], args[2], kind)
+
+    elif command == 'drop_index':
+        if len(args) != 3:
+            command_failed('Неверный формат. Используйте: drop_index <имя_таблицы> <столбец>')
+            return True
+        drop_index(args[1], args[2])
+
+    elif command == 'convert_table':
+        if len(args) != 3:
+            command_failed('Неверный формат. Используйте: convert_table <имя_таблицы> <формат>')
+            return True
+        convert_table(args[1], args[2].lower())
+
+    elif command == 'cache_stats':
+        cache_stats()
+
+    elif command == 'stats':
+        if len(args) == 1:
+            show_stats()
+        elif len(args) == 2 and args[1].lower() == 'reset':
+            reset_stats()
+        elif len(args) in (3, 4) and args[1].lower() == 'export':
+            export_stats(args[2], args[3].lower() if len(args) == 4 else 'json')
+        else:
+            command_failed('Неверный формат. Используйте: stats [reset | export <файл> [json|prometheus]]')
+            return True
+
+    elif command in ('begin', 'commit', 'rollback'):
+        if len(args) != 1:
+            command_failed(f'Неверный формат. Используйте: {command}')
+            return True
+        {'begin': begin, 'commit': commit, 'rollback': rollback}[command]()
+
+    elif command == 'help':
+        print_help()
+
+    elif command == 'exit':
+        _finish_transaction()
+        print('Программа завершена. До свидания!')
+        return False
+
+    else:
+        command_failed(f'Функции "{command}" нет. Попробуйте снова.')
+
+    return True
+
 def run():
     """основной рабочий цикл"""
     print("\n***БАЗА ДАННЫХ***")
     print_help()
 
     while True:
-        metadata = load_metadata()  
-
         try:
             user_input = input('>>> Введите команду: ').strip()
             if not user_input:
                 continue
-
-            args = shlex.split(user_input)
-            command = args[0].lower()
-
-            if command == 'create_table':
-                if len(args) < 3:
-                    print('Недостаточно аргументов. Формат: create_table <имя> <столбец:тип> ...')
-                    continue
-                table_name = args[1]
-                columns = args[2:]
-                result = create_table(metadata, table_name, columns)
-                if result is not None:
-                    save_metadata(result)  
-
-            elif command == 'drop_table':
-                if len(args) != 2:
-                    print('Неверный формат. Используйте: drop_table <имя_таблицы>')
-                    continue
-                table_name = args[1]
-                result = drop_table(metadata, table_name)
-                if result is not None:
-                    save_metadata(result)
-
-            elif command == 'list_tables':
-                list_tables(metadata)
-
-            elif command == 'insert':
-                if len(args) < 4 or args[1].lower() != 'into' or args[3].lower() != 'values':
-                    print('Неверный формат. Используйте: insert into <таблица> values (<значение1>, <значение2>, ...)')
-                    continue
-                
-                table_name = args[2]
-                
-                values_str = ' '.join(args[4:])
-                if not values_str.startswith('(') or not values_str.endswith(')'):
-                    print('Значения должны быть в скобках.')
-                    continue
-                
-                values_str = values_str[1:-1]  
-                values = [v.strip() for v in values_str.split(',')]
-                
-                result = insert(metadata, table_name, values)
-
-            elif command == 'select':
-                if len(args) < 3 or args[1].lower() != 'from':
-                    print('Неверный формат. Используйте: select from <таблица> [where <условие>]')
-                    continue
-                
-                table_name = args[2]
-                
-                if len(args) > 4 and args[3].lower() == 'where':
-                    where_clause = ' '.join(args[4:])
-                    select(metadata, table_name, where_clause)
-                else:
-                    select(metadata, table_name)
-
-            elif command == 'update':
-                if len(args) < 4:
-                    print('Неверный формат. Используйте: update <таблица> set <столбец>=<значение> where <столбец>=<значение>')
-                    continue
-                
-            
-                set_index = -1
-                where_index = -1
-                
-                for i, arg in enumerate(args):
-                    if arg.lower() == 'set':
-                        set_index = i
-                    elif arg.lower() == 'where':
-                        where_index = i
-                
-                if set_index == -1 or where_index == -1 or where_index <= set_index + 1:
-                    print('Неверный формат. Используйте: update <таблица> set <столбец>=<значение> where <столбец>=<значение>')
-                    continue
-                
-                table_name = args[1]
-                set_clause = ' '.join(args[set_index + 1:where_index])
-                where_clause = ' '.join(args[where_index + 1:])
-                
-                result = update(metadata, table_name, set_clause, where_clause)
-
-            elif command == 'delete':
-                if len(args) < 4:
-                    print('Неверный формат. Используйте: delete from <таблица> where <условие>')
-                    continue
-                
-                
-                where_index = -1
-                for i in range(2, len(args)):
-                    if args[i].lower() == 'where':
-                        where_index = i
-                        break
-                
-                if where_index == -1 or where_index >= len(args) - 1:
-                    print('Неверный формат. Используйте: delete from <таблица> where <условие>')
-                    continue
-                
-                table_name = args[2] if args[1].lower() == 'from' else args[1]
-                where_clause = ' '.join(args[where_index + 1:])
-                
-                result = delete(metadata, table_name, where_clause)
-
-            elif command == 'info':
-                if len(args) != 2:
-                    print('Неверный формат. Используйте: info <имя_таблицы>')
-                    continue
-                table_name = args[1]
-                info(metadata, table_name)
-
-            elif command == 'help':
-                print_help()
-
-            elif command == 'exit':
-                print('Программа завершена. До свидания!')
+            if not execute_command(user_input):
                 break
 
-            else:
-                print(f'Функции "{command}" нет. Попробуйте снова.')
-
         except KeyboardInterrupt:
-            print('\nПрограмма прервана пользователем. До свидания!')
+            print()
+            _finish_transaction()
+            print('Программа прервана пользователем. До свидания!')
             break
         except Exception as e:
-            print(f'Неожиданная ошибка: {e}. Попробуйте снова.')
\ No newline at end of file
+            print(f'Неожиданная ошибка: {e}. Попробуйте снова.')
+
+def _script_commands(lines):
+    """
+    команды скрипта: пустые строки и комментарии (# или --) пропускаются,
+    завершающая точка с запятой отбрасывается
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#') or line.startswith('--'):
+            continue
+        if line.endswith(';'):
+            line = line[:-1].rstrip()
+        if line:
+            yield line
+
+def run_batch(lines, assume_yes=False):
+    """
+    пакетное выполнение команд без приглашений, баннеров и замера времени
+    метаданные читаются с диска один раз (далее - из кэша менеджера таблиц);
+    незафиксированная в конце скрипта транзакция отменяется
+    возвращает кол-во команд, завершившихся ошибкой: ошибки базы данных и неверные команды
+    (failures), непредвиденные исключения, операции, отмененные без подтверждения
+    """
+    settings['log_time'] = False
+    settings['confirm'] = 'yes' if assume_yes else 'no'
+
+    start = failures['count']
+    errors = 0
+    for user_input in _script_commands(lines):
+        try:
+            if not execute_command(user_input):
+                break
+        except Exception as e:
+            errors += 1
+            print(f'Неожиданная ошибка: {e}. Команда: {user_input}')
+    else:
+        _finish_transaction()
+    return errors + failures['count'] - start
@@ -0,0 +1,86 @@
+class DatabaseError(Exception):
+    """
+    базовая ошибка базы данных
+    """
+
+
+class NotFoundError(DatabaseError):
+    """
+    обращение к несуществующему объекту
+    """
+
+
+class TableNotFoundError(NotFoundError):
+    def __init__(self, table_name):
+        super().__init__(f'Таблица "{table_name}" не существует.')
+        self.table_name = table_name
+
+
+class ColumnNotFoundError(NotFoundError):
+    def __init__(self, table_name, column):
+        super().__init__(f'Столбец "{column}" не существует в таблице "{table_name}".')
+        self.table_name = table_name
+        self.column = column
+
+
+class IndexNotFoundError(NotFoundError):
+    def __init__(self, table_name, column):
+        super().__init__(f'Индекс по столбцу "{column}" не существует.')
+        self.table_name = table_name
+        self.column = column
+
+
+class StatementNotFoundError(NotFoundError):
+    def __init__(self, name):
+        super().__init__(f'Подготовленный запрос "{name}" не существует.')
+        self.name = name
+
+
+class AlreadyExistsError(DatabaseError):
+    """
+    объект с таким именем уже есть
+    """
+
+
+class TableExistsError(AlreadyExistsError):
+    def __init__(self, table_name):
+        super().__init__(f'Таблица "{table_name}" уже существует.')
+        self.table_name = table_name
+
+
+class ColumnExistsError(AlreadyExistsError):
+    def __init__(self, table_name, column):
+        super().__init__(f'Столбец "{column}" уже существует в таблице "{table_name}".')
+        self.table_name = table_name
+        self.column = column
+
+
+class IndexExistsError(AlreadyExistsError):
+    def __init__(self, table_name, column):
+        super().__init__(f'Индекс по столбцу "{column}" уже существует.')
+        self.table_name = table_name
+        self.column = column
+
+
+class ValidationError(DatabaseError, ValueError):
+    """
+    некорректные значения, схема, условие WHERE или параметры запроса
+    """
+
+
+class UnsupportedError(DatabaseError):
+    """
+    операция не поддерживается для таблицы в текущем формате хранения
+    """
+
+
+class TransactionError(DatabaseError):
+    """
+    неверное использование транзакций
+    """
+
+
+class LockTimeoutError(DatabaseError, TimeoutError):
+    """
+    блокировка не освобождена другим процессом за отведенное время
+    """
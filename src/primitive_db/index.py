@@ -0,0 +1,118 @@
+import sys
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain
+
+INDEX_TYPES = {'hash', 'sorted'}
+
+
+class HashIndex:
+    """
+    хэш-индекс: значение столбца -> записи с этим значением
+    поиск по равенству за O(1)
+    """
+    kind = 'hash'
+
+    def __init__(self, column, rows=()):
+        self.column = column
+        self._buckets = {}
+        for row in rows:
+            self.add(row)
+
+    def add(self, row):
+        key = row.get(self.column)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = {row['ID']: row}
+        else:
+            bucket[row['ID']] = row
+
+    def remove(self, row):
+        key = row.get(self.column)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        bucket.pop(row['ID'], None)
+        if not bucket:
+            del self._buckets[key]
+
+    def lookup(self, value):
+        bucket = self._buckets.get(value)
+        return list(bucket.values()) if bucket else []
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def size_bytes(self):
+        return sys.getsizeof(self._buckets) + sum(sys.getsizeof(bucket) for bucket in self._buckets.values())
+
+
+class SortedIndex(HashIndex):
+    """
+    упорядоченный индекс: хэш по значению + отсортированный список ключей
+    поиск по равенству за O(1), по диапазону за O(log n)
+    """
+    kind = 'sorted'
+
+    def __init__(self, column, rows=()):
+        self._keys = None  # при построении ключи сортируются один раз
+        super().__init__(column, rows)
+        self._keys = sorted(key for key in self._buckets if key is not None)
+
+    def add(self, row):
+        key = row.get(self.column)
+        is_new = key not in self._buckets
+        super().add(row)
+        if is_new and key is not None and self._keys is not None:
+            insort(self._keys, key)
+
+    def remove(self, row):
+        key = row.get(self.column)
+        super().remove(row)
+        if key not in self._buckets and key is not None:
+            pos = bisect_left(self._keys, key)
+            if pos < len(self._keys) and self._keys[pos] == key:
+                del self._keys[pos]
+
+    def first(self):
+        return self._keys[0] if self._keys else None
+
+    def last(self):
+        return self._keys[-1] if self._keys else None
+
+    def ordered(self, descending=False):
+        """
+        все записи в порядке значений столбца, записи с равным значением - по ID
+        записи без значения (None) - последними, при обратном порядке - первыми
+        """
+        keys = reversed(self._keys) if descending else iter(self._keys)
+        if None in self._buckets:
+            keys = chain([None], keys) if descending else chain(keys, [None])
+        for key in keys:
+            bucket = self._buckets[key]
+            for record_id in sorted(bucket):
+                yield bucket[record_id]
+
+    def range(self, low=None, high=None, include_low=True, include_high=True):
+        """
+        записи со значениями в диапазоне [low, high], в порядке возрастания
+        """
+        start = 0
+        if low is not None:
+            start = bisect_left(self._keys, low) if include_low else bisect_right(self._keys, low)
+        stop = len(self._keys)
+        if high is not None:
+            stop = bisect_right(self._keys, high) if include_high else bisect_left(self._keys, high)
+        for key in self._keys[start:stop]:
+            yield from self._buckets[key].values()
+
+    def size_bytes(self):
+        return super().size_bytes() + sys.getsizeof(self._keys)
+
+
+def create_index(kind, column, rows=()):
+    """
+    создание индекса нужного типа
+    """
+    if kind == 'sorted':
+        return SortedIndex(column, rows)
+    return HashIndex(column, rows)
@@ -0,0 +1,88 @@
+import os
+import time
+from contextlib import contextmanager
+
+from .errors import LockTimeoutError
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки между процессами не поддерживаются
+    fcntl = None
+
+# сколько ждать освобождения блокировки другим процессом (секунды)
+LOCK_TIMEOUT = 10.0
+
+_RETRY_DELAY = 0.01
+
+
+class FileLocks:
+    """
+    блокировки файлов между процессами (fcntl.flock): разделяемые для чтения,
+    монопольные для записи; повторный захват в том же процессе не блокирует
+    разделяемая блокировка не повышается до монопольной: flock делает это неатомарно
+    (другой процесс может захватить файл в промежутке, два процесса взаимно блокируются),
+    поэтому пути записи берут монопольную блокировку сразу
+    """
+
+    def __init__(self, timeout=LOCK_TIMEOUT):
+        self.timeout = timeout
+        self._held = {}  # путь -> [дескриптор, монопольная, глубина]
+
+    def _flock(self, fd, exclusive, path):
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(fd, mode | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise LockTimeoutError(f'{path} заблокирован другим процессом дольше {self.timeout} с')
+                time.sleep(_RETRY_DELAY)
+
+    def acquire(self, path, exclusive=False):
+        if fcntl is None:
+            return
+        held = self._held.get(path)
+        if held is not None:
+            if exclusive and not held[1]:
+                raise RuntimeError(f'{path}: повышение разделяемой блокировки до монопольной не поддерживается')
+            held[2] += 1
+            return
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            self._flock(fd, exclusive, path)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._held[path] = [fd, exclusive, 1]
+
+    def release(self, path):
+        if fcntl is None:
+            return
+        held = self._held[path]
+        held[2] -= 1
+        if held[2] == 0:
+            del self._held[path]
+            fcntl.flock(held[0], fcntl.LOCK_UN)
+            os.close(held[0])
+
+    @contextmanager
+    def shared(self, path):
+        self.acquire(path)
+        try:
+            yield
+        finally:
+            self.release(path)
+
+    @contextmanager
+    def exclusive(self, path):
+        self.acquire(path, exclusive=True)
+        try:
+            yield
+        finally:
+            self.release(path)
@@ -1,10 +1,154 @@
 #!/usr/bin/env python3
-from .engine import run
+import argparse
+import sys
 
+from . import parallel
+from .core import db
+from .engine import run, run_batch
 
-def main():
-    run()
+# кол-во функций в сводке --profile
+PROFILE_TOP = 30
+
+
+def _sizes(value):
+    """
+    список размеров таблиц: 1000,100000
+    """
+    try:
+        sizes = [int(size) for size in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'некорректный список размеров: {value}')
+    if any(size < 1 for size in sizes):
+        raise argparse.ArgumentTypeError(f'размеры должны быть положительными: {value}')
+    return sizes
+
+
+def _positive(value):
+    """
+    положительное целое число
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'ожидается целое число: {value}')
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'число должно быть положительным: {value}')
+    return number
+
+
+def _seconds(value):
+    """
+    положительное число секунд
+    """
+    try:
+        seconds = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'ожидается число секунд: {value}')
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError(f'время должно быть положительным: {value}')
+    return seconds
+
+
+def _parse_args(argv=None):
+    """
+    аргументы командной строки
+    """
+    parser = argparse.ArgumentParser(prog='project', description='PrimitiveDB')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('-f', '--file', help='выполнить команды из файла')
+    source.add_argument('-c', '--command', action='append', help='выполнить команду (можно указать несколько раз)')
+    parser.add_argument('-y', '--yes', action='store_true', help='подтверждать опасные операции автоматически')
+    parser.add_argument('--profile', nargs='?', const='', metavar='FILE',
+                        help='выполнить под cProfile: без FILE - сводка в stderr, с FILE - сохранить статистику (pstats)')
+    parser.add_argument('--workers', type=_positive, default=parallel.settings['workers'],
+                        help='процессов для перебора больших таблиц (по умолчанию - кол-во ядер, 1 - без параллельности)')
+    parser.add_argument('--cache-ttl', type=_seconds, metavar='SECONDS',
+                        help='время жизни результатов в кэше запросов (по умолчанию - до изменения таблицы)')
+    parser.add_argument('--table-cache-mb', type=_positive, metavar='MB',
+                        help='бюджет памяти кэша загруженных таблиц в мегабайтах (по умолчанию 256)')
+    parser.add_argument('--parallel-min-rows', type=_positive, default=parallel.settings['min_rows'],
+                        help=f'таблицы от скольких записей перебирать параллельно (по умолчанию {parallel.settings["min_rows"]})')
+
+    modes = parser.add_subparsers(dest='mode')
+    server = modes.add_parser('serve', help='запустить сервер базы данных')
+    address = server.add_mutually_exclusive_group(required=True)
+    address.add_argument('--socket', help='путь к unix-сокету')
+    address.add_argument('--port', type=int, help='tcp-порт')
+    server.add_argument('--host', default='127.0.0.1', help='адрес для tcp (по умолчанию 127.0.0.1)')
+    server.add_argument('-y', '--yes', action='store_true', help='подтверждать опасные операции автоматически')
+
+    benchmark = modes.add_parser('bench', help='замерить производительность на синтетических таблицах')
+    benchmark.add_argument('--sizes', type=_sizes,
+                           help='размеры таблиц через запятую (по умолчанию 1000,100000,1000000)')
+    benchmark.add_argument('--ops', type=int, help='точечных операций на размер (по умолчанию 200)')
+    benchmark.add_argument('--table', default='users', help='таблица из db_meta.json, по схеме которой генерируются данные')
+    benchmark.add_argument('-o', '--output', help='сохранить отчет в json-файл (по умолчанию - вывод в stdout)')
+    return parser.parse_args(argv)
+
+
+def _run(args):
+    """
+    выполнение в выбранном режиме; возвращает код выхода (None - интерактивный режим)
+    модули сервера и бенчмарка импортируются только в своем режиме: запуск -c/-f их не загружает
+    """
+    if args.mode == 'serve':
+        from .server import serve
+        serve(args.socket, args.host, args.port, args.yes)
+        return None
+    if args.mode == 'bench':
+        from .benchmarks.runner import DEFAULT_OPS, DEFAULT_SIZES, bench
+        sizes = DEFAULT_SIZES if args.sizes is None else args.sizes
+        ops = DEFAULT_OPS if args.ops is None else args.ops
+        return 0 if bench(sizes, ops, args.table, args.output) else 1
+    if args.command:
+        errors = run_batch(args.command, args.yes)
+    elif args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            errors = run_batch(f, args.yes)
+    elif not sys.stdin.isatty():
+        # команды переданы через конвейер
+        errors = run_batch(sys.stdin, args.yes)
+    else:
+        run()
+        return None
+    return 1 if errors else 0
+
+
+def _report_profile(profiler, filepath):
+    """
+    результат профилирования: файл pstats или самые затратные функции в stderr
+    """
+    import pstats
+
+    if filepath:
+        profiler.dump_stats(filepath)
+        print(f'Профиль сохранен: {filepath}', file=sys.stderr)
+        return
+    stats = pstats.Stats(profiler, stream=sys.stderr)
+    stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    parallel.settings['workers'] = args.workers
+    parallel.settings['min_rows'] = args.parallel_min_rows
+    db.query_cache.set_ttl(args.cache_ttl)
+    if args.table_cache_mb is not None:
+        db.tables.set_max_bytes(args.table_cache_mb * 1024 * 1024)
+
+    if args.profile is None:
+        code = _run(args)
+    else:
+        # профилировщик загружается только с --profile
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            code = profiler.runcall(_run, args)
+        finally:
+            _report_profile(profiler, args.profile)
+    if code is not None:
+        sys.exit(code)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
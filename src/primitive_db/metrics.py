@@ -0,0 +1,223 @@
+import json
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# границы корзин гистограмм времени (секунды)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# префикс имен метрик в формате Prometheus
+PROMETHEUS_PREFIX = 'primitive_db_'
+
+# операция для замеров вне команд (программный интерфейс)
+API_OPERATION = 'api'
+
+_histograms = {}  # (имя, метки) -> Histogram
+_counters = {}  # (имя, метки) -> значение
+_active = []  # состояние выполняемой команды: фазы и счетчики копятся до ее завершения
+
+
+class Histogram:
+    """
+    гистограмма с фиксированными корзинами: кол-во, сумма, минимум, максимум
+    и распределение без хранения значений
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина - больше всех границ
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """
+        оценка квантиля: линейная интерполяция внутри корзины,
+        ограниченная наблюдаемыми минимумом и максимумом (оценка не выходит за реальные значения)
+        """
+        if not self.count:
+            return None
+        return min(max(self._estimate(q), self.min), self.max)
+
+    def _estimate(self, q):
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                low = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return low
+                return low + (self.buckets[i] - low) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], self.counts)),
+        }
+
+
+def observe(name, value, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = Histogram()
+    histogram.observe(value)
+
+def increment(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    _counters[key] = _counters.get(key, 0) + value
+
+@contextmanager
+def operation(name):
+    """
+    замер команды: общее время, время фаз и счетчики записываются по ее завершении
+    вложенные операции учитываются во внешней
+    """
+    if _active:
+        yield _active[-1]
+        return
+    state = {'op': name, 'phases': {}, 'counters': {}, 'seconds': None}
+    _active.append(state)
+    start = time.perf_counter()
+    try:
+        yield state
+    finally:
+        state['seconds'] = time.perf_counter() - start
+        _active.pop()
+        name = state['op']
+        observe('operation_seconds', state['seconds'], op=name)
+        increment('operations_total', op=name)
+        for phase_name, seconds in state['phases'].items():
+            observe('phase_seconds', seconds, op=name, phase=phase_name)
+        for counter, value in state['counters'].items():
+            increment(counter, value, op=name)
+
+def name_operation(name):
+    """
+    уточнение имени текущей команды после разбора (например, select -> aggregate)
+    """
+    if _active:
+        _active[-1]['op'] = name
+
+@contextmanager
+def phase(name):
+    """
+    замер фазы команды: parse, load, filter, render, persist
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if _active:
+            phases = _active[-1]['phases']
+            phases[name] = phases.get(name, 0.0) + seconds
+        else:
+            observe('phase_seconds', seconds, op=API_OPERATION, phase=name)
+
+def count(name, value=1):
+    """
+    счетчик текущей команды: rows_scanned, rows_returned, bytes_read, bytes_written, попадания в кэши
+    """
+    if _active:
+        counters = _active[-1]['counters']
+        counters[name] = counters.get(name, 0) + value
+    else:
+        increment(name, value, op=API_OPERATION)
+
+def reset():
+    _histograms.clear()
+    _counters.clear()
+
+def snapshot():
+    """
+    все метрики в виде словаря
+    """
+    histograms = {}
+    for (name, labels), histogram in sorted(_histograms.items()):
+        histograms.setdefault(name, []).append(dict(labels=dict(labels), **histogram.to_dict()))
+    counters = {}
+    for (name, labels), value in sorted(_counters.items()):
+        counters.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+    return {'histograms': histograms, 'counters': counters}
+
+def _prometheus_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in items) + '}'
+
+def to_prometheus():
+    """
+    метрики в текстовом формате Prometheus
+    """
+    lines = []
+    for name in sorted({name for name, _ in _histograms}):
+        full_name = PROMETHEUS_PREFIX + name
+        lines.append(f'# TYPE {full_name} histogram')
+        for (metric, labels), histogram in sorted(_histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip([str(bound) for bound in histogram.buckets] + ['+Inf'], histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{full_name}_bucket{_prometheus_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{full_name}_sum{_prometheus_labels(labels)} {histogram.sum}')
+            lines.append(f'{full_name}_count{_prometheus_labels(labels)} {histogram.count}')
+    for name in sorted({name for name, _ in _counters}):
+        full_name = PROMETHEUS_PREFIX + name + ('' if name.endswith('_total') else '_total')
+        lines.append(f'# TYPE {full_name} counter')
+        for (metric, labels), value in sorted(_counters.items()):
+            if metric == name:
+                lines.append(f'{full_name}{_prometheus_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+def export(filepath, export_format='json'):
+    """
+    выгрузка метрик в файл: json или prometheus
+    """
+    if export_format == 'prometheus':
+        content = to_prometheus()
+    else:
+        content = json.dumps(snapshot(), ensure_ascii=False, indent=2)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+def _empty_summary():
+    return {'count': 0, 'p50_ms': None, 'p99_ms': None, 'mean_ms': None, 'phases_ms': {}, 'counters': {}}
+
+def operations_summary():
+    """
+    сводка по командам: кол-во, p50/p99/среднее (мс), среднее время фаз (мс) и счетчики
+    """
+    summary = {}
+    for (name, labels), histogram in _histograms.items():
+        labels = dict(labels)
+        op = summary.setdefault(labels['op'], _empty_summary())
+        if name == 'operation_seconds':
+            op['count'] = histogram.count
+            op['p50_ms'] = histogram.quantile(0.5) * 1000
+            op['p99_ms'] = histogram.quantile(0.99) * 1000
+            op['mean_ms'] = histogram.sum / histogram.count * 1000
+        elif name == 'phase_seconds':
+            op['phases_ms'][labels['phase']] = histogram.sum / histogram.count * 1000
+    for (name, labels), value in _counters.items():
+        labels = dict(labels)
+        if name != 'operations_total':
+            summary.setdefault(labels['op'], _empty_summary())['counters'][name] = value
+    return summary
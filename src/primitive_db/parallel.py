@@ -0,0 +1,59 @@
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# параллельный перебор больших таблиц:
+# workers - кол-во процессов (1 - только последовательный перебор),
+# min_rows - таблицы меньшего размера перебираются в текущем процессе
+settings = {'workers': os.cpu_count() or 1, 'min_rows': 500000}
+
+# частей диапазона строк на процесс: неравномерные части не задерживают весь перебор
+CHUNKS_PER_WORKER = 4
+
+_pool = None
+_pool_workers = None
+
+
+def enabled(rows):
+    """
+    перебор rows строк выполняется параллельно
+    """
+    return settings['workers'] > 1 and rows >= settings['min_rows']
+
+def split_range(rows):
+    """
+    диапазоны строк [start, stop) для процессов
+    """
+    parts = settings['workers'] * CHUNKS_PER_WORKER
+    size = max(1, -(-rows // parts))
+    return [(start, min(start + size, rows)) for start in range(0, rows, size)]
+
+def _get_pool():
+    """
+    пул процессов создается при первом параллельном переборе и переиспользуется
+    """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != settings['workers']:
+        shutdown()
+        _pool = ProcessPoolExecutor(max_workers=settings['workers'])
+        _pool_workers = settings['workers']
+    return _pool
+
+def map_ordered(func, tasks):
+    """
+    выполнение func(task) в пуле процессов; результаты - в порядке задач
+    None - пул недоступен (процесс пула аварийно завершился), нужен последовательный перебор
+    """
+    try:
+        return list(_get_pool().map(func, tasks))
+    except BrokenProcessPool:
+        shutdown()
+        return None
+
+@atexit.register
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
@@ -1,52 +1,78 @@
-def parse_where(where_str):
-    """
-    фильтрация, перевод строки ввода в словарь
-    """
-    where_str = where_str.strip()
-    if '=' not in where_str:
-        raise ValueError("Неверный формат условия: ожидается 'столбец = значение'")
+import re
 
-    key, value = where_str.split('=', 1)
-    key = key.strip()
 
-    # удаление лищних пробелов и кавычек
-    value = value.strip()
-    if value.startswith('"') and value.endswith('"'):
-        value = value[1:-1]
-    elif value.lower() == 'true':
-        value = True
-    elif value.lower() == 'false':
-        value = False
-    else:
+def parse_value(value_str, expected_type):
+    """
+    парсинг значения согласно ожидаемому типу
+    """
+    value_str = value_str.strip()
+    
+    if expected_type == 'int':
         try:
-            value = int(value)
+            return int(value_str)
         except ValueError:
-            pass  
+            raise ValueError(f'Некорректное целое число: {value_str}')
+    
+    elif expected_type == 'bool':
+        if value_str.lower() in ('true', '1', 'yes'):
+            return True
+        elif value_str.lower() in ('false', '0', 'no'):
+            return False
+        else:
+            raise ValueError(f'Некорректное булево значение: {value_str}')
+    
+    elif expected_type == 'str':
+        # очитска от кавычек если они есть
+        if (value_str.startswith('"') and value_str.endswith('"')) or \
+           (value_str.startswith("'") and value_str.endswith("'")):
+            return value_str[1:-1]
+        return value_str
+    
+    return value_str
 
-    return {key: value}
+def _split_outside_quotes(text, separator):
+    """
+    разбиение строки по разделителю, не учитывая разделители внутри кавычек
+    """
+    parts = []
+    current = []
+    quote = None
+    for char in text:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == separator:
+            parts.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    if quote:
+        raise ValueError(f'Незакрытая кавычка: {text}')
+    parts.append(''.join(current))
+    return parts
 
 def parse_set(set_str):
     """
     обновление таблицы, приобразование ввода в словарь
+    a=1, b='x, y' -> {'a': '1', 'b': 'x, y'}
+    значения возвращаются строками без кавычек, тип задается схемой таблицы
     """
     set_dict = {}
-    parts = set_str.split(',')
-    for part in parts:
+    for part in _split_outside_quotes(set_str, ','):
+        if '=' not in part:
+            raise ValueError(f"Неверный формат SET: ожидается 'столбец = значение', получено '{part.strip()}'")
         key, value = part.split('=', 1)
         key = key.strip()
         value = value.strip()
+        if not key:
+            raise ValueError('Неверный формат SET: не указан столбец')
+        if key in set_dict:
+            raise ValueError(f'Столбец "{key}" указан в SET несколько раз')
 
-        if value.startswith('"') and value.endswith('"'):
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
             value = value[1:-1]
-        elif value.lower() == 'true':
-            value = True
-        elif value.lower() == 'false':
-            value = False
-        else:
-            try:
-                value = int(value)
-            except ValueError:
-                pass
 
         set_dict[key] = value
     return set_dict
@@ -70,3 +96,117 @@ def parse_values(values_str):
     lexer.whitespace = ','
     lexer.whitespace_split = True
     return [token.strip() for token in lexer]
+
+AGGREGATE_FUNCTIONS = ('count', 'sum', 'min', 'max', 'avg')
+
+_AGGREGATE_RE = re.compile(r'^(\w+)\(\s*(\*|\w+)\s*\)$')
+
+def parse_aggregates(items_str):
+    """
+    разбор списка выражений select: count(*), sum(столбец), ...
+    возвращает список (функция, столбец); столбец без функции - (None, столбец)
+    """
+    aggregates = []
+    for item in items_str.split(','):
+        item = item.strip()
+        match = _AGGREGATE_RE.match(item)
+        if match:
+            func, column = match.group(1).lower(), match.group(2)
+            if func not in AGGREGATE_FUNCTIONS:
+                raise ValueError(f"Неизвестная функция: {func}. Доступны: {', '.join(AGGREGATE_FUNCTIONS)}")
+            if column == '*' and func != 'count':
+                raise ValueError(f"Функция {func} требует имя столбца")
+            aggregates.append((func, column))
+        elif re.fullmatch(r'\w+', item):
+            aggregates.append((None, item))
+        else:
+            raise ValueError(f"Некорректное выражение в select: {item}")
+    return aggregates
+
+def _join_reference(ref, tables):
+    """
+    столбец условия соединения: <таблица>.<столбец> -> (таблица, столбец)
+    """
+    table, _, column = ref.partition('.')
+    if table not in tables or not column:
+        raise ValueError(f'Ожидается <таблица>.<столбец> одной из таблиц {", ".join(tables)}, получено "{ref}"')
+    return table, column
+
+def parse_join(left_table, tokens):
+    """
+    разбор соединения: join <таблица> on <таблица>.<столбец> = <таблица>.<столбец>
+    возвращает описание соединения и оставшиеся токены
+    """
+    usage = 'Неверный формат соединения. Используйте: join <таблица> on <таблица>.<столбец> = <таблица>.<столбец>'
+    if len(tokens) < 4 or tokens[2].lower() != 'on':
+        raise ValueError(usage)
+    right_table = tokens[1]
+    if len(tokens) >= 6 and tokens[4] == '=':
+        refs, rest = (tokens[3], tokens[5]), tokens[6:]
+    elif tokens[3].count('=') == 1:
+        refs, rest = tokens[3].split('='), tokens[4:]
+    else:
+        raise ValueError(usage)
+    columns = dict(_join_reference(ref.strip(), (left_table, right_table)) for ref in refs)
+    if len(columns) != 2:
+        raise ValueError('Условие соединения должно связывать столбцы двух разных таблиц')
+    return {'table': right_table, 'left_column': columns[left_table], 'right_column': columns[right_table]}, rest
+
+def parse_select(args):
+    """
+    разбор команды select: токены с сохраненными кавычками (shlex.split(..., posix=False)),
+    чтобы значения в кавычках в условии WHERE не разбирались как операторы
+    select [агрегаты] from <таблица> [join <таблица> on <таблица>.<столбец> = <таблица>.<столбец>] [where <условие>]
+    [group by <столбец>] [order by <столбец> [asc|desc]] [limit N] [offset M] [format table|tsv|jsonl]
+    """
+    usage = ("Неверный формат. Используйте: select [count(*)|sum(столбец)|...] from <таблица> [join ...] [where <условие>] "
+             "[group by <столбец>] [order by <столбец> [asc|desc]] [limit N] [offset M] [format table|tsv|jsonl]")
+    lowered = [arg.lower() for arg in args]
+    if 'from' not in lowered:
+        raise ValueError(usage)
+    from_index = lowered.index('from')
+    if from_index + 1 >= len(args):
+        raise ValueError(usage)
+
+    query = {'table': args[from_index + 1], 'aggregates': None, 'where': None, 'group_by': None,
+             'join': None, 'order_by': None, 'descending': False, 'limit': None, 'offset': 0, 'format': 'table'}
+    if from_index > 1:
+        query['aggregates'] = parse_aggregates(' '.join(args[1:from_index]))
+    rest = args[from_index + 2:]
+
+    # параметры вывода идут парами в конце команды
+    while len(rest) >= 2 and rest[-2].lower() in ('limit', 'offset', 'format'):
+        option, value = rest[-2].lower(), rest[-1]
+        if option == 'format':
+            query['format'] = value.lower()
+        else:
+            if not value.isdigit():
+                raise ValueError(f"Значение {option} должно быть неотрицательным целым числом: {value}")
+            query[option] = int(value)
+        rest = rest[:-2]
+
+    # order by <столбец> [asc|desc] идет после group by
+    if len(rest) >= 4 and rest[-4].lower() == 'order' and rest[-3].lower() == 'by' and rest[-1].lower() in ('asc', 'desc'):
+        query['order_by'], query['descending'] = rest[-2], rest[-1].lower() == 'desc'
+        rest = rest[:-4]
+    elif len(rest) >= 3 and rest[-3].lower() == 'order' and rest[-2].lower() == 'by':
+        query['order_by'] = rest[-1]
+        rest = rest[:-3]
+
+    # group by <столбец> идет после условия
+    if len(rest) >= 3 and rest[-3].lower() == 'group' and rest[-2].lower() == 'by':
+        query['group_by'] = rest[-1]
+        rest = rest[:-3]
+    if query['group_by'] and not query['aggregates']:
+        raise ValueError("group by используется только с агрегатными функциями")
+
+    if rest and rest[0].lower() == 'join':
+        if query['aggregates']:
+            raise ValueError("Агрегатные функции с join не поддерживаются")
+        query['join'], rest = parse_join(query['table'], rest)
+
+    if rest:
+        if rest[0].lower() != 'where' or len(rest) < 2:
+            raise ValueError("Неверный формат условия. Используйте: where <условие>")
+        query['where'] = ' '.join(rest[1:])
+    return query
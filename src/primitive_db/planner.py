@@ -0,0 +1,240 @@
+import math
+
+from . import parallel
+from .where import checked_rows, compile_condition, index_candidates, scan_rows, union_candidates
+
+# стоимость плана - в проверках строк полного перебора:
+# строка-кандидат из индекса (поиск записи + проверка условия)
+INDEX_ROW_COST = 1.5
+# запуск задач в пуле процессов и сбор результатов
+PARALLEL_START_COST = 20000
+
+# доли строк, если статистики нет (analyze не выполнялся)
+DEFAULT_EQ_SELECTIVITY = 0.05
+DEFAULT_RANGE_SELECTIVITY = 1 / 3
+
+# пути доступа к строкам
+FULL_SCAN = 'full_scan'
+PARALLEL_SCAN = 'parallel_scan'
+ID_LOOKUP = 'id_lookup'
+INDEX_LOOKUP = 'index_lookup'
+INDEX_RANGE = 'index_range'
+INDEX_UNION = 'index_union'
+
+
+def column_statistics(values):
+    """
+    статистика столбца за один проход: кол-во различных значений, минимум, максимум,
+    кол-во пустых значений (None и '')
+    """
+    distinct = set()
+    empty = 0
+    for value in values:
+        if value is None or value == '':
+            empty += 1
+        else:
+            distinct.add(value)
+    return {
+        'distinct': len(distinct),
+        'min': min(distinct, default=None),
+        'max': max(distinct, default=None),
+        'empty': empty,
+    }
+
+
+def _column_stats(stats, column):
+    if not stats:
+        return None
+    return stats['columns'].get(column)
+
+
+def _non_empty(col_stats, stats):
+    """
+    доля непустых значений столбца
+    """
+    if not stats['rows']:
+        return 0.0
+    return 1 - col_stats['empty'] / stats['rows']
+
+
+def _eq_selectivity(column, value, stats, rows):
+    """
+    доля строк со значением столбца, равным value
+    """
+    if column == 'ID':
+        return 1 / rows if rows else 0.0
+    col_stats = _column_stats(stats, column)
+    if col_stats is None:
+        return DEFAULT_EQ_SELECTIVITY
+    if not col_stats['distinct']:
+        return 0.0
+    try:
+        if value < col_stats['min'] or value > col_stats['max']:
+            return 0.0
+    except TypeError:
+        pass
+    return _non_empty(col_stats, stats) / col_stats['distinct']
+
+
+def _range_selectivity(column, low, high, stats, rows):
+    """
+    доля строк со значением столбца в диапазоне [low, high] (None - без границы)
+    для целых столбцов - по минимуму и максимуму, иначе - доля по умолчанию
+    """
+    col_stats = _column_stats(stats, column)
+    if col_stats is None:
+        return DEFAULT_RANGE_SELECTIVITY
+    lowest, highest = col_stats['min'], col_stats['max']
+    if lowest is None:
+        return 0.0
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in (lowest, highest)):
+        return DEFAULT_RANGE_SELECTIVITY
+    low = lowest if low is None else max(low, lowest)
+    high = highest if high is None else min(high, highest)
+    if low > high:
+        return 0.0
+    return _non_empty(col_stats, stats) * (high - low + 1) / (highest - lowest + 1)
+
+
+def selectivity(expr, stats, rows):
+    """
+    оценка доли строк, удовлетворяющих условию
+    условия AND считаются независимыми
+    """
+    kind = expr[0]
+    if kind == 'cmp':
+        _, op, column, value = expr
+        if op == '=':
+            return _eq_selectivity(column, value, stats, rows)
+        if op in ('!=', '<>'):
+            return 1 - _eq_selectivity(column, value, stats, rows)
+        if not isinstance(value, int) or isinstance(value, bool):
+            return DEFAULT_RANGE_SELECTIVITY
+        low, high = {'<': (None, value - 1), '<=': (None, value), '>': (value + 1, None), '>=': (value, None)}[op]
+        return _range_selectivity(column, low, high, stats, rows)
+    if kind == 'in':
+        _, column, values = expr
+        return min(1.0, sum(_eq_selectivity(column, value, stats, rows) for value in set(values)))
+    if kind == 'between':
+        _, column, low, high = expr
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in (low, high)):
+            return DEFAULT_RANGE_SELECTIVITY
+        return _range_selectivity(column, low, high, stats, rows)
+    if kind == 'not':
+        return 1 - selectivity(expr[1], stats, rows)
+    left, right = selectivity(expr[1], stats, rows), selectivity(expr[2], stats, rows)
+    if kind == 'and':
+        return left * right
+    return left + right - left * right
+
+
+def _path(access, column, node, candidates, cost, children=None):
+    path = {'access': access, 'column': column, 'node': node, 'candidates': candidates, 'cost': cost}
+    if children is not None:
+        # объединение: выбранные пути частей условия, по ним и выполняется запрос
+        path['children'] = children
+    return path
+
+
+def _index_paths(table, expr, stats, rows):
+    """
+    пути доступа через первичный ключ и индексы для условия
+    для AND подходит путь любой части, для OR - только если путь есть у обеих частей
+    """
+    kind = expr[0]
+    if kind == 'and':
+        return _index_paths(table, expr[1], stats, rows) + _index_paths(table, expr[2], stats, rows)
+    if kind == 'or':
+        left, right = _index_paths(table, expr[1], stats, rows), _index_paths(table, expr[2], stats, rows)
+        if not left or not right:
+            return []
+        left, right = min(left, key=_cost), min(right, key=_cost)
+        return [_path(INDEX_UNION, f'{left["column"]}, {right["column"]}', expr,
+                      left['candidates'] + right['candidates'], left['cost'] + right['cost'], [left, right])]
+    if kind == 'not':
+        return []
+
+    column = expr[2] if kind == 'cmp' else expr[1]
+    is_point = kind == 'in' or (kind == 'cmp' and expr[1] == '=')
+    probes = len(set(expr[2])) if kind == 'in' else 1
+    # поиск значения: хэш или двоичный поиск
+    probe_cost = probes * math.log2(rows + 2)
+    candidates = rows * selectivity(expr, stats, rows)
+    if column == 'ID':
+        if not is_point:
+            return []
+        return [_path(ID_LOOKUP, column, expr, candidates, probe_cost + candidates * INDEX_ROW_COST)]
+    index = table.indexes.get(column)
+    if index is None:
+        return []
+    if is_point:
+        return [_path(INDEX_LOOKUP, column, expr, candidates, probe_cost + candidates * INDEX_ROW_COST)]
+    if index.kind != 'sorted' or (kind == 'cmp' and expr[1] in ('!=', '<>')):
+        return []
+    return [_path(INDEX_RANGE, column, expr, candidates, probe_cost + candidates * INDEX_ROW_COST)]
+
+
+def _cost(path):
+    # при равной стоимости предпочтителен путь через индекс
+    return path['cost'], path['access'] in (FULL_SCAN, PARALLEL_SCAN)
+
+
+def plan_query(table, expr, stats=None, limit=None, offset=0):
+    """
+    выбор пути доступа к строкам по стоимости: полный перебор (с ранней остановкой при limit),
+    параллельный перебор, поиск по ID, поиск или диапазон по индексу
+    expr - типизированное условие (None - без условия), stats - статистика analyze
+    возвращает план: выбранный путь, оценки строк и все рассмотренные варианты
+    """
+    rows = len(table.rows)
+    fraction = 1.0 if expr is None else selectivity(expr, stats, rows)
+    estimated = rows * fraction
+
+    # полный перебор останавливается, как только набрано offset + limit строк
+    scanned = rows
+    if limit is not None and fraction > 0:
+        scanned = min(rows, (offset + limit) / fraction)
+    full_scan = _path(FULL_SCAN, None, None, rows, scanned)
+    full_scan['early_stop'] = scanned < rows
+    alternatives = [full_scan]
+    if expr is not None:
+        if hasattr(table, 'parallel_scan') and parallel.enabled(rows):
+            alternatives.append(_path(PARALLEL_SCAN, None, None, rows, rows / parallel.settings['workers'] + PARALLEL_START_COST))
+        alternatives.extend(_index_paths(table, expr, stats, rows))
+
+    chosen = min(alternatives, key=_cost)
+    if limit is not None:
+        estimated = min(estimated, limit)
+    return {
+        'expr': expr,
+        'rows': rows,
+        'analyzed': stats is not None,
+        'estimated_rows': estimated,
+        'early_stop': chosen.get('early_stop', False),
+        'chosen': chosen,
+        'alternatives': sorted(alternatives, key=_cost),
+    }
+
+
+def path_candidates(table, path):
+    """
+    записи-кандидаты по пути доступа через первичный ключ или индекс
+    для объединения - по выбранным при оценке путям частей условия, как в плане
+    """
+    if path['access'] == INDEX_UNION:
+        return union_candidates(path_candidates(table, child) for child in path['children'])
+    return index_candidates(table, path['node'])
+
+
+def execute(table, plan):
+    """
+    записи, удовлетворяющие условию, по выбранному пути доступа (лениво)
+    в метрики записывается кол-во проверенных записей
+    """
+    expr = plan['expr']
+    chosen = plan['chosen']
+    if expr is None:
+        return iter(table.rows)
+    if chosen['access'] in (FULL_SCAN, PARALLEL_SCAN):
+        return scan_rows(table, expr, use_parallel=chosen['access'] == PARALLEL_SCAN)
+    return checked_rows(path_candidates(table, chosen), compile_condition(expr))
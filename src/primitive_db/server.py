@@ -0,0 +1,136 @@
+import asyncio
+import io
+import json
+import os
+from contextlib import redirect_stdout
+
+from .decorators import failures, settings
+from .engine import execute_command
+from .storage import tables
+
+# предельная длина строки запроса (байты)
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+def _parse_request(line):
+    """
+    запрос: строка команды или json-объект {"command": "...", "yes": true}
+    возвращает (команда, подтверждать ли опасные операции)
+    """
+    text = line.decode('utf-8').strip()
+    if text.startswith('{'):
+        request = json.loads(text)
+        return str(request.get('command', '')).strip(), request.get('yes')
+    return text, None
+
+
+class Server:
+    """
+    сервер базы данных: таблицы, индексы и кэши остаются в памяти между запросами
+    протокол - строки: запрос на строку, ответ - json-строка {"ok": ..., "output": ...};
+    запросы одного соединения выполняются по порядку (можно отправлять пачкой)
+    транзакция закрепляет движок за соединением до commit/rollback
+    """
+
+    def __init__(self, assume_yes=False):
+        self.assume_yes = assume_yes
+        self._engine_lock = asyncio.Lock()
+        self._txn_owner = None
+
+    def _run(self, command, yes):
+        """
+        выполнение команды с перехватом вывода
+        ok - False, если команда завершилась ошибкой: ошибка базы данных или неверная команда
+        (failures, как в run_batch), операция отменена без подтверждения, непредвиденное исключение
+        """
+        settings['confirm'] = 'yes' if (self.assume_yes if yes is None else yes) else 'no'
+        output = io.StringIO()
+        start = failures['count']
+        ok = True
+        with redirect_stdout(output):
+            try:
+                execute_command(command)
+            except Exception as e:
+                ok = False
+                print(f'Неожиданная ошибка: {e}')
+        return {'ok': ok and failures['count'] == start, 'output': output.getvalue()}
+
+    async def _execute(self, conn, command, yes):
+        # вне своей транзакции соединение ждет, пока движок занят чужой
+        if self._txn_owner is not conn:
+            await self._engine_lock.acquire()
+        try:
+            return self._run(command, yes)
+        finally:
+            if tables.in_transaction:
+                self._txn_owner = conn
+            else:
+                self._txn_owner = None
+                self._engine_lock.release()
+
+    async def _finish(self, conn):
+        """
+        незафиксированная транзакция отключившегося клиента отменяется
+        """
+        if self._txn_owner is conn:
+            self._run('rollback', None)
+            self._txn_owner = None
+            self._engine_lock.release()
+
+    async def handle(self, reader, writer):
+        conn = object()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                try:
+                    command, yes = _parse_request(line)
+                except (ValueError, UnicodeDecodeError) as e:
+                    response = {'ok': False, 'output': f'Некорректный запрос: {e}\n'}
+                else:
+                    if not command:
+                        response = {'ok': True, 'output': ''}
+                    elif command.lower() == 'exit':
+                        break
+                    else:
+                        response = await self._execute(conn, command, yes)
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            await self._finish(conn)
+            writer.close()
+
+
+async def _serve(server, socket_path=None, host='127.0.0.1', port=None):
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        listener = await asyncio.start_unix_server(server.handle, path=socket_path, limit=MAX_REQUEST_BYTES)
+        print(f'Сервер запущен: {socket_path}')
+    else:
+        listener = await asyncio.start_server(server.handle, host, port, limit=MAX_REQUEST_BYTES)
+        print(f'Сервер запущен: {host}:{port}')
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def serve(socket_path=None, host='127.0.0.1', port=None, assume_yes=False):
+    """
+    запуск сервера на unix-сокете или tcp-порту
+    """
+    settings['log_time'] = False
+    tables.metadata()
+    try:
+        asyncio.run(_serve(Server(assume_yes), socket_path, host, port))
+    except KeyboardInterrupt:
+        print('Сервер остановлен.')
@@ -0,0 +1,83 @@
+import heapq
+import pickle
+import tempfile
+from itertools import islice
+
+from .metrics import count
+
+# строк в одной части внешней сортировки: таблица больше сортируется частями,
+# отсортированные части сбрасываются во временные файлы и затем сливаются
+SORT_RUN_ROWS = 200000
+# строк в одной записи pickle временного файла
+_SPILL_BATCH = 1000
+
+
+def sort_key(position):
+    """
+    ключ сортировки строки-кортежа по столбцу с позицией position
+    пустые значения (None) - последними, при обратном порядке - первыми (как группы агрегатов)
+    """
+    def key(row):
+        value = row[position]
+        return (value is None, value)
+    return key
+
+
+def top_rows(rows, key, limit, descending=False):
+    """
+    первые limit строк в порядке сортировки (список)
+    куча из limit строк: O(n log k) времени и O(k) памяти, строки с равным ключом - в исходном порядке
+    """
+    if descending:
+        return heapq.nlargest(limit, rows, key=key)
+    return heapq.nsmallest(limit, rows, key=key)
+
+
+def _spill(run, spill_file):
+    """
+    запись отсортированной части во временный файл пакетами строк
+    """
+    for start in range(0, len(run), _SPILL_BATCH):
+        pickle.dump(run[start:start + _SPILL_BATCH], spill_file, pickle.HIGHEST_PROTOCOL)
+    count('sort_spilled_rows', len(run))
+
+
+def _read_run(spill_file):
+    """
+    строки отсортированной части из временного файла (лениво)
+    """
+    spill_file.seek(0)
+    while True:
+        try:
+            batch = pickle.load(spill_file)
+        except EOFError:
+            return
+        yield from batch
+
+
+def sorted_rows(rows, key, descending=False, run_rows=SORT_RUN_ROWS):
+    """
+    все строки в порядке сортировки (лениво), сортировка устойчивая
+    до run_rows строк сортируются в памяти; больше - внешняя сортировка: части по run_rows строк
+    сортируются и сбрасываются во временные файлы, затем сливаются (heapq.merge)
+    в памяти одновременно - одна часть и по пакету строк каждой части при слиянии
+    """
+    rows = iter(rows)
+    run = list(islice(rows, run_rows))
+    run.sort(key=key, reverse=descending)
+    if len(run) < run_rows:
+        yield from run
+        return
+
+    runs = []
+    try:
+        while run:
+            spill_file = tempfile.TemporaryFile()
+            runs.append(spill_file)
+            _spill(run, spill_file)
+            run = list(islice(rows, run_rows))
+            run.sort(key=key, reverse=descending)
+        yield from heapq.merge(*(_read_run(spill_file) for spill_file in runs), key=key, reverse=descending)
+    finally:
+        for spill_file in runs:
+            spill_file.close()
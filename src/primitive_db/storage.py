@@ -0,0 +1,570 @@
+import os
+import sys
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+
+from .binary import BinaryTable, load_binary, save_binary
+from .columnar import ColumnarTable, load_columnar, save_columnar
+from .index import create_index
+from .locks import FileLocks
+from .metrics import count, phase
+from .utils import (
+    TABLE_FILE_EXTENSIONS,
+    append_table_log,
+    load_metadata,
+    needs_compaction,
+    read_commit_record,
+    read_table,
+    remove_commit_record,
+    remove_table_file,
+    save_metadata,
+    save_table_data,
+    write_commit_record,
+)
+
+# форматы хранения таблиц
+STORAGE_FORMATS = {'json', 'columnar', 'binary'}
+
+# файл снимка таблицы в каждом формате
+_FORMAT_FILES = {'json': 'json', 'columnar': 'col', 'binary': 'bin'}
+
+# бюджет памяти под загруженные таблицы (байты)
+TABLE_CACHE_BYTES = 256 * 1024 * 1024
+
+# кол-во строк, по которым оценивается размер таблицы
+_SIZE_SAMPLE = 100
+
+
+def _file_signature(*paths):
+    """
+    отпечаток файлов: время изменения и размер
+    по нему определяется, что файл был изменен извне
+    """
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+def _signature_bytes(signature):
+    """
+    суммарный размер файлов по отпечатку
+    """
+    return sum(item[1] for item in signature if item is not None)
+
+def _estimate_row_size(rows):
+    """
+    приблизительный средний размер строки таблицы по выборке
+    """
+    sample = list(islice(rows.values(), _SIZE_SAMPLE))
+    sample_size = sum(sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values()) for row in sample)
+    return sample_size // len(sample)
+
+
+class Table:
+    """
+    загруженная таблица: строки и индексы по столбцам
+    строки хранятся в словаре ID -> запись (первичный ключ), порядок вставки сохраняется
+    методы изменения поддерживают индексы и возвращают записи для журнала
+    """
+
+    def __init__(self, name, rows, next_id=1, index_defs=None):
+        self.name = name
+        # строки упорядочены по ID: новые ID выдаются по возрастанию, старые файлы сортируются при загрузке
+        if any(prev['ID'] > row['ID'] for prev, row in zip(rows, islice(rows, 1, None))):
+            rows = sorted(rows, key=lambda row: row['ID'])
+        self.by_id = {row['ID']: row for row in rows}
+        self.next_id = max(next_id, max(self.by_id, default=0) + 1)
+        self.indexes = {}
+        self.log_size = 0  # записей журнала после снимка
+        self._row_size = None  # оценивается один раз, а не при каждой записи
+        self.sync_indexes(index_defs or {})
+
+    def sync_indexes(self, index_defs):
+        """
+        приведение индексов в соответствие с описанием из метаданных
+        """
+        for column in list(self.indexes):
+            if index_defs.get(column) != self.indexes[column].kind:
+                del self.indexes[column]
+        for column, kind in index_defs.items():
+            if column not in self.indexes:
+                self.indexes[column] = create_index(kind, column, self.rows)
+
+    @property
+    def rows(self):
+        return self.by_id.values()
+
+    def min_id(self):
+        return next(iter(self.by_id), None)
+
+    def max_id(self):
+        return next(reversed(self.by_id), None)
+
+    def lookup(self, column, value):
+        """
+        поиск по первичному ключу или индексу; None, если индекса по столбцу нет
+        """
+        if column == 'ID':
+            row = self.by_id.get(value)
+            return [row] if row is not None else []
+        index = self.indexes.get(column)
+        if index is None:
+            return None
+        return index.lookup(value)
+
+    def insert(self, record):
+        self.by_id[record['ID']] = record
+        self.next_id = max(self.next_id, record['ID'] + 1)
+        for index in self.indexes.values():
+            index.add(record)
+        return [{'op': 'insert', 'row': record}]
+
+    def insert_many(self, records):
+        """
+        вставка пакета записей: одна запись журнала на весь пакет
+        """
+        for record in records:
+            self.insert(record)
+        return [{'op': 'insert_many', 'rows': records}]
+
+    def update(self, records, values):
+        touched = [index for column, index in self.indexes.items() if column in values]
+        for record in records:
+            for index in touched:
+                index.remove(record)
+            record.update(values)
+            for index in touched:
+                index.add(record)
+        return [{'op': 'update', 'ids': [record['ID'] for record in records], 'values': values}]
+
+    def delete(self, records):
+        for record in records:
+            self.by_id.pop(record['ID'], None)
+        for index in self.indexes.values():
+            for record in records:
+                index.remove(record)
+        return [{'op': 'delete', 'ids': [record['ID'] for record in records]}]
+
+    def size_bytes(self):
+        if self._row_size is None and self.by_id:
+            self._row_size = _estimate_row_size(self.by_id)
+        size = sys.getsizeof(self.by_id) + (self._row_size or 0) * len(self.by_id)
+        return size + sum(index.size_bytes() for index in self.indexes.values())
+
+
+class TableManager:
+    """
+    менеджер таблиц: держит загруженные таблицы в памяти,
+    вытесняет давно не используемые при превышении бюджета (LRU)
+    внутри транзакции изменения применяются к таблицам в памяти,
+    а записи журнала и метаданные копятся до commit
+    доступ из нескольких процессов согласуется блокировками файлов:
+    чтение с диска - под разделяемой блокировкой, изменение - под монопольной
+    """
+
+    def __init__(self, data_dir='data', meta_path='db_meta.json', max_bytes=TABLE_CACHE_BYTES):
+        self.data_dir = data_dir
+        self.meta_path = meta_path
+        self.max_bytes = max_bytes
+        self._tables = OrderedDict()  # имя -> (версия, таблица, размер)
+        self._used_bytes = 0
+        self._metadata = None
+        self._meta_signature = None
+        self._pending = None  # имя -> записи журнала транзакции; None - транзакции нет
+        self._dropped = set()  # таблицы, удаленные в транзакции
+        self._meta_dirty = False
+        self.locks = FileLocks()
+        self._txn_locks = set()  # блокировки, которые держатся до конца транзакции
+
+    def _lock_path(self, table_name):
+        return os.path.join(self.data_dir, table_name + '.lock')
+
+    @property
+    def _meta_lock_path(self):
+        return self.meta_path + '.lock'
+
+    @contextmanager
+    def _exclusive(self, path):
+        """
+        монопольная блокировка; в транзакции держится до commit/rollback,
+        чтобы другие процессы не изменили данные, на которых она основана
+        """
+        keep = self._pending is not None and path not in self._txn_locks
+        self.locks.acquire(path, exclusive=True)
+        if keep:
+            self._txn_locks.add(path)
+        try:
+            yield
+        finally:
+            if not keep:
+                self.locks.release(path)
+
+    def _release_txn_locks(self):
+        for path in self._txn_locks:
+            self.locks.release(path)
+        self._txn_locks = set()
+
+    def locked(self, table_name):
+        """
+        монопольная блокировка таблицы на время изменения:
+        таблица, загруженная внутри блока, актуальна и не изменится другим процессом
+        """
+        return self._exclusive(self._lock_path(table_name))
+
+    @contextmanager
+    def metadata_locked(self):
+        """
+        монопольная блокировка db_meta.json; внутри блока метаданные актуальны
+        """
+        with self._exclusive(self._meta_lock_path):
+            yield self.metadata()
+
+    def _signature(self, table_name):
+        base = os.path.join(self.data_dir, table_name)
+        return _file_signature(base + '.json', base + '.log', base + '.col', base + '.bin')
+
+    def version(self, table_name):
+        """
+        версия таблицы: версия схемы и отпечаток файлов; меняется при любой записи и изменении схемы
+        """
+        return self._schema_version(table_name), self._signature(table_name)
+
+    def _index_defs(self, table_name):
+        return self.metadata().get(table_name, {}).get('indexes', {})
+
+    def _format(self, table_name):
+        return self.metadata().get(table_name, {}).get('format', 'json')
+
+    def _schema(self, table_name):
+        return [tuple(col.split(':')) for col in self.metadata()[table_name]['columns']]
+
+    def _schema_version(self, table_name):
+        return self.metadata().get(table_name, {}).get('schema_version', 1)
+
+    def _open(self, table_name):
+        """
+        чтение таблицы с диска в формате из метаданных
+        возвращает таблицу и версию, с которой она прочитана: версия берется под той же
+        блокировкой, иначе запись другого процесса после чтения попала бы в кэш под новой версией
+        """
+        if table_name in self._dropped:
+            # таблица пересоздана в транзакции, старые файлы еще не удалены
+            version = self.version(table_name)
+            if self._format(table_name) == 'columnar':
+                return ColumnarTable(table_name, self._schema(table_name)), version
+            if self._format(table_name) == 'binary':
+                return BinaryTable(table_name, self._schema(table_name)), version
+            return Table(table_name, [], 1, self._index_defs(table_name)), version
+        # уплотнение журнала при чтении не выполняется: оно требует монопольной блокировки
+        # и делается при следующей записи в таблицу
+        with self.locks.shared(self._lock_path(table_name)):
+            version = self.version(table_name)
+            count('bytes_read', _signature_bytes(version[1]))
+            if self._format(table_name) == 'columnar':
+                return load_columnar(table_name, self._schema(table_name), self.data_dir, auto_compact=False), version
+            if self._format(table_name) == 'binary':
+                return load_binary(table_name, self._schema(table_name), self.data_dir, auto_compact=False), version
+            rows, next_id, log_size = read_table(table_name, self.data_dir)
+        table = Table(table_name, rows, next_id, self._index_defs(table_name))
+        table.log_size = log_size
+        return table, version
+
+    def _put(self, table, version=None):
+        """
+        таблица в кэш; version - версия, с которой она прочитана (по умолчанию - текущая,
+        вызывающий код держит монопольную блокировку таблицы)
+        """
+        table_name = table.name
+        self._drop(table_name)
+        size = table.size_bytes()
+        self._tables[table_name] = (self.version(table_name) if version is None else version, table, size)
+        self._used_bytes += size
+        self._evict()
+
+    def _evict(self):
+        """
+        вытеснение давно не используемых таблиц сверх бюджета памяти;
+        последняя загруженная таблица и таблицы с незафиксированными изменениями не вытесняются
+        """
+        pinned = self._pending or ()
+        last = next(reversed(self._tables), None)
+        for name in list(self._tables):
+            if self._used_bytes <= self.max_bytes:
+                break
+            if name != last and name not in pinned:
+                self._drop(name)
+
+    def set_max_bytes(self, max_bytes):
+        """
+        новый бюджет памяти кэша таблиц (байты); лишние таблицы вытесняются сразу
+        """
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def _drop(self, table_name):
+        entry = self._tables.pop(table_name, None)
+        if entry is not None:
+            self._used_bytes -= entry[2]
+
+    def load(self, table_name):
+        """
+        таблица; файл читается только если его нет в кэше или он изменен извне
+        """
+        with phase('load'):
+            entry = self._tables.get(table_name)
+            if entry is not None and entry[0] == self.version(table_name):
+                count('table_cache_hits')
+                self._tables.move_to_end(table_name)
+                table = entry[1]
+                table.sync_indexes(self._index_defs(table_name))
+                return table
+
+            count('table_cache_misses')
+            table, version = self._open(table_name)
+            self._put(table, version)
+            return table
+
+    def write(self, table, entries):
+        """
+        запись изменений в журнал и обновление таблицы в кэше
+        в транзакции записи журнала откладываются до commit
+        """
+        with self.locked(table.name):
+            if self._pending is not None:
+                self._pending.setdefault(table.name, []).extend(entries)
+                self._put(table)
+                return
+            with phase('persist'):
+                count('bytes_written', append_table_log(table.name, entries, self.data_dir))
+                table.log_size += len(entries)
+                # журнал разросся - снимок пишется из памяти
+                if needs_compaction(table.log_size, len(table.rows)):
+                    self._save_snapshot(table)
+            self._put(table)
+
+    def _save_snapshot(self, table):
+        """
+        запись снимка таблицы из памяти, журнал очищается
+        """
+        if isinstance(table, ColumnarTable):
+            save_columnar(table, self.data_dir)
+        elif isinstance(table, BinaryTable):
+            save_binary(table, self.data_dir)
+        else:
+            save_table_data(table.name, list(table.rows), self.data_dir, table.next_id)
+        table.log_size = 0
+        count('bytes_written', _signature_bytes(self._signature(table.name)))
+
+    def drop_table(self, table_name):
+        """
+        удаление файлов таблицы (в транзакции - при commit)
+        """
+        with self.locked(table_name):
+            self._drop(table_name)
+            if self._pending is not None:
+                self._pending.pop(table_name, None)
+                self._dropped.add(table_name)
+            else:
+                self._remove_files(table_name)
+
+    def _remove_files(self, table_name):
+        """
+        удаление файлов таблицы и ее файла блокировки (блокировка при этом удерживается:
+        процессы, ожидающие ее, получат блокировку удаленного файла, а не новой таблицы)
+        """
+        for ext in TABLE_FILE_EXTENSIONS:
+            remove_table_file(table_name, ext, self.data_dir)
+        try:
+            os.remove(self._lock_path(table_name))
+        except FileNotFoundError:
+            pass
+
+    @property
+    def in_transaction(self):
+        return self._pending is not None
+
+    def begin(self):
+        """
+        начало транзакции
+        """
+        self.metadata()
+        self._pending = {}
+        self._dropped = set()
+        self._meta_dirty = False
+
+    def commit(self):
+        """
+        фиксация транзакции; возвращает кол-во измененных таблиц
+        изменения одной таблицы дописываются в ее журнал одной строкой с одним fsync;
+        при нескольких таблицах или изменении метаданных сначала на диск пишется
+        запись транзакции, затем она переносится в журналы (после сбоя - при следующем запуске)
+        """
+        record = {
+            'tables': {name: entries for name, entries in self._pending.items() if entries},
+            'dropped': sorted(self._dropped),
+            'metadata': self._metadata if self._meta_dirty else None,
+        }
+        touched = set(self._pending) | self._dropped
+        try:
+            with phase('persist'):
+                if len(record['tables']) == 1 and not record['dropped'] and record['metadata'] is None:
+                    (table_name, entries), = record['tables'].items()
+                    count('bytes_written', append_table_log(table_name, [{'op': 'txn', 'entries': entries}], self.data_dir, sync=True))
+                elif record['tables'] or record['dropped'] or record['metadata'] is not None:
+                    # файл транзакции общий: фиксации нескольких таблиц выполняются по очереди
+                    with self.locks.exclusive(self._meta_lock_path):
+                        write_commit_record(record, self.data_dir)
+                        self._apply_commit(record)
+        except BaseException:
+            self.rollback()
+            raise
+
+        self._pending = None
+        self._dropped = set()
+        self._meta_dirty = False
+        # файлы изменены этим процессом, таблицы в памяти актуальны
+        for name, entries in record['tables'].items():
+            entry = self._tables.get(name)
+            if entry is not None:
+                entry[1].log_size += len(entries)
+        for name in touched:
+            entry = self._tables.get(name)
+            if entry is not None:
+                self._tables[name] = (self.version(name), entry[1], entry[2])
+        if record['metadata'] is not None:
+            self._meta_signature = _file_signature(self.meta_path)
+        self._release_txn_locks()
+        return len(touched)
+
+    def rollback(self):
+        """
+        отмена транзакции: измененные таблицы и метаданные перечитываются с диска
+        возвращает имена затронутых таблиц
+        """
+        touched = set(self._pending or ()) | self._dropped
+        for name in touched:
+            self._drop(name)
+        if self._meta_dirty:
+            self._metadata = None
+        self._pending = None
+        self._dropped = set()
+        self._meta_dirty = False
+        self._release_txn_locks()
+        return touched
+
+    def _apply_commit(self, record):
+        """
+        перенос записи транзакции в файлы таблиц и метаданных
+        повторное применение безопасно: операции журнала идемпотентны
+        """
+        for name in record['dropped']:
+            self._remove_files(name)
+        for name, entries in record['tables'].items():
+            count('bytes_written', append_table_log(name, [{'op': 'txn', 'entries': entries}], self.data_dir, sync=True))
+        if record['metadata'] is not None:
+            save_metadata(record['metadata'], self.meta_path, sync=True)
+        remove_commit_record(self.data_dir)
+
+    def alter(self, table_name, entry, metadata):
+        """
+        изменение схемы таблицы: запись alter в журнале и новые метаданные, строки не перезаписываются
+        (строки, записанные до изменения, обновляются при чтении таблицы и сохраняются при уплотнении)
+        обе записи фиксируются через файл транзакции: после сбоя между ними перенос завершается
+        при следующем запуске, журнал и метаданные не расходятся
+        вызывается под монопольной блокировкой метаданных, вне транзакции
+        """
+        record = {'tables': {table_name: [entry]}, 'dropped': [], 'metadata': metadata}
+        with self.locked(table_name):
+            with phase('persist'):
+                write_commit_record(record, self.data_dir)
+                self._apply_commit(record)
+            self._drop(table_name)
+        self._metadata = metadata
+        self._meta_signature = _file_signature(self.meta_path)
+
+    def compact(self, table_name):
+        """
+        уплотнение журнала таблицы
+        """
+        with self.locked(table_name):
+            table = self.load(table_name)
+            with phase('persist'):
+                self._save_snapshot(table)
+            self._put(table)
+        return table
+
+    def convert(self, table_name, storage_format):
+        """
+        перезапись таблицы в другом формате хранения
+        формат в метаданных меняет вызывающий код
+        """
+        with self.locked(table_name):
+            table = self.load(table_name)
+            with phase('persist'):
+                if storage_format == 'columnar':
+                    save_columnar(ColumnarTable.from_rows(table_name, self._schema(table_name), table.rows, table.next_id), self.data_dir)
+                elif storage_format == 'binary':
+                    save_binary(BinaryTable.from_rows(table_name, self._schema(table_name), table.rows, table.next_id), self.data_dir)
+                else:
+                    save_table_data(table_name, list(table.rows), self.data_dir, table.next_id)
+                # файлы прежнего формата удаляются
+                for other_format, ext in _FORMAT_FILES.items():
+                    if other_format != storage_format:
+                        remove_table_file(table_name, ext, self.data_dir)
+            self._drop(table_name)
+
+    def invalidate(self, table_name=None):
+        """
+        сброс таблицы (или всех таблиц) из кэша
+        """
+        if table_name is None:
+            self._tables.clear()
+            self._used_bytes = 0
+        else:
+            self._drop(table_name)
+
+    def metadata(self):
+        """
+        метаданные; db_meta.json перечитывается только при изменении
+        """
+        if self._pending is not None:
+            return self._metadata
+        if self._metadata is None and read_commit_record(self.data_dir) is not None:
+            # завершение транзакции, прерванной сбоем
+            with self.locks.exclusive(self._meta_lock_path):
+                record = read_commit_record(self.data_dir)
+                if record is not None:
+                    self._apply_commit(record)
+        signature = _file_signature(self.meta_path)
+        if self._metadata is None or signature != self._meta_signature:
+            with self.locks.shared(self._meta_lock_path):
+                self._metadata = load_metadata(self.meta_path)
+                self._meta_signature = _file_signature(self.meta_path)
+        return self._metadata
+
+    def save_metadata(self, metadata):
+        """
+        сохранение метаданных (в транзакции - при commit)
+        """
+        if self._pending is not None:
+            self._metadata = metadata
+            self._meta_dirty = True
+            return
+        with self.locks.exclusive(self._meta_lock_path), phase('persist'):
+            save_metadata(metadata, self.meta_path)
+        self._metadata = metadata
+        self._meta_signature = _file_signature(self.meta_path)
+
+    def stats(self):
+        """
+        состояние кэша таблиц
+        """
+        return {'tables': list(self._tables), 'used_bytes': self._used_bytes, 'max_bytes': self.max_bytes}
+
+
+tables = TableManager()
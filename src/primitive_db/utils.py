@@ -1,41 +1,293 @@
+import csv
 import json
 import os
 
+# порог автоматического уплотнения журнала (кол-во записей)
+COMPACT_THRESHOLD = 1000
+
+# один кодировщик на все записи журнала
+_log_encoder = json.JSONEncoder(ensure_ascii=False)
+
+# размер блока при поиске оборванной строки в конце журнала (байты)
+_TAIL_BLOCK = 64 * 1024
+
+# файлы, из которых состоит таблица
+TABLE_FILE_EXTENSIONS = ('json', 'log', 'col', 'bin')
+
+# запись фиксируемой транзакции (до ее переноса в журналы таблиц)
+COMMIT_FILE = '.commit'
+
 
 def load_metadata(filepath='db_meta.json'):
     """
     загрузка данных из json
+    старый формат (таблица -> список столбцов) приводится к {"columns": [...]}
     """
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            metadata = json.load(f)
     except FileNotFoundError:
         return {}
+    for table_name, table_meta in metadata.items():
+        if isinstance(table_meta, list):
+            metadata[table_name] = {'columns': table_meta}
+    return metadata
 
-def save_metadata(data, filepath='db_meta.json'):
+def save_metadata(data, filepath='db_meta.json', sync=False):
     """
     сохранение данных в json
+    файл записывается атомарно: временный файл + переименование
     """
-    with open(filepath, 'w', encoding='utf-8') as f:
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
 
-def load_table_data(table_name, data_dir='data'):
+def _table_path(table_name, data_dir, ext):
     """
-    загрузка данных таблицы из json
+    путь к файлу таблицы
     """
     os.makedirs(data_dir, exist_ok=True)
-    filepath = os.path.join(data_dir, f'{table_name}.json')
+    return os.path.join(data_dir, f'{table_name}.{ext}')
+
+def _load_snapshot(table_name, data_dir='data'):
+    """
+    загрузка снимка таблицы из json
+    """
+    filepath = _table_path(table_name, data_dir, 'json')
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             return json.load(f)
     except FileNotFoundError:
         return []
 
-def save_table_data(table_name, data, data_dir='data'):
+def read_table_log(table_name, data_dir='data'):
     """
-    сохранение данных таблицы в json
+    чтение журнала изменений таблицы
+    оборванная последняя строка (сбой при записи) пропускается
+    записи транзакции хранятся одной строкой и применяются целиком
+    """
+    filepath = _table_path(table_name, data_dir, 'log')
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if entry.get('op') == 'txn':
+                    yield from entry['entries']
+                else:
+                    yield entry
+    except FileNotFoundError:
+        return
+
+def _truncate_torn_tail(f):
+    """
+    обрезка оборванной последней строки журнала (сбой при записи)
+    иначе следующая запись склеится с ней в некорректную строку, и при чтении
+    будут потеряны все записи после нее
+    """
+    size = f.seek(0, os.SEEK_END)
+    if not size:
+        return
+    f.seek(size - 1)
+    if f.read(1) == b'\n':
+        return
+    # последний перевод строки ищется блоками с конца файла
+    end = size
+    while end > 0:
+        start = max(0, end - _TAIL_BLOCK)
+        f.seek(start)
+        pos = f.read(end - start).rfind(b'\n')
+        if pos != -1:
+            f.truncate(start + pos + 1)
+            return
+        end = start
+    f.truncate(0)
+
+def append_table_log(table_name, entries, data_dir='data', sync=False):
+    """
+    дозапись изменений в журнал таблицы (под монопольной блокировкой таблицы)
+    оборванная последняя строка предыдущей записи сначала обрезается
+    sync - дождаться записи на диск (fsync)
+    возвращает кол-во записанных байт
+    """
+    if not entries:
+        return 0
+    filepath = _table_path(table_name, data_dir, 'log')
+    data = ''.join(_log_encoder.encode(entry) + '\n' for entry in entries).encode('utf-8')
+    with open(filepath, 'a+b') as f:
+        _truncate_torn_tail(f)
+        f.write(data)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    return len(data)
+
+def write_commit_record(record, data_dir='data'):
+    """
+    запись фиксируемой транзакции: после fsync транзакция считается зафиксированной
     """
     os.makedirs(data_dir, exist_ok=True)
-    filepath = os.path.join(data_dir, f'{table_name}.json')
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+    filepath = os.path.join(data_dir, COMMIT_FILE)
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(_log_encoder.encode(record))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+def read_commit_record(data_dir='data'):
+    """
+    незавершенная запись транзакции (после сбоя) или None
+    """
+    try:
+        with open(os.path.join(data_dir, COMMIT_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def remove_commit_record(data_dir='data'):
+    """
+    удаление записи транзакции после ее переноса в журналы
+    """
+    try:
+        os.remove(os.path.join(data_dir, COMMIT_FILE))
+    except FileNotFoundError:
+        pass
+
+def entry_ids(entry):
+    """
+    ID записей, затронутых update/delete: одна запись журнала на всю операцию ('ids')
+    или, в старых журналах, на каждую строку ('id')
+    """
+    return entry['ids'] if 'ids' in entry else (entry['id'],)
+
+def alter_rows(rows, entry):
+    """
+    изменение схемы (запись журнала alter) в строках-словарях:
+    добавленный столбец получает значение по умолчанию, удаленный убирается
+    """
+    if 'add' in entry:
+        column, default = entry['add'], entry['default']
+        for row in rows:
+            row[column] = default
+    else:
+        column = entry['drop']
+        for row in rows:
+            row.pop(column, None)
+
+def replay_table_log(table_data, entries):
+    """
+    применение журнала к снимку таблицы
+    операции идемпотентны, поэтому повторное применение безопасно
+    возвращает строки, следующий ID и кол-во записей журнала
+    """
+    rows = {record['ID']: record for record in table_data}
+    next_id = max(rows, default=0) + 1
+    count = 0
+    for entry in entries:
+        count += 1
+        op = entry.get('op')
+        if op == 'insert':
+            row = entry['row']
+            rows[row['ID']] = row
+            next_id = max(next_id, row['ID'] + 1)
+        elif op == 'insert_many':
+            for row in entry['rows']:
+                rows[row['ID']] = row
+            if entry['rows']:
+                next_id = max(next_id, entry['rows'][-1]['ID'] + 1)
+        elif op == 'update':
+            for record_id in entry_ids(entry):
+                row = rows.get(record_id)
+                if row is not None:
+                    row.update(entry['values'])
+        elif op == 'delete':
+            for record_id in entry_ids(entry):
+                rows.pop(record_id, None)
+        elif op == 'alter':
+            # строки, записанные до изменения схемы, обновляются при чтении
+            alter_rows(rows.values(), entry)
+        elif op == 'meta':
+            next_id = max(next_id, entry['next_id'])
+    return list(rows.values()), next_id, count
+
+def read_table(table_name, data_dir='data'):
+    """
+    чтение таблицы без записи на диск: снимок json + журнал изменений
+    возвращает строки, следующий ID и кол-во записей журнала
+    """
+    table_data = _load_snapshot(table_name, data_dir)
+    return replay_table_log(table_data, read_table_log(table_name, data_dir))
+
+def needs_compaction(log_size, row_count):
+    """
+    журнал разросся: записей больше порога и больше, чем строк в таблице
+    """
+    return log_size > COMPACT_THRESHOLD and log_size > row_count
+
+def save_table_data(table_name, data, data_dir='data', next_id=None):
+    """
+    сохранение данных таблицы в json
+    снимок записывается атомарно, журнал заменяется записью счетчика ID
+    """
+    filepath = _table_path(table_name, data_dir, 'json')
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, filepath)
+
+    reset_table_log(table_name, data_dir, next_id)
+
+def reset_table_log(table_name, data_dir='data', next_id=None):
+    """
+    очистка журнала после записи снимка
+    в журнале остается только счетчик ID
+    """
+    log_path = _table_path(table_name, data_dir, 'log')
+    if next_id is None:
+        if os.path.exists(log_path):
+            os.remove(log_path)
+        return
+    tmp_path = log_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'op': 'meta', 'next_id': next_id}) + '\n')
+    os.replace(tmp_path, log_path)
+
+def remove_table_file(table_name, ext, data_dir='data'):
+    """
+    удаление файла таблицы, если он есть
+    """
+    filepath = _table_path(table_name, data_dir, ext)
+    if os.path.exists(filepath):
+        os.remove(filepath)
+
+def read_import_file(filepath):
+    """
+    построчное чтение файла импорта: csv с заголовком или jsonl
+    возвращает словари столбец -> значение
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext not in ('.csv', '.jsonl'):
+        raise ValueError(f'Неподдерживаемый формат файла: {filepath}. Ожидается .csv или .jsonl')
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f'Файл {filepath} не найден')
+
+    def _rows():
+        with open(filepath, 'r', encoding='utf-8', newline='') as f:
+            if ext == '.csv':
+                yield from csv.DictReader(f)
+                return
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    return _rows()
@@ -0,0 +1,440 @@
+import operator
+import re
+
+from .metrics import count
+from .parser import parse_value
+
+# сравнения, доступные в условии WHERE
+_COMPARISONS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<>': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+_KEYWORDS = {'and', 'or', 'not', 'in', 'between'}
+
+# параметр подготовленного запроса
+PARAMETER = '?'
+
+_TOKEN_RE = re.compile(r"""\s*(?:("[^"]*"|'[^']*')|(<=|>=|!=|<>|=|<|>|\(|\)|,)|([^\s=<>!(),]+))""")
+
+
+def _tokenize(text):
+    """
+    разбиение условия на токены: (вид, значение)
+    вид - 'literal', 'op' или 'word'
+    """
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f'Не удалось разобрать условие: {text[pos:]}')
+        quoted, op, word = match.groups()
+        if quoted is not None:
+            tokens.append(('literal', quoted))
+        elif op is not None:
+            tokens.append(('op', op))
+        else:
+            tokens.append(('word', word))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    разбор условия методом рекурсивного спуска
+    результат - дерево из кортежей:
+    ('cmp', оператор, столбец, значение), ('in', столбец, [значения]),
+    ('between', столбец, от, до), ('and', a, b), ('or', a, b), ('not', a)
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _next(self):
+        token = self._peek()
+        if token[0] is None:
+            raise ValueError('Неожиданный конец условия')
+        self.pos += 1
+        return token
+
+    def _is_keyword(self, keyword):
+        kind, value = self._peek()
+        return kind == 'word' and value.lower() == keyword
+
+    def _expect_op(self, op):
+        kind, value = self._next()
+        if kind != 'op' or value != op:
+            raise ValueError(f'Ожидается "{op}", получено "{value}"')
+
+    def _literal(self):
+        kind, value = self._next()
+        if kind == 'op':
+            raise ValueError(f'Ожидается значение, получено "{value}"')
+        return value
+
+    def parse(self):
+        expr = self._or()
+        if self.pos != len(self.tokens):
+            raise ValueError(f'Лишние символы в условии: {self._peek()[1]}')
+        return expr
+
+    def _or(self):
+        expr = self._and()
+        while self._is_keyword('or'):
+            self.pos += 1
+            expr = ('or', expr, self._and())
+        return expr
+
+    def _and(self):
+        expr = self._not()
+        while self._is_keyword('and'):
+            self.pos += 1
+            expr = ('and', expr, self._not())
+        return expr
+
+    def _not(self):
+        if self._is_keyword('not'):
+            self.pos += 1
+            return ('not', self._not())
+        return self._primary()
+
+    def _primary(self):
+        kind, value = self._next()
+        if kind == 'op' and value == '(':
+            expr = self._or()
+            self._expect_op(')')
+            return expr
+        if kind != 'word' or value.lower() in _KEYWORDS:
+            raise ValueError(f'Ожидается имя столбца, получено "{value}"')
+        column = value
+
+        negate = False
+        if self._is_keyword('not'):
+            self.pos += 1
+            negate = True
+
+        if self._is_keyword('in'):
+            self.pos += 1
+            self._expect_op('(')
+            values = [self._literal()]
+            while self._peek() == ('op', ','):
+                self.pos += 1
+                values.append(self._literal())
+            self._expect_op(')')
+            expr = ('in', column, values)
+        elif self._is_keyword('between'):
+            self.pos += 1
+            low = self._literal()
+            if not self._is_keyword('and'):
+                raise ValueError('Ожидается AND в условии BETWEEN')
+            self.pos += 1
+            expr = ('between', column, low, self._literal())
+        elif negate:
+            raise ValueError('После NOT ожидается IN или BETWEEN')
+        else:
+            op_kind, op = self._next()
+            if op_kind != 'op' or op not in _COMPARISONS:
+                raise ValueError(f'Неизвестный оператор сравнения: {op}')
+            expr = ('cmp', op, column, self._literal())
+
+        return ('not', expr) if negate else expr
+
+
+def parse_condition(text):
+    """
+    разбор условия WHERE в дерево выражения
+    """
+    tokens = _tokenize(text)
+    if not tokens:
+        raise ValueError('Пустое условие')
+    return _Parser(tokens).parse()
+
+
+class Parameter:
+    """
+    параметр ? в условии подготовленного запроса: порядковый номер, столбец и его тип
+    значение подставляется при выполнении (fill_parameters)
+    """
+
+    __slots__ = ('number', 'column', 'column_type')
+
+    def __init__(self, number, column, column_type):
+        self.number = number
+        self.column = column
+        self.column_type = column_type
+
+    def __repr__(self):
+        return f'?{self.number + 1}'
+
+
+def _typed(schema, column, raw, params=None):
+    """
+    значение литерала в типе столбца
+    params - список параметров подготовленного запроса: ? без кавычек становится параметром
+    """
+    if column not in schema:
+        raise ValueError(f'Столбец "{column}" не существует')
+    if params is not None and raw == PARAMETER:
+        param = Parameter(len(params), column, schema[column])
+        params.append(param)
+        return param
+    if len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in '"\'':
+        if schema[column] != 'str':
+            raw = raw[1:-1]
+    return parse_value(raw, schema[column])
+
+
+def bind_condition(expr, schema, params=None):
+    """
+    приведение значений в дереве выражения к типам столбцов из схемы
+    params - список, в который собираются параметры ? подготовленного запроса (по порядку в условии)
+    """
+    kind = expr[0]
+    if kind == 'cmp':
+        _, op, column, raw = expr
+        return ('cmp', op, column, _typed(schema, column, raw, params))
+    if kind == 'in':
+        _, column, raws = expr
+        return ('in', column, [_typed(schema, column, raw, params) for raw in raws])
+    if kind == 'between':
+        _, column, low, high = expr
+        return ('between', column, _typed(schema, column, low, params), _typed(schema, column, high, params))
+    if kind == 'not':
+        return ('not', bind_condition(expr[1], schema, params))
+    return (kind, bind_condition(expr[1], schema, params), bind_condition(expr[2], schema, params))
+
+
+def _filled(value, values):
+    return values[value.number] if isinstance(value, Parameter) else value
+
+
+def fill_parameters(expr, values):
+    """
+    подстановка типизированных значений параметров в условие подготовленного запроса
+    """
+    kind = expr[0]
+    if kind == 'cmp':
+        _, op, column, value = expr
+        return ('cmp', op, column, _filled(value, values))
+    if kind == 'in':
+        _, column, items = expr
+        return ('in', column, [_filled(value, values) for value in items])
+    if kind == 'between':
+        _, column, low, high = expr
+        return ('between', column, _filled(low, values), _filled(high, values))
+    if kind == 'not':
+        return ('not', fill_parameters(expr[1], values))
+    return (kind, fill_parameters(expr[1], values), fill_parameters(expr[2], values))
+
+
+def compile_condition(expr, value_only=False):
+    """
+    компиляция типизированного дерева в функцию запись -> bool
+    замыкания строятся один раз на запрос, при переборе строки не преобразуются
+    value_only - функция принимает значение столбца, а не запись
+    (для условий на один столбец колоночной таблицы)
+    """
+    kind = expr[0]
+    if kind == 'cmp':
+        _, op, column, value = expr
+        compare = _COMPARISONS[op]
+        if op in ('=', '!=', '<>'):
+            if value_only:
+                return lambda current: compare(current, value)
+            return lambda row: compare(row.get(column), value)
+
+        if value_only:
+            return lambda current: current is not None and compare(current, value)
+
+        def ordered(row):
+            current = row.get(column)
+            return current is not None and compare(current, value)
+        return ordered
+    if kind == 'in':
+        _, column, values = expr
+        values = frozenset(values)
+        if value_only:
+            return lambda current: current in values
+        return lambda row: row.get(column) in values
+    if kind == 'between':
+        _, column, low, high = expr
+        if value_only:
+            return lambda current: current is not None and low <= current <= high
+
+        def between(row):
+            current = row.get(column)
+            return current is not None and low <= current <= high
+        return between
+    if kind == 'not':
+        inner = compile_condition(expr[1], value_only)
+        return lambda row: not inner(row)
+
+    left, right = compile_condition(expr[1], value_only), compile_condition(expr[2], value_only)
+    if kind == 'and':
+        return lambda row: left(row) and right(row)
+    return lambda row: left(row) or right(row)
+
+
+def condition_columns(expr):
+    """
+    столбцы, участвующие в условии
+    """
+    kind = expr[0]
+    if kind == 'cmp':
+        return {expr[2]}
+    if kind in ('in', 'between'):
+        return {expr[1]}
+    if kind == 'not':
+        return condition_columns(expr[1])
+    return condition_columns(expr[1]) | condition_columns(expr[2])
+
+
+def rename_columns(expr, resolve):
+    """
+    дерево условия с другими именами столбцов: resolve(столбец) -> новое имя
+    (для ненайденного столбца resolve выбрасывает ValueError)
+    """
+    kind = expr[0]
+    if kind == 'cmp':
+        _, op, column, value = expr
+        return ('cmp', op, resolve(column), value)
+    if kind == 'in':
+        return ('in', resolve(expr[1]), expr[2])
+    if kind == 'between':
+        _, column, low, high = expr
+        return ('between', resolve(column), low, high)
+    if kind == 'not':
+        return ('not', rename_columns(expr[1], resolve))
+    return (kind, rename_columns(expr[1], resolve), rename_columns(expr[2], resolve))
+
+
+def conjuncts(expr):
+    """
+    части условия, соединенные через AND
+    """
+    if expr[0] == 'and':
+        return conjuncts(expr[1]) + conjuncts(expr[2])
+    return [expr]
+
+
+def conjoin(parts):
+    """
+    условие из частей через AND; None, если частей нет
+    """
+    expr = None
+    for part in parts:
+        expr = part if expr is None else ('and', expr, part)
+    return expr
+
+
+def _unique(records):
+    """
+    удаление повторов (по ID) с сохранением порядка
+    """
+    seen = set()
+    for record in records:
+        if record['ID'] not in seen:
+            seen.add(record['ID'])
+            yield record
+
+
+def union_candidates(parts):
+    """
+    объединение наборов кандидатов без повторов (условие OR)
+    """
+    return _unique(record for part in parts for record in part)
+
+
+def _is_point(expr):
+    """
+    условие на точное совпадение (= или IN)
+    """
+    return expr[0] == 'in' or (expr[0] == 'cmp' and expr[1] == '=')
+
+
+def index_candidates(table, expr):
+    """
+    выбор записей-кандидатов по первичному ключу или индексам
+    None - подходящего индекса нет, нужен полный перебор;
+    кандидаты затем все равно проверяются условием
+    """
+    kind = expr[0]
+    if kind == 'cmp':
+        _, op, column, value = expr
+        if op == '=':
+            return table.lookup(column, value)
+        index = table.indexes.get(column)
+        if index is None or index.kind != 'sorted' or op in ('!=', '<>'):
+            return None
+        if op in ('<', '<='):
+            return index.range(high=value, include_high=(op == '<='))
+        return index.range(low=value, include_low=(op == '>='))
+    if kind == 'between':
+        _, column, low, high = expr
+        index = table.indexes.get(column)
+        if index is None or index.kind != 'sorted':
+            return None
+        return index.range(low, high)
+    if kind == 'in':
+        _, column, values = expr
+        if column != 'ID' and column not in table.indexes:
+            return None
+        return _unique(record for value in values for record in table.lookup(column, value))
+    if kind == 'and':
+        # сначала точный поиск, затем диапазон
+        for child in sorted(expr[1:], key=lambda child: not _is_point(child)):
+            candidates = index_candidates(table, child)
+            if candidates is not None:
+                return candidates
+        return None
+    if kind == 'or':
+        left, right = index_candidates(table, expr[1]), index_candidates(table, expr[2])
+        if left is None or right is None:
+            return None
+        return union_candidates((left, right))
+    return None
+
+
+def checked_rows(records, predicate):
+    """
+    записи, удовлетворяющие условию (лениво)
+    в метрики записывается кол-во проверенных записей: при ранней остановке (limit) - только просмотренных
+    """
+    checked = 0
+    try:
+        for checked, record in enumerate(records, 1):
+            if predicate(record):
+                yield record
+    finally:
+        count('rows_scanned', checked)
+
+
+def scan_rows(table, expr, use_parallel=False):
+    """
+    полный перебор: записи таблицы, удовлетворяющие типизированному условию (лениво)
+    use_parallel - перебор бинарной таблицы несколькими процессами
+    в метрики записывается кол-во проверенных записей
+    """
+    if use_parallel:
+        matches = table.parallel_scan(expr)
+        if matches is not None:
+            # процессы проверяют все строки снимка
+            count('rows_scanned', len(table.rows))
+            return matches
+    columns = condition_columns(expr)
+    # колоночная и бинарная таблицы: условие на один столбец проверяется по самому столбцу
+    if len(columns) == 1 and hasattr(table, 'scan_column'):
+        return table.scan_column(columns.pop(), compile_condition(expr, value_only=True))
+    return checked_rows(table.rows, compile_condition(expr))
+
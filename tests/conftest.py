@@ -0,0 +1,42 @@
+import pytest
+
+from src.primitive_db.database import Database
+
+
+@pytest.fixture
+def open_db(tmp_path):
+    """
+    открытие базы во временном каталоге; каждый вызов - новый экземпляр
+    со своим кэшем таблиц, как после перезапуска процесса
+    """
+    def open_db():
+        return Database(str(tmp_path / 'data'), str(tmp_path / 'db_meta.json'))
+    return open_db
+
+
+@pytest.fixture
+def db(open_db):
+    return open_db()
+
+
+@pytest.fixture
+def cli(tmp_path, monkeypatch):
+    """
+    консольные команды (общая база core.db) в пустом временном каталоге
+    """
+    from src.primitive_db import core
+    from src.primitive_db.decorators import settings
+    from src.primitive_db.storage import tables
+
+    monkeypatch.chdir(tmp_path)
+    # run_batch и main меняют общие настройки - после теста они восстанавливаются
+    for key in list(settings):
+        monkeypatch.setitem(settings, key, settings[key])
+    tables.invalidate()
+    tables._metadata = None
+    core.db.query_cache.clear()
+    core.db.condition_cache.clear()
+    core.db.prepared.clear()
+    yield core.db
+    tables.invalidate()
+    tables._metadata = None
@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+import pytest
+
+from src.primitive_db.engine import run_batch
+from src.primitive_db.errors import ColumnNotFoundError, ValidationError
+
+
+@pytest.fixture
+def sales(db):
+    db.create_table('sales', ['city:str', 'amount:int', 'paid:bool'])
+    cities = ['Oslo', 'Rome', 'Kyiv', 'Lima']
+    db.insert_many('sales', [[cities[i % 4], i * 7 % 50, i % 3 == 0] for i in range(200)])
+    return db
+
+
+def _groups(db, where=None):
+    groups = defaultdict(list)
+    for row in db.select('sales', where):
+        groups[row['city']].append(row['amount'])
+    return {city: {'city': city, 'count(*)': len(values), 'sum(amount)': sum(values), 'min(amount)': min(values),
+                   'max(amount)': max(values), 'avg(amount)': sum(values) / len(values)}
+            for city, values in groups.items()}
+
+
+@pytest.mark.parametrize('storage_format', ['json', 'columnar', 'binary'])
+def test_group_by_with_order_and_limit(sales, storage_format):
+    sales.convert_table('sales', storage_format)
+    aggregates = [(None, 'city'), ('count', '*'), ('sum', 'amount'), ('min', 'amount'), ('max', 'amount'), ('avg', 'amount')]
+    expected = _groups(sales, 'paid = true')
+
+    rows = sales.aggregate('sales', aggregates, 'paid = true', group_by='city')
+    assert rows == [expected[city] for city in sorted(expected)]
+
+    by_sum = sorted(expected.values(), key=lambda row: row['sum(amount)'], reverse=True)
+    rows = sales.aggregate('sales', aggregates, 'paid = true', group_by='city', order_by='sum(amount)', descending=True,
+                           limit=2, offset=1)
+    assert rows == by_sum[1:3]
+
+
+def test_aggregates_without_groups(sales):
+    amounts = [row['amount'] for row in sales.select('sales')]
+    assert sales.aggregate('sales', [('count', '*'), ('max', 'ID'), ('sum', 'amount'), ('min', 'amount')]) == [
+        {'count(*)': 200, 'max(ID)': 200, 'sum(amount)': sum(amounts), 'min(amount)': min(amounts)},
+    ]
+    assert sales.aggregate('sales', [('count', '*'), ('avg', 'amount')], 'amount > 1000') == [{'count(*)': 0, 'avg(amount)': None}]
+
+
+def test_aggregate_errors(sales):
+    with pytest.raises(ValidationError):
+        sales.aggregate('sales', [('sum', 'city')])
+    with pytest.raises(ValidationError):
+        sales.aggregate('sales', [(None, 'city'), ('count', '*')])
+    with pytest.raises(ValidationError):
+        sales.aggregate('sales', [('count', '*')], group_by='city', order_by='amount')
+    with pytest.raises(ColumnNotFoundError):
+        sales.aggregate('sales', [('max', 'price')])
+
+
+def test_console_group_by(cli, capsys):
+    assert run_batch([
+        'create_table sales city:str amount:int',
+        'insert into sales values ("Oslo", 10)',
+        'insert into sales values ("Rome", 5)',
+        'insert into sales values ("Oslo", 7)',
+    ]) == 0
+    capsys.readouterr()
+    assert run_batch(['select city, count(*), sum(amount) from sales where amount > 5 group by city order by sum(amount) desc limit 1 '
+                      'format jsonl']) == 0
+    assert [line for line in capsys.readouterr().out.splitlines() if line.startswith('{')] == [
+        '{"city": "Oslo", "count(*)": 2, "sum(amount)": 17}',
+    ]
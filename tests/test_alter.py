@@ -0,0 +1,56 @@
+import pytest
+
+from src.primitive_db import storage
+from src.primitive_db.utils import read_commit_record
+
+
+@pytest.mark.parametrize('storage_format', ['json', 'columnar', 'binary'])
+def test_alter_round_trip(db, open_db, storage_format):
+    db.create_table('users', ['name:str', 'age:int'])
+    db.insert('users', ['Ann', 30])
+    db.insert('users', ['Bob', 40])
+    db.convert_table('users', storage_format)
+
+    db.add_column('users', 'vip:bool', 'true')
+    db.insert('users', ['Eve', 25, False])
+    db.drop_column('users', 'age')
+
+    expected = [
+        {'ID': 1, 'name': 'Ann', 'vip': True},
+        {'ID': 2, 'name': 'Bob', 'vip': True},
+        {'ID': 3, 'name': 'Eve', 'vip': False},
+    ]
+    assert list(db.select('users')) == expected
+
+    db = open_db()
+    assert list(db.select('users')) == expected
+    db.compact('users')
+    assert list(open_db().select('users')) == expected
+
+    # столбец с прежним именем не получает старые значения
+    db = open_db()
+    db.add_column('users', 'age:int')
+    assert [row['age'] for row in open_db().select('users')] == [0, 0, 0]
+
+
+def test_alter_recovered_after_crash(db, open_db, monkeypatch):
+    db.create_table('users', ['name:str'])
+    db.insert('users', ['Ann'])
+
+    # сбой после записи в журнал таблицы, до сохранения метаданных
+    def crash(*args, **kwargs):
+        raise OSError('сбой')
+    monkeypatch.setattr(storage, 'save_metadata', crash)
+    with pytest.raises(OSError):
+        db.add_column('users', 'age:int', '5')
+    monkeypatch.undo()
+    assert read_commit_record(db.tables.data_dir) is not None
+
+    db = open_db()
+    assert db.columns('users') == ['ID', 'name', 'age']
+    assert list(db.select('users')) == [{'ID': 1, 'name': 'Ann', 'age': 5}]
+    assert read_commit_record(db.tables.data_dir) is None
+
+    # запись alter применяется один раз, следующие изменения схемы работают
+    db.drop_column('users', 'age')
+    assert list(open_db().select('users')) == [{'ID': 1, 'name': 'Ann'}]
@@ -0,0 +1,30 @@
+import pytest
+
+from src.primitive_db.engine import run_batch
+from src.primitive_db.main import main
+
+
+def test_successful_script(cli):
+    assert run_batch(['create_table users name:str', 'insert into users values ("Ann")', 'select from users']) == 0
+
+
+def test_database_errors_are_counted(cli):
+    errors = run_batch([
+        'create_table users name:str',
+        'create_table users name:str',
+        'select from nope',
+        'insert into users values (1, 2)',
+        'frobnicate',
+        'drop_table users',
+    ])
+    # повторное создание, несуществующая таблица, лишнее значение, неизвестная команда, удаление без --yes
+    assert errors == 5
+
+
+def test_exit_code(cli, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(['-c', 'select from nope'])
+    assert exit_info.value.code == 1
+    with pytest.raises(SystemExit) as exit_info:
+        main(['-c', 'list_tables'])
+    assert exit_info.value.code == 0
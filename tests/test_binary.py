@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from src.primitive_db import binary
+from src.primitive_db.errors import UnsupportedError
+
+
+def _binary_table(db):
+    db.create_table('users', ['name:str', 'age:int'])
+    db.insert_many('users', [['Ann', 30], ['Bob', 40], ['Eve', 25]])
+    db.convert_table('users', 'binary')
+    return db.tables.load('users')
+
+
+def test_reattach_closes_previous_snapshot(db):
+    table = _binary_table(db)
+    old = table._mm
+    db.insert('users', ['Dan', 35])
+    db.compact('users')
+
+    table = db.tables.load('users')
+    assert old.closed
+    assert not table._mm.closed
+    assert [row['name'] for row in db.select('users')] == ['Ann', 'Bob', 'Eve', 'Dan']
+
+
+def test_string_heap_overflow_is_rejected(db, monkeypatch):
+    _binary_table(db)
+    monkeypatch.setattr(binary, '_MAX_OFFSET', 16)
+    db.insert('users', ['Very long name', 50])
+
+    with pytest.raises(UnsupportedError):
+        db.compact('users')
+    data_dir = db.tables.data_dir
+    assert not any(name.endswith('.tmp') for name in os.listdir(data_dir))
+
+    monkeypatch.undo()
+    assert [row['name'] for row in db.select('users')] == ['Ann', 'Bob', 'Eve', 'Very long name']
@@ -0,0 +1,40 @@
+from src.primitive_db import decorators
+from src.primitive_db.decorators import create_cacher
+
+
+def test_entry_expires_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(decorators.time, 'monotonic', lambda: now[0])
+    cache = create_cacher(ttl=10)
+    cache.put(('users', 'q'), [1])
+    now[0] += 5
+    assert cache.get(('users', 'q')) == [1]
+    now[0] += 6
+    assert cache.get(('users', 'q')) is None
+    assert cache.stats()['expired'] == 1
+
+
+def test_set_ttl_applies_to_stored_entries(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(decorators.time, 'monotonic', lambda: now[0])
+    cache = create_cacher()
+    cache.put(('users', 'q'), [1])
+    now[0] += 3600
+    assert cache.get(('users', 'q')) == [1]
+    cache.set_ttl(60)
+    assert cache.get(('users', 'q')) is None
+
+
+def test_select_cache_ttl(open_db, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(decorators.time, 'monotonic', lambda: now[0])
+    db = open_db()
+    db.query_cache.set_ttl(1)
+    db.create_table('users', ['name:str'])
+    db.insert('users', ['Ann'])
+    list(db.select('users'))
+    list(db.select('users'))
+    now[0] += 2
+    list(db.select('users'))
+    stats = db.query_cache.stats()
+    assert (stats['hits'], stats['expired']) == (1, 1)
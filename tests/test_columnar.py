@@ -0,0 +1,53 @@
+from array import array
+
+import pytest
+
+from src.primitive_db import metrics
+from src.primitive_db.columnar import ColumnarTable, StrColumn
+
+
+@pytest.fixture
+def users(db):
+    db.create_table('users', ['name:str', 'age:int', 'vip:bool'])
+    db.insert_many('users', [[f'n{i % 5}', i, i % 2 == 0] for i in range(1, 301)])
+    return db
+
+
+def test_columns_are_typed_arrays(users):
+    json_bytes = users.tables.load('users').size_bytes()
+    users.convert_table('users', 'columnar')
+    table = users.tables.load('users')
+    assert isinstance(table, ColumnarTable)
+    assert isinstance(table.columns['age'], array)
+    assert isinstance(table.columns['name'], StrColumn)
+    # повторяющиеся строки хранятся один раз
+    assert table.columns['name'].values == ['n1', 'n2', 'n3', 'n4', 'n0']
+    assert table.size_bytes() * 10 < json_bytes
+
+
+def test_changes_survive_restart_and_compaction(users, open_db):
+    expected = list(users.select('users'))
+    users.convert_table('users', 'columnar')
+    users.update('users', {'name': 'new', 'vip': True}, 'age < 3')
+    users.delete('users', 'age > 290')
+    users.insert('users', ['last', 1000, False])
+    expected = [{**row, 'name': 'new', 'vip': True} if row['age'] < 3 else row for row in expected if row['age'] <= 290]
+    expected.append({'ID': 301, 'name': 'last', 'age': 1000, 'vip': False})
+
+    restarted = open_db()
+    assert list(restarted.select('users')) == expected
+    assert restarted.compact('users') == 291
+    assert list(open_db().select('users')) == expected
+    # ID удаленных записей не переиспользуются
+    assert restarted.insert('users', ['next', 1, True]) == 302
+
+
+def test_single_column_scan(users):
+    users.convert_table('users', 'columnar')
+    with metrics.operation('select') as state:
+        rows = list(users.select('users', 'age >= 298'))
+    assert [row['ID'] for row in rows] == [298, 299, 300]
+    assert state['counters']['rows_scanned'] == 300
+    assert users.aggregate('users', [('sum', 'age'), ('count', '*')], 'vip = true') == [
+        {'sum(age)': sum(range(2, 301, 2)), 'count(*)': 150},
+    ]
@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+
+import pytest
+
+from src.primitive_db import storage
+from src.primitive_db.database import Database
+from src.primitive_db.locks import FileLocks
+from src.primitive_db.utils import append_table_log
+
+WORKERS = 4
+ROWS_PER_WORKER = 50
+
+
+def _insert_rows(data_dir, meta_path, worker):
+    db = Database(data_dir, meta_path)
+    for number in range(ROWS_PER_WORKER):
+        db.insert('users', [f'w{worker}-{number}'])
+
+
+def test_concurrent_inserts_from_processes(tmp_path, open_db):
+    db = open_db()
+    db.create_table('users', ['name:str'])
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=_insert_rows, args=(db.tables.data_dir, db.tables.meta_path, worker))
+                 for worker in range(WORKERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    rows = list(open_db().select('users'))
+    assert [row['ID'] for row in rows] == list(range(1, WORKERS * ROWS_PER_WORKER + 1))
+    assert len({row['name'] for row in rows}) == WORKERS * ROWS_PER_WORKER
+
+
+def test_write_between_read_and_cache_is_not_hidden(db, monkeypatch):
+    db.create_table('users', ['name:str'])
+    db.insert('users', ['Ann'])
+    db.tables.invalidate()
+
+    class RacingTable(storage.Table):
+        def __init__(self, *args, **kwargs):
+            # запись другого процесса после чтения файлов, но до помещения таблицы в кэш
+            append_table_log('users', [{'op': 'insert', 'row': {'ID': 2, 'name': 'Bob'}}], db.tables.data_dir)
+            monkeypatch.setattr(storage, 'Table', storage_table)
+            super().__init__(*args, **kwargs)
+
+    storage_table = storage.Table
+    monkeypatch.setattr(storage, 'Table', RacingTable)
+    assert [row['name'] for row in db.select('users')] == ['Ann']
+    assert [row['name'] for row in db.select('users')] == ['Ann', 'Bob']
+
+
+def test_shared_lock_is_not_upgraded(tmp_path):
+    locks = FileLocks()
+    path = str(tmp_path / 'users.lock')
+    with locks.shared(path):
+        with pytest.raises(RuntimeError):
+            locks.acquire(path, exclusive=True)
+    with locks.exclusive(path), locks.shared(path):
+        pass
+
+
+def test_drop_table_removes_lock_file(db):
+    db.create_table('users', ['name:str'])
+    db.insert('users', ['Ann'])
+    lock_path = os.path.join(db.tables.data_dir, 'users.lock')
+    assert os.path.exists(lock_path)
+    db.drop_table('users')
+    assert os.listdir(db.tables.data_dir) == []
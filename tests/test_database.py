@@ -0,0 +1,51 @@
+import pytest
+
+from src.primitive_db.errors import (
+    ColumnNotFoundError,
+    DatabaseError,
+    TableExistsError,
+    TableNotFoundError,
+    ValidationError,
+)
+
+
+def test_api_returns_values_without_printing(db, capsys):
+    assert db.create_table('users', ['name:str', ('age', 'int')]) == ['ID:int', 'name:str', 'age:int']
+    assert db.insert('users', ['Ann', '30']) == 1
+    assert db.insert('users', {'name': 'Bob', 'age': 40}) == 2
+    assert db.insert_many('users', [['Eve', 25]]) == 1
+    assert db.list_tables() == ['users']
+
+    rows = db.select('users', 'age > 26')
+    assert next(rows) == {'ID': 1, 'name': 'Ann', 'age': 30}
+    assert list(db.select('users', as_tuples=True)) == [(1, 'Ann', 30), (2, 'Bob', 40), (3, 'Eve', 25)]
+    assert db.update('users', {'age': 41}, 'name = Bob') == [2]
+    assert db.delete('users', 'age < 30') == [3]
+    assert db.count('users') == 2
+    assert capsys.readouterr().out == ''
+
+
+def test_typed_errors_leave_state_intact(db):
+    db.create_table('users', ['name:str', 'age:int'])
+    db.insert('users', ['Ann', 30])
+
+    with pytest.raises(TableExistsError):
+        db.create_table('users', ['name:str'])
+    with pytest.raises(TableNotFoundError):
+        list(db.select('missing'))
+    with pytest.raises(ColumnNotFoundError):
+        db.update('users', {'city': 'Oslo'})
+    with pytest.raises(ValidationError):
+        list(db.select('users', 'city = Oslo'))
+    with pytest.raises(ValidationError):
+        db.insert('users', ['Bob', 'forty'])
+    with pytest.raises(ValidationError):
+        db.insert('users', ['Bob'])
+    with pytest.raises(ValidationError):
+        db.create_table('bad', ['name:float'])
+    # все ошибки базы наследуют DatabaseError, ошибки проверки - еще и ValueError
+    assert issubclass(ValidationError, (DatabaseError, ValueError))
+
+    assert db.list_tables() == ['users']
+    assert list(db.select('users')) == [{'ID': 1, 'name': 'Ann', 'age': 30}]
+    assert db.insert('users', ['Bob', 40]) == 2
@@ -0,0 +1,35 @@
+import pytest
+
+
+@pytest.mark.parametrize('storage_format', ['json', 'columnar', 'binary'])
+def test_ids_are_not_reused(db, open_db, storage_format):
+    db.create_table('users', ['name:str'])
+    db.convert_table('users', storage_format)
+    for name in ('Ann', 'Bob', 'Eve'):
+        db.insert('users', [name])
+
+    # удаление последней записи: ее ID не выдается повторно
+    db.delete('users', 'ID = 3')
+    db.insert('users', ['Dan'])
+    db.delete('users', 'ID = 4')
+    db.compact('users')
+
+    db = open_db()
+    db.insert('users', ['Kim'])
+    db.delete('users')
+    db.compact('users')
+
+    db = open_db()
+    db.insert('users', ['Lee'])
+    db.insert_many('users', [['Max'], ['Ned']])
+    assert [(row['ID'], row['name']) for row in open_db().select('users')] == [(6, 'Lee'), (7, 'Max'), (8, 'Ned')]
+
+
+def test_id_lookup(db):
+    db.create_table('users', ['name:str'])
+    db.insert_many('users', [[f'user{i}'] for i in range(1, 101)])
+    db.delete('users', 'ID = 50')
+
+    assert list(db.select('users', 'ID = 42')) == [{'ID': 42, 'name': 'user42'}]
+    assert list(db.select('users', 'ID = 50')) == []
+    assert db.explain('users', 'ID = 42')['access'] == 'id_lookup'
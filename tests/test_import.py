@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from src.primitive_db.engine import run_batch
+from src.primitive_db.errors import ValidationError
+from src.primitive_db.utils import _table_path
+
+
+def _log_lines(db, table_name):
+    try:
+        with open(_table_path(table_name, db.tables.data_dir, 'log'), encoding='utf-8') as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        return []
+
+
+def test_insert_many_writes_one_log_entry_per_batch(db, open_db):
+    db.create_table('users', ['name:str', 'age:int', 'vip:bool'])
+    before = len(_log_lines(db, 'users'))
+    rows = [[f'user{i}', str(i), i % 2 == 0] for i in range(10)] + [{'name': 'last', 'age': 99, 'vip': 'yes'}]
+    assert db.insert_many('users', rows, batch_size=4) == 11
+    assert len(_log_lines(db, 'users')) - before == 3
+
+    rows = list(open_db().select('users'))
+    assert [row['ID'] for row in rows] == list(range(1, 12))
+    assert rows[-1] == {'ID': 11, 'name': 'last', 'age': 99, 'vip': True}
+
+
+def test_bad_row_keeps_earlier_batches(db):
+    db.create_table('users', ['name:str', 'age:int'])
+    rows = [['a', 1], ['b', 2], ['c', 3], ['d', 'x'], ['e', 5]]
+    with pytest.raises(ValidationError, match='строка 4.*Добавлено записей: 2'):
+        db.insert_many('users', rows, batch_size=2)
+    assert [row['name'] for row in db.select('users')] == ['a', 'b']
+
+
+def test_import_csv_and_jsonl(db, tmp_path):
+    db.create_table('users', ['name:str', 'age:int'])
+    csv_path = tmp_path / 'users.csv'
+    csv_path.write_text('age,name\n30,"Lee, Ann"\n40,Bob\n', encoding='utf-8')
+    jsonl_path = tmp_path / 'users.jsonl'
+    jsonl_path.write_text('\n'.join(json.dumps(row) for row in [{'name': 'Eve', 'age': 25}, {'name': 'Dan', 'age': '35'}]) + '\n',
+                          encoding='utf-8')
+
+    assert db.import_file('users', str(csv_path)) == 2
+    assert db.import_file('users', str(jsonl_path), batch_size=1) == 2
+    assert [(row['name'], row['age']) for row in db.select('users')] == [('Lee, Ann', 30), ('Bob', 40), ('Eve', 25), ('Dan', 35)]
+
+    with pytest.raises(ValueError):
+        db.import_file('users', str(tmp_path / 'users.txt'))
+
+
+def test_console_import(cli, tmp_path, capsys):
+    (tmp_path / 'users.csv').write_text('name\nAnn\nBob\n', encoding='utf-8')
+    assert run_batch(['create_table users name:str', 'import users users.csv --batch 1']) == 0
+    assert run_batch(['import users missing.csv', 'import users users.csv --batch']) == 2
+    capsys.readouterr()
+    assert run_batch(['select count(*) from users format jsonl']) == 0
+    assert '{"count(*)": 2}' in capsys.readouterr().out
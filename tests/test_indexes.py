@@ -0,0 +1,53 @@
+import pytest
+
+from src.primitive_db.errors import IndexExistsError, IndexNotFoundError, UnsupportedError
+
+
+@pytest.fixture
+def people(db):
+    db.create_table('people', ['name:str', 'age:int'])
+    db.insert_many('people', [[f'n{i % 10}', i] for i in range(100)])
+    return db
+
+
+def _ids(db, where):
+    # поиск по индексу возвращает записи в порядке индекса, а не ID
+    return sorted(row['ID'] for row in db.select('people', where))
+
+
+@pytest.mark.parametrize('kind', ['hash', 'sorted'])
+def test_index_results_match_scan(people, kind):
+    conditions = ['name = n3', 'name IN (n1, n2)', 'age >= 90', 'age BETWEEN 10 AND 12', 'name = n3 OR age < 5']
+    expected = {where: _ids(people, where) for where in conditions}
+    people.create_index('people', 'name', kind)
+    people.create_index('people', 'age', kind)
+    people.analyze('people')
+    for where in conditions:
+        assert _ids(people, where) == expected[where]
+
+    # индекс обновляется при изменении и удалении записей
+    people.update('people', {'name': 'n3'}, 'ID = 1')
+    people.delete('people', 'ID = 4')
+    assert _ids(people, 'name = n3') == [1] + [record_id for record_id in expected['name = n3'] if record_id != 4]
+
+
+def test_drop_index_clears_cached_plans(people):
+    people.create_index('people', 'age', 'sorted')
+    people.analyze('people')
+    assert list(people.select('people', 'age >= 98')) == [{'ID': 99, 'name': 'n8', 'age': 98}, {'ID': 100, 'name': 'n9', 'age': 99}]
+    assert people.query_cache.stats()['entries'] == 1
+
+    people.drop_index('people', 'age')
+    assert people.query_cache.stats()['entries'] == 0
+    assert people.explain('people', 'age >= 98')['access'] == 'full_scan'
+    assert len(list(people.select('people', 'age >= 98'))) == 2
+
+
+def test_index_errors(people):
+    people.create_index('people', 'age')
+    with pytest.raises(IndexExistsError):
+        people.create_index('people', 'age')
+    with pytest.raises(IndexNotFoundError):
+        people.drop_index('people', 'name')
+    with pytest.raises(UnsupportedError):
+        people.convert_table('people', 'columnar')
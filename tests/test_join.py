@@ -0,0 +1,45 @@
+import pytest
+
+
+@pytest.fixture
+def shop(db):
+    db.create_table('users', ['name:str', 'city:str'])
+    db.create_table('orders', ['user_id:int', 'amount:int'])
+    db.insert_many('users', [['Ann', 'Oslo'], ['Bob', 'Rome'], ['Eve', 'Oslo']])
+    db.insert_many('orders', [[1, 10], [2, 20], [1, 30], [3, 40], [9, 50], [2, 60]])
+    return db
+
+
+def _expected(db, where=None):
+    users = {row['ID']: row for row in db.select('users')}
+    rows = []
+    for order in db.select('orders'):
+        user = users.get(order['user_id'])
+        if user is not None and (where is None or where(user, order)):
+            rows.append((user['name'], order['amount']))
+    return sorted(rows)
+
+
+def _pairs(rows):
+    return [(row['users.name'], row['orders.amount']) for row in rows]
+
+
+@pytest.mark.parametrize('index', [False, True])
+def test_join_matches_nested_loop(shop, index):
+    if index:
+        shop.create_index('orders', 'user_id')
+    rows = shop.join('users', 'orders', 'ID', 'user_id')
+    assert sorted(_pairs(rows)) == _expected(shop)
+
+    rows = shop.join('users', 'orders', 'ID', 'user_id', where='city = Oslo AND amount > 10')
+    assert sorted(_pairs(rows)) == _expected(shop, lambda user, order: user['city'] == 'Oslo' and order['amount'] > 10)
+
+
+def test_join_order_by_with_limit(shop):
+    rows = shop.join('users', 'orders', 'ID', 'user_id', order_by='amount', descending=True, limit=2, offset=1)
+    # заказ пользователя 9 без пары в users в результат не попадает
+    assert _pairs(rows) == [('Eve', 40), ('Ann', 30)]
+
+    rows = list(shop.join('users', 'orders', 'ID', 'user_id', limit=3))
+    assert len(rows) == 3
+    assert set(_pairs(rows)) <= set(_expected(shop))
@@ -0,0 +1,35 @@
+from src.primitive_db.utils import _table_path
+
+
+def _names(db, table_name):
+    return [row['name'] for row in db.select(table_name)]
+
+
+def test_log_replay_after_restart(db, open_db):
+    db.create_table('users', ['name:str', 'age:int'])
+    db.insert('users', ['Ann', 30])
+    db.insert('users', ['Bob', 40])
+    db.update('users', {'age': 41}, 'name = Bob')
+    db.delete('users', 'name = Ann')
+
+    rows = list(open_db().select('users'))
+    assert rows == [{'ID': 2, 'name': 'Bob', 'age': 41}]
+
+
+def test_torn_tail_is_truncated_before_append(db, open_db):
+    db.create_table('users', ['name:str', 'age:int'])
+    db.insert('users', ['Ann', 30])
+    db.insert('users', ['Bob', 40])
+    log_path = _table_path('users', db.tables.data_dir, 'log')
+    # сбой посреди дозаписи: последняя строка оборвана
+    with open(log_path, 'a', encoding='utf-8') as f:
+        f.write('{"op": "insert", "row": {"ID": 3, "na')
+
+    db = open_db()
+    assert _names(db, 'users') == ['Ann', 'Bob']
+    db.insert('users', ['Eve', 25])
+    db.insert('users', ['Dan', 35])
+
+    assert _names(open_db(), 'users') == ['Ann', 'Bob', 'Eve', 'Dan']
+    with open(log_path, encoding='utf-8') as f:
+        assert f.read().endswith('\n')
@@ -0,0 +1,35 @@
+import pytest
+
+from src.primitive_db import storage
+from src.primitive_db.errors import IndexExistsError
+
+
+def test_failed_save_keeps_metadata_in_memory(db, monkeypatch):
+    db.create_table('users', ['name:str'])
+
+    def failing_save(*args, **kwargs):
+        raise OSError('диск заполнен')
+    monkeypatch.setattr(storage, 'save_metadata', failing_save)
+    with pytest.raises(OSError):
+        db.create_table('orders', ['item:str'])
+    with pytest.raises(OSError):
+        db.create_index('users', 'name')
+
+    assert db.list_tables() == ['users']
+    assert db.tables.metadata()['users'] == {'columns': ['ID:int', 'name:str']}
+
+
+def test_failed_validation_keeps_metadata_in_memory(db):
+    db.create_table('users', ['name:str'])
+    db.create_index('users', 'name')
+    with pytest.raises(IndexExistsError):
+        db.create_index('users', 'name', 'sorted')
+    assert db.tables.metadata()['users']['indexes'] == {'name': 'hash'}
+
+
+def test_legacy_metadata_format(tmp_path, open_db):
+    (tmp_path / 'db_meta.json').write_text('{"users": ["ID:int", "name:str"]}', encoding='utf-8')
+    db = open_db()
+    assert db.columns('users') == ['ID', 'name']
+    db.insert('users', ['Ann'])
+    assert list(db.select('users')) == [{'ID': 1, 'name': 'Ann'}]
@@ -0,0 +1,80 @@
+import json
+import pstats
+
+import pytest
+
+from src.primitive_db import metrics, parallel
+from src.primitive_db.engine import run_batch
+from src.primitive_db.main import main
+from src.primitive_db.metrics import Histogram
+
+
+@pytest.fixture
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_quantiles_stay_within_observed_values():
+    histogram = Histogram()
+    histogram.observe(0.0173)
+    assert histogram.quantile(0.5) == histogram.quantile(0.99) == 0.0173
+
+    for value in (0.0012, 0.0031, 0.0048, 20.0):
+        histogram.observe(value)
+    assert histogram.min == 0.0012 and histogram.max == 20.0
+    for q in (0.01, 0.5, 0.99):
+        assert histogram.min <= histogram.quantile(q) <= histogram.max
+
+
+def test_empty_histogram():
+    histogram = Histogram()
+    assert histogram.quantile(0.5) is None
+    assert histogram.to_dict()['min'] is None
+
+
+def test_command_metrics_and_export(cli, clean_metrics, tmp_path, capsys):
+    assert run_batch([
+        'create_table users name:str',
+        'insert into users values ("Ann")',
+        'insert into users values ("Bob")',
+        'select from users where name = Bob',
+    ]) == 0
+    summary = metrics.operations_summary()
+    assert summary['insert']['count'] == 2
+    assert summary['select']['counters']['rows_scanned'] == 2
+    assert summary['select']['counters']['rows_returned'] == 1
+    assert {'parse', 'load', 'filter', 'render'} <= set(summary['select']['phases_ms'])
+    assert 'persist' in summary['insert']['phases_ms']
+
+    assert run_batch(['stats export metrics.json', 'stats export metrics.prom prometheus', 'stats export metrics.xml xml']) == 1
+    snapshot = json.loads((tmp_path / 'metrics.json').read_text(encoding='utf-8'))
+    assert {'labels': {'op': 'select'}, 'value': 1} in snapshot['counters']['rows_returned']
+    prometheus = (tmp_path / 'metrics.prom').read_text(encoding='utf-8')
+    assert '# TYPE primitive_db_operation_seconds histogram' in prometheus
+    assert 'primitive_db_operation_seconds_bucket{op="insert",le="+Inf"} 2' in prometheus
+    assert 'primitive_db_rows_returned_total{op="select"} 1' in prometheus
+
+    assert run_batch(['stats reset']) == 0
+    capsys.readouterr()
+    assert run_batch(['stats']) == 0
+    # сброс учитывает только саму команду stats reset
+    assert 'select' not in capsys.readouterr().out
+
+
+def test_api_calls_are_counted_separately(db, clean_metrics):
+    db.create_table('users', ['name:str'])
+    db.insert('users', ['Ann'])
+    list(db.select('users', 'name = Ann'))
+    assert metrics.operations_summary()[metrics.API_OPERATION]['counters']['rows_scanned'] == 1
+
+
+def test_profile_writes_pstats_file(cli, tmp_path, monkeypatch):
+    monkeypatch.setattr(parallel, 'settings', dict(parallel.settings))
+    profile_path = tmp_path / 'run.prof'
+    with pytest.raises(SystemExit) as exit_info:
+        main(['--profile', str(profile_path), '-c', 'create_table users name:str', '-c', 'select from users'])
+    assert exit_info.value.code == 0
+    stats = pstats.Stats(str(profile_path))
+    assert any(function == 'run_batch' for _, _, function in stats.stats)
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from src.primitive_db.sort import sort_key, sorted_rows, top_rows
+
+
+def _expected(rows, descending=False):
+    # сортировка устойчивая: строки с равным возрастом - в порядке ID
+    return sorted(rows, key=lambda row: row['age'], reverse=descending)
+
+
+@pytest.fixture
+def people(db):
+    rng = random.Random(7)
+    db.create_table('people', ['name:str', 'age:int'])
+    db.insert_many('people', [[f'n{i}', rng.randrange(20)] for i in range(200)])
+    return db
+
+
+@pytest.mark.parametrize('storage_format', ['json', 'columnar', 'binary'])
+@pytest.mark.parametrize('descending', [False, True])
+def test_order_by_with_limit(people, storage_format, descending):
+    people.convert_table('people', storage_format)
+    rows = list(people.select('people'))
+    expected = _expected(rows, descending)
+
+    assert list(people.select('people', order_by='age', descending=descending, limit=10, offset=5)) == expected[5:15]
+    assert list(people.select('people', order_by='age', descending=descending)) == expected
+    filtered = [row for row in expected if row['age'] > 10]
+    assert list(people.select('people', 'age > 10', order_by='age', descending=descending, limit=7)) == filtered[:7]
+
+
+def test_order_by_sorted_index(people):
+    expected = _expected(list(people.select('people')))
+    people.create_index('people', 'age', 'sorted')
+
+    assert list(people.select('people', order_by='age', limit=10, offset=3)) == expected[3:13]
+    assert list(people.select('people', 'name != n0', order_by='age', limit=10)) == [row for row in expected if row['name'] != 'n0'][:10]
+
+
+def test_external_sort_matches_in_memory_sort():
+    rng = random.Random(3)
+    rows = [(i, rng.choice([None, *range(10)])) for i in range(100)]
+    key = sort_key(1)
+    for descending in (False, True):
+        expected = sorted(rows, key=key, reverse=descending)
+        # части по 7 строк: сортировка со сбросом частей во временные файлы и слиянием
+        assert list(sorted_rows(iter(rows), key, descending, run_rows=7)) == expected
+        assert top_rows(iter(rows), key, 10, descending) == expected[:10]
@@ -0,0 +1,68 @@
+import pytest
+
+from src.primitive_db import binary, parallel, planner
+
+
+@pytest.fixture
+def users(db):
+    db.create_table('users', ['name:str', 'age:int', 'vip:bool'])
+    db.insert_many('users', [[f'n{i % 7}', i % 90, i % 3 == 0] for i in range(1, 401)])
+    db.convert_table('users', 'binary')
+    yield db
+    parallel.shutdown()
+
+
+def _enable(monkeypatch):
+    """
+    параллельный перебор для маленьких таблиц; возвращает список вызовов пула
+    """
+    monkeypatch.setitem(parallel.settings, 'workers', 2)
+    monkeypatch.setitem(parallel.settings, 'min_rows', 100)
+    monkeypatch.setattr(planner, 'PARALLEL_START_COST', 0)
+    calls = []
+    parallel_map = parallel.map_ordered
+
+    def map_ordered(func, tasks):
+        calls.append(func.__name__)
+        return parallel_map(func, tasks)
+
+    monkeypatch.setattr(parallel, 'map_ordered', map_ordered)
+    monkeypatch.setattr(binary, 'map_ordered', map_ordered)
+    return calls
+
+
+def test_split_range(monkeypatch):
+    monkeypatch.setitem(parallel.settings, 'workers', 2)
+    monkeypatch.setitem(parallel.settings, 'min_rows', 100)
+    assert parallel.split_range(20) == [(0, 3), (3, 6), (6, 9), (9, 12), (12, 15), (15, 18), (18, 20)]
+    assert parallel.enabled(100) and not parallel.enabled(99)
+    monkeypatch.setitem(parallel.settings, 'workers', 1)
+    assert not parallel.enabled(10 ** 9)
+
+
+def test_parallel_results_match_serial(users, monkeypatch):
+    # изменения после снимка проверяются в текущем процессе
+    users.update('users', {'age': 89}, 'ID = 5')
+    users.delete('users', 'ID = 6')
+    users.insert('users', ['late', 89, True])
+    conditions = ['age > 80', 'name = n3 AND vip = true', 'age = 89 OR name = late']
+    aggregates = [(None, 'name'), ('count', '*'), ('sum', 'age'), ('max', 'age')]
+    serial = {where: list(users.select('users', where)) for where in conditions}
+    serial_groups = users.aggregate('users', aggregates, 'vip = true', group_by='name')
+
+    calls = _enable(monkeypatch)
+    users.query_cache.clear()
+    for where in conditions:
+        assert users.explain('users', where)['access'] == 'parallel_scan'
+        assert list(users.select('users', where)) == serial[where]
+    assert users.aggregate('users', aggregates, 'vip = true', group_by='name') == serial_groups
+    # explain тоже выполняет запрос
+    assert calls == ['scan_chunk'] * 2 * len(conditions) + ['_aggregate_chunk']
+
+
+def test_small_tables_stay_serial(users, monkeypatch):
+    calls = _enable(monkeypatch)
+    monkeypatch.setitem(parallel.settings, 'min_rows', 1000)
+    assert users.explain('users', 'age > 80')['access'] == 'full_scan'
+    assert len(list(users.select('users', 'age > 80'))) == 36
+    assert calls == []
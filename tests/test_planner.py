@@ -0,0 +1,70 @@
+import pytest
+
+from src.primitive_db import metrics, planner
+from src.primitive_db.where import compile_condition
+
+
+def _people(db, rows=100):
+    db.create_table('people', ['name:str', 'age:int'])
+    db.insert_many('people', [[f'n{i % 2}', i] for i in range(1, rows + 1)])
+
+
+def test_union_executes_the_costed_child_paths(db, monkeypatch):
+    _people(db)
+    db.create_index('people', 'name')
+    db.create_index('people', 'age', 'sorted')
+    db.analyze('people')
+    where = '(name = n1 AND age >= 95) OR ID = 3'
+
+    table = db.tables.load('people')
+    expr = db._condition('people', where)
+    plan = db._plan(table, 'people', expr)
+    chosen = plan['chosen']
+    assert chosen['access'] == planner.INDEX_UNION
+    # диапазон по age выбран по стоимости, хотя в условии есть точный поиск по name
+    assert [child['access'] for child in chosen['children']] == [planner.INDEX_RANGE, planner.ID_LOOKUP]
+
+    probed = []
+    index_candidates = planner.index_candidates
+
+    def spy(table, node):
+        probed.append(node)
+        return index_candidates(table, node)
+    monkeypatch.setattr(planner, 'index_candidates', spy)
+
+    with metrics.operation('select') as state:
+        records = list(planner.execute(table, plan))
+    assert probed == [child['node'] for child in chosen['children']]
+    assert state['counters']['rows_scanned'] == 7
+    records.sort(key=lambda record: record['ID'])
+    assert records == [record for record in table.rows if compile_condition(expr)(record)]
+    assert [record['ID'] for record in records] == [3, 95, 97, 99]
+
+
+@pytest.mark.parametrize('storage_format', ['json', 'columnar', 'binary'])
+def test_scan_with_limit_counts_visited_rows(db, storage_format):
+    _people(db)
+    db.convert_table('people', storage_format)
+
+    with metrics.operation('select') as state:
+        rows = list(db.select('people', 'age > 10', limit=5))
+    assert [row['age'] for row in rows] == [11, 12, 13, 14, 15]
+    assert state['counters']['rows_scanned'] == 15
+
+    with metrics.operation('select') as state:
+        assert len(list(db.select('people', 'name = n0 AND age > 0', limit=3))) == 3
+    assert state['counters']['rows_scanned'] == 6
+
+
+def test_explain_matches_execution(db):
+    _people(db)
+    db.create_index('people', 'age', 'sorted')
+    db.analyze('people')
+
+    plan = db.explain('people', 'age BETWEEN 10 AND 19 OR ID = 50')
+    assert plan['access'] == planner.INDEX_UNION
+    assert plan['actual_rows'] == len(list(db.select('people', 'age BETWEEN 10 AND 19 OR ID = 50'))) == 11
+
+    plan = db.explain('people', 'age > 0', limit=5)
+    assert plan['access'] == planner.FULL_SCAN and plan['early_stop']
+    assert plan['actual_rows'] == 5
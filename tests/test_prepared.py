@@ -0,0 +1,72 @@
+import pytest
+
+from src.primitive_db.engine import run_batch
+from src.primitive_db.errors import StatementNotFoundError, ValidationError
+
+
+@pytest.fixture
+def people(db):
+    db.create_table('people', ['name:str', 'age:int', 'vip:bool'])
+    db.insert_many('people', [['Ann', 30, True], ['Bob', 40, False], ['Eve', 25, True], ['Dan', 35, False]])
+    return db
+
+
+def test_parameters_are_bound_per_execution(people):
+    statement = people.prepare('by_age', 'people', 'age > ? AND vip = ?', order_by='age')
+    assert statement['params'] == [{'column': 'age', 'type': 'int'}, {'column': 'vip', 'type': 'bool'}]
+
+    # строки приводятся к типам столбцов, как в insert
+    assert [row['name'] for row in people.execute('by_age', ('26', 'true'))] == ['Ann']
+    assert [row['name'] for row in people.execute('by_age', (20, False))] == ['Dan', 'Bob']
+    assert list(people.execute('by_age', (100, True))) == []
+
+
+def test_quoted_question_mark_is_a_value(people):
+    people.insert('people', ['?', 1, False])
+    statement = people.prepare('literal', 'people', 'name = "?" OR name = ?')
+    assert len(statement['params']) == 1
+    assert [row['age'] for row in people.execute('literal', ('Eve',))] == [25, 1]
+
+
+def test_parameter_count_and_type_errors(people):
+    people.prepare('by_age', 'people', 'age BETWEEN ? AND ?')
+    with pytest.raises(ValidationError, match='Ожидается параметров: 2, получено 1'):
+        people.execute('by_age', (1,))
+    with pytest.raises(ValidationError, match='параметр 2'):
+        people.execute('by_age', (1, 'abc'))
+    with pytest.raises(StatementNotFoundError):
+        people.execute('missing')
+
+    people.deallocate('by_age')
+    with pytest.raises(StatementNotFoundError):
+        people.execute('by_age', (1, 2))
+
+
+def test_aggregate_statement_and_schema_change(people):
+    people.prepare('totals', 'people', 'age >= ?', aggregates=[(None, 'vip'), ('count', '*'), ('sum', 'age')], group_by='vip',
+                   order_by='sum(age)', descending=True)
+    assert people.execute('totals', (30,)) == [
+        {'vip': False, 'count(*)': 2, 'sum(age)': 75},
+        {'vip': True, 'count(*)': 1, 'sum(age)': 30},
+    ]
+
+    # после изменения схемы запрос подготавливается заново
+    people.prepare('by_name', 'people', 'name = ?')
+    people.add_column('people', 'city:str', 'Oslo')
+    assert list(people.execute('by_name', ('Ann',))) == [{'ID': 1, 'name': 'Ann', 'age': 30, 'vip': True, 'city': 'Oslo'}]
+
+
+def test_console_prepare_and_execute(cli, capsys):
+    assert run_batch([
+        'create_table people name:str age:int',
+        'insert into people values ("Ann Lee", 30)',
+        'insert into people values ("Bob", 40)',
+        'prepare by_name as select from people where name = ? or age > ? format jsonl',
+    ]) == 0
+    capsys.readouterr()
+    assert run_batch(['execute by_name ("Ann Lee", 35)']) == 0
+    assert [line for line in capsys.readouterr().out.splitlines() if line.startswith('{')] == [
+        '{"ID": 1, "name": "Ann Lee", "age": 30}',
+        '{"ID": 2, "name": "Bob", "age": 40}',
+    ]
+    assert run_batch(['execute by_name ("Ann Lee")', 'execute nope', 'deallocate by_name', 'execute by_name (1, 2)']) == 3
@@ -0,0 +1,46 @@
+import pytest
+
+from src.primitive_db import core
+from src.primitive_db.engine import run_batch
+from src.primitive_db.errors import ValidationError
+
+
+@pytest.fixture
+def people(db):
+    db.create_table('people', ['name:str', 'age:int'])
+    db.insert_many('people', [[f'user{i}', i] for i in range(1, 251)])
+    return db
+
+
+@pytest.mark.parametrize('storage_format', ['json', 'columnar', 'binary'])
+def test_limit_and_offset(people, storage_format):
+    people.convert_table('people', storage_format)
+    assert [row['ID'] for row in people.select('people', limit=3, offset=10)] == [11, 12, 13]
+    assert [row['ID'] for row in people.select('people', 'age > 200', limit=2, offset=45)] == [246, 247]
+    assert list(people.select('people', limit=5, offset=1000)) == []
+    assert list(people.select('people', 'age < 3', as_tuples=True)) == [(1, 'user1', 1), (2, 'user2', 2)]
+    with pytest.raises(ValidationError):
+        people.select('people', limit=-1)
+
+
+def test_select_is_lazy(people):
+    rows = people.select('people')
+    assert next(rows) == {'ID': 1, 'name': 'user1', 'age': 1}
+    # записи читаются по мере перебора, а не все сразу
+    assert len(list(rows)) == 249
+
+
+def test_output_is_paged(cli, capsys, monkeypatch):
+    monkeypatch.setattr(core, 'PAGE_SIZE', 2)
+    assert run_batch(['create_table people name:str', *[f'insert into people values ("user {i}")' for i in range(1, 6)]]) == 0
+    capsys.readouterr()
+
+    assert run_batch(['select from people where ID > 1 limit 3 format tsv']) == 0
+    # заголовок выводится один раз, строки - страницами
+    assert capsys.readouterr().out.splitlines() == ['ID\tname', '2\tuser 2', '3\tuser 3', '4\tuser 4']
+
+    assert run_batch(['select from people offset 4 format jsonl']) == 0
+    assert capsys.readouterr().out.splitlines() == ['{"ID": 5, "name": "user 5"}']
+
+    assert run_batch(['select from people where ID > 10', 'select from people format xml', 'select from people limit x']) == 2
+    assert 'Записи не найдены.' in capsys.readouterr().out
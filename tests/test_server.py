@@ -0,0 +1,65 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from src.primitive_db.client import Client, ServerError
+from src.primitive_db.decorators import settings
+from src.primitive_db.server import Server
+
+
+@pytest.fixture
+def socket_path(cli, tmp_path, monkeypatch):
+    """
+    сервер на unix-сокете в отдельном потоке (общая база core.db во временном каталоге)
+    """
+    monkeypatch.setitem(settings, 'log_time', False)
+    path = str(tmp_path / 'db.sock')
+    loop = asyncio.new_event_loop()
+    listener = loop.run_until_complete(asyncio.start_unix_server(Server().handle, path=path))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield path
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    listener.close()
+    loop.run_until_complete(listener.wait_closed())
+    loop.close()
+
+
+def _jsonl(output):
+    return [json.loads(line) for line in output.splitlines()]
+
+
+def test_execute_and_pipeline(socket_path):
+    with Client(socket_path=socket_path, pool_size=2) as db:
+        assert 'успешно создана' in db.execute('create_table users name:str age:int')
+        outputs = db.pipeline([f'insert into users values ("user{i}", {i})' for i in range(1, 51)])
+        assert len(outputs) == 50 and all('успешно добавлена' in output for output in outputs)
+
+        assert _jsonl(db.execute('select from users where age > 48 format jsonl')) == [
+            {'ID': 49, 'name': 'user49', 'age': 49},
+            {'ID': 50, 'name': 'user50', 'age': 50},
+        ]
+        # транзакция целиком в одной пачке
+        db.pipeline(['begin', 'update users set age = 0 where ID = 1', 'rollback'])
+        assert _jsonl(db.execute('select from users where ID = 1 format jsonl')) == [{'ID': 1, 'name': 'user1', 'age': 1}]
+
+
+def test_error_replies(socket_path):
+    with Client(socket_path=socket_path) as db:
+        with pytest.raises(ServerError, match='nope'):
+            db.execute('select from nope')
+        with pytest.raises(ServerError):
+            db.execute('frobnicate')
+        db.execute('create_table users name:str')
+        # удаление без подтверждения отменяется
+        with pytest.raises(ServerError):
+            db.execute('drop_table users', yes=False)
+        with pytest.raises(ServerError):
+            db.pipeline(['list_tables', 'insert into users values (1, 2)'])
+        # после ошибок соединения остаются рабочими
+        assert 'users' in db.execute('list_tables')
+        db.execute('drop_table users', yes=True)
+        assert 'users' not in db.execute('list_tables')
@@ -0,0 +1,42 @@
+import pytest
+
+from src.primitive_db.database import Database
+from src.primitive_db.main import main
+from src.primitive_db.storage import TABLE_CACHE_BYTES
+
+
+def _tables(db, names):
+    for name in names:
+        db.create_table(name, ['name:str', 'age:int'])
+        db.insert_many(name, [[f'user{i}', i] for i in range(100)])
+
+
+def test_lru_eviction_under_small_budget(open_db):
+    _tables(open_db(), 'abc')
+    db = open_db()
+    db.tables.load('a')
+    size = db.tables._tables['a'][2]
+
+    # бюджет на две таблицы одного размера
+    db = Database(db.tables.data_dir, db.tables.meta_path, table_cache_bytes=2 * size)
+    assert db.tables.max_bytes == 2 * size
+    for name in ('a', 'b', 'a', 'c'):
+        db.tables.load(name)
+    # давно не использованная таблица b вытеснена
+    assert db.cache_stats()['tables']['tables'] == ['a', 'c']
+    assert db.cache_stats()['tables']['used_bytes'] <= 2 * size
+
+    # уменьшение бюджета вытесняет сразу; последняя загруженная таблица остается
+    db.tables.set_max_bytes(1)
+    assert db.cache_stats()['tables']['tables'] == ['c']
+    assert len(list(db.select('a'))) == 100
+    assert db.cache_stats()['tables']['tables'] == ['a']
+
+
+def test_cli_table_cache_budget(cli, monkeypatch):
+    assert cli.tables.max_bytes == TABLE_CACHE_BYTES
+    monkeypatch.setattr(cli.tables, 'max_bytes', TABLE_CACHE_BYTES)
+    with pytest.raises(SystemExit) as exit_info:
+        main(['--table-cache-mb', '16', '-c', 'list_tables'])
+    assert exit_info.value.code == 0
+    assert cli.tables.max_bytes == 16 * 1024 * 1024
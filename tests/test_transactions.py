@@ -0,0 +1,74 @@
+import pytest
+
+from src.primitive_db import storage
+from src.primitive_db.utils import read_commit_record
+
+
+def _accounts(db):
+    db.create_table('accounts', ['name:str', 'balance:int'])
+    db.create_table('audit', ['message:str'])
+    db.insert_many('accounts', [['Ann', 100], ['Bob', 50]])
+
+
+def _balances(db):
+    return {row['name']: row['balance'] for row in db.select('accounts')}
+
+
+def test_commit_is_visible_after_restart(db, open_db):
+    _accounts(db)
+    with db.transaction():
+        db.update('accounts', {'balance': 70}, 'name = Ann')
+        db.update('accounts', {'balance': 80}, 'name = Bob')
+        db.insert('audit', ['transfer 30'])
+
+    db = open_db()
+    assert _balances(db) == {'Ann': 70, 'Bob': 80}
+    assert [row['message'] for row in db.select('audit')] == ['transfer 30']
+
+
+def test_rollback_discards_changes(db, open_db):
+    _accounts(db)
+    db.begin()
+    db.update('accounts', {'balance': 0}, 'name = Ann')
+    db.insert('audit', ['lost'])
+    assert _balances(db) == {'Ann': 0, 'Bob': 50}
+    db.rollback()
+    assert _balances(db) == {'Ann': 100, 'Bob': 50}
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.delete('accounts')
+            raise RuntimeError('сбой')
+
+    for db in (db, open_db()):
+        assert _balances(db) == {'Ann': 100, 'Bob': 50}
+        assert list(db.select('audit')) == []
+
+
+def test_commit_record_is_recovered(db, open_db, monkeypatch):
+    _accounts(db)
+    append_table_log = storage.append_table_log
+    calls = []
+
+    # сбой после переноса первой таблицы из записи транзакции
+    def crash(*args, **kwargs):
+        calls.append(args[0])
+        if len(calls) > 1:
+            raise OSError('сбой')
+        return append_table_log(*args, **kwargs)
+    monkeypatch.setattr(storage, 'append_table_log', crash)
+
+    db.begin()
+    db.update('accounts', {'balance': 70}, 'name = Ann')
+    db.insert('audit', ['transfer 30'])
+    with pytest.raises(OSError):
+        db.commit()
+    monkeypatch.undo()
+    assert read_commit_record(db.tables.data_dir) is not None
+
+    db = open_db()
+    assert _balances(db) == {'Ann': 70, 'Bob': 50}
+    assert [row['message'] for row in db.select('audit')] == ['transfer 30']
+    assert read_commit_record(db.tables.data_dir) is None
+    # повторно примененные записи журнала не дублируют строки
+    assert [row['ID'] for row in open_db().select('audit')] == [1]
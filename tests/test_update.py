@@ -0,0 +1,69 @@
+import pytest
+
+from src.primitive_db.engine import run_batch
+from src.primitive_db.errors import ColumnNotFoundError, ValidationError
+from src.primitive_db.parser import parse_set
+from src.primitive_db.utils import _table_path
+
+
+@pytest.fixture
+def people(db):
+    db.create_table('people', ['name:str', 'age:int', 'vip:bool'])
+    db.insert_many('people', [['Ann', 30, False], ['Bob', 40, False], ['Eve', 25, True], ['Dan', 35, False]])
+    return db
+
+
+def _log_size(db):
+    with open(_table_path('people', db.tables.data_dir, 'log'), encoding='utf-8') as f:
+        return len(f.read().splitlines())
+
+
+def test_parse_set():
+    assert parse_set("a=1, b='x, y' , c = \"a=b\"") == {'a': '1', 'b': 'x, y', 'c': 'a=b'}
+    for bad in ['a', '=1', 'a=1, a=2']:
+        with pytest.raises(ValueError):
+            parse_set(bad)
+
+
+def test_multi_column_update_is_one_log_entry(people, open_db):
+    before = _log_size(people)
+    assert people.update('people', {'name': 'Old', 'age': '50', 'vip': 'yes'}, 'age >= 30') == [1, 2, 4]
+    assert _log_size(people) - before == 1
+    assert [(row['name'], row['age'], row['vip']) for row in open_db().select('people')] == [
+        ('Old', 50, True), ('Old', 50, True), ('Eve', 25, True), ('Old', 50, True),
+    ]
+
+    before = _log_size(people)
+    assert people.delete('people', 'name = Old') == [1, 2, 4]
+    assert _log_size(people) - before == 1
+    assert people.update('people', {'age': 1}, 'name = Old') == []
+    assert [row['ID'] for row in open_db().select('people')] == [3]
+
+
+def test_failed_update_changes_nothing(people):
+    rows = list(people.select('people'))
+    with pytest.raises(ValidationError):
+        people.update('people', {'name': 'X', 'age': 'abc'}, 'ID = 1')
+    with pytest.raises(ColumnNotFoundError):
+        people.update('people', {'name': 'X', 'city': 'Oslo'})
+    with pytest.raises(ValidationError):
+        people.update('people', {'ID': 7})
+    assert list(people.select('people')) == rows
+
+
+def test_console_update_and_delete(cli, capsys):
+    assert run_batch([
+        'create_table people name:str age:int',
+        'insert into people values ("Ann", 30)',
+        'insert into people values ("Bob", 40)',
+        'insert into people values ("Eve", 25)',
+    ]) == 0
+    capsys.readouterr()
+    assert run_batch(["update people set name = 'x, y', age=1 where age >= 30"]) == 0
+    assert 'Записи с ID=1-2 в таблице "people" успешно обновлены (2 шт.).' in capsys.readouterr().out
+    assert run_batch(['update people set age where ID = 1', 'update people set city=1 where ID = 1']) == 2
+
+    assert run_batch(['delete from people where age = 1'], assume_yes=True) == 0
+    assert 'Записи с ID=1-2 успешно удалены из таблицы "people" (2 шт.).' in capsys.readouterr().out
+    assert run_batch(['select from people format jsonl']) == 0
+    assert [line for line in capsys.readouterr().out.splitlines() if line.startswith('{')] == ['{"ID": 3, "name": "Eve", "age": 25}']
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from src.primitive_db.engine import run_batch
+from src.primitive_db.where import bind_condition, compile_condition, parse_condition
+
+
+def test_parse_condition_tree():
+    assert parse_condition('age>=18 AND (name = "a b" OR NOT vip = true)') == (
+        'and',
+        ('cmp', '>=', 'age', '18'),
+        ('or', ('cmp', '=', 'name', '"a b"'), ('not', ('cmp', '=', 'vip', 'true'))),
+    )
+    assert parse_condition('age NOT IN (1, 2)') == ('not', ('in', 'age', ['1', '2']))
+    assert parse_condition('age between 1 and 5') == ('between', 'age', '1', '5')
+    # операторы внутри кавычек - часть значения
+    assert parse_condition('name = "a=b (c, d) <> !"') == ('cmp', '=', 'name', '"a=b (c, d) <> !"')
+
+
+@pytest.mark.parametrize('text', ['', 'age', 'age = ', 'age == 1', 'age = 1 extra', '(age = 1', 'age NOT = 1'])
+def test_parse_condition_errors(text):
+    with pytest.raises(ValueError):
+        parse_condition(text)
+
+
+def test_bound_condition_uses_column_types():
+    schema = {'ID': 'int', 'name': 'str', 'age': 'int', 'vip': 'bool'}
+    test = compile_condition(bind_condition(parse_condition('age > "9" AND vip = yes AND name != "x"'), schema))
+    assert test({'ID': 1, 'name': 'Ann', 'age': 10, 'vip': True})
+    assert not test({'ID': 2, 'name': 'Ann', 'age': 9, 'vip': True})
+    with pytest.raises(ValueError):
+        bind_condition(parse_condition('age = abc'), schema)
+    with pytest.raises(ValueError):
+        bind_condition(parse_condition('height = 1'), schema)
+
+
+def _jsonl(output):
+    return [json.loads(line) for line in output.splitlines() if line.startswith('{')]
+
+
+def test_quoted_values_with_operators(cli, capsys):
+    assert run_batch([
+        'create_table users name:str',
+        'insert into users values ("a=b")',
+        'insert into users values ("x < y (z)")',
+        'insert into users values ("plain")',
+    ]) == 0
+    capsys.readouterr()
+
+    assert run_batch(['select from users where name = "a=b" format jsonl']) == 0
+    assert _jsonl(capsys.readouterr().out) == [{'ID': 1, 'name': 'a=b'}]
+    assert run_batch(['explain select from users where name = "x < y (z)"']) == 0
+    capsys.readouterr()
+
+    assert run_batch(['delete from users where name = "x < y (z)" OR name = \'a=b\''], assume_yes=True) == 0
+    capsys.readouterr()
+    assert run_batch(['select from users format jsonl']) == 0
+    assert _jsonl(capsys.readouterr().out) == [{'ID': 3, 'name': 'plain'}]